@@ -3,26 +3,173 @@ Description:
     This class handles the data analysis process.
 
 Methods:
-    - compute_desc_stats(df): Computes descriptive statistics (mean, median, min, max) by business_state.
+    - build_state_cube(df): Aggregates every metric by business_state in a single groupby pass.
+    - compute_desc_stats(df, state_cube): Computes descriptive statistics (mean, median, min, max) by business_state.
+    - compute_desc_stats_by_chunk(chunks): Computes descriptive statistics by business_state one chunk at a time.
+    - compute_state_aggregates(chunks): Computes mergeable per-state aggregates one chunk at a time.
+    - compare_desc_stats(df, expected_df): Compares two descriptive statistics dataframes cell by cell.
+    - compare_medians(df, orig_df, rank_errors): Checks estimated medians against the rank error bounds.
     - filter_rows(df): Filters records with negative debt_to_equity.
+    - screen_rows(df, rules): Evaluates every screening rule in one vectorized pass into a bitmask per row.
+    - compute_ratios(df, definitions): Computes every ratio of a list of definitions in one pass.
+    - attach_ratios(df): Attaches the block of every ratio in utils/mapping.py to a dataframe.
+    - compute_state_ratios(state_cube): Computes ratios of per-state sums, e.g. the revenue-weighted margin.
     - compute_debt_to_income_ratios(df): Computes for debt_to_income ratios.
+    - get_top_states(state_cube, column, statistic, n): Gets the N states with the highest statistic of a column.
+    - get_top_businesses(df, column, n, per_state): Gets the N businesses with the highest value of a column.
 '''
 
+import numpy as np
+import pandas as pd
+
+from utils.aggregates import StateAggregates
+from utils.mapping import column_type, ratio_definitions, state_ratio_definitions, screening_rules
+from utils.ratios import compute_ratios
+from utils.screening import ScreeningResult
+from utils.topn import select_top_positions, top_n, top_n_per_group
+
+cube_statistics = ['count', 'sum', 'mean', 'median', 'min', 'max']
+desc_statistics = ['mean', 'median', 'min', 'max']
+
 class Analyzer:
-    def compute_desc_stats(self, orig_df):
+    def __get_numeric_columns(self, orig_df):
+        '''
+        Get the columns that are in int or float data type (of any width), except business_id.
+
+        :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
+        :return: The list of numeric column names.
+        '''
+        return (orig_df[orig_df.select_dtypes(include='number').columns]
+                .drop(columns=['business_id']).columns.tolist())
+
+    def build_state_cube(self, merged_df):
+        '''
+        Aggregate every metric by business_state in a single groupby pass: count, sum, mean, median, min and max of
+        each int or float column (including the attached ratios), plus the count of businesses. Everything that
+        reports or charts by state reads from this cube, so it only scans the businesses once.
+
+        :param merged_df: The original Pandas dataframe with the ratios attached by attach_ratios().
+        :return: The Pandas dataframe indexed by business_state with (metric, statistic) columns.
+        '''
+        aggregations = {column: cube_statistics for column in self.__get_numeric_columns(merged_df)}
+        aggregations['business_id'] = ['count']
+
+        return merged_df.groupby('business_state', observed=True).agg(aggregations)
+
+    def compute_desc_stats(self, orig_df, state_cube=None):
         '''
         Compute descriptive statistics (mean, median, min, max) by business_state for all columns that are in int or float data type.
 
         :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
+        :param state_cube: The aggregate cube created by build_state_cube(). If given, the statistics are read from it
+            instead of grouping orig_df again.
         :return: The Pandas dataframe with descriptive statistics by business_state for all columns that are in int or float data type.
         '''
         # get numeric data type columns
-        numeric_columns = (orig_df[orig_df.select_dtypes(include=['int64', 'float64']).columns]
-                           .drop(columns=['business_id']).columns)
+        numeric_columns = self.__get_numeric_columns(orig_df)
 
-        stats_df = orig_df.groupby('business_state')[numeric_columns].agg(['mean', 'median', 'min', 'max'])
+        if state_cube is not None:
+            return state_cube.loc[:, pd.MultiIndex.from_product([numeric_columns, desc_statistics])]
+
+        stats_df = orig_df.groupby('business_state', observed=True)[numeric_columns].agg(desc_statistics)
         return stats_df
 
+    def compute_desc_stats_by_chunk(self, chunks):
+        '''
+        Compute descriptive statistics (mean, median, min, max) by business_state one chunk at a time.
+        Count, sum, min and max are exact. The median is estimated with a mergeable quantile sketch and is exact
+        as long as each state has fewer values than the sketch capacity.
+
+        :param chunks: An iterable of transformed Pandas dataframe chunks.
+        :return: The Pandas dataframe with the same layout as compute_desc_stats().
+        '''
+        return self.compute_state_aggregates(chunks).to_stats_df()
+
+    def compute_state_aggregates(self, chunks):
+        '''
+        Compute mergeable per-state aggregates (count, sum, min, max and a median sketch) one chunk at a time.
+
+        :param chunks: An iterable of transformed Pandas dataframe chunks.
+        :return: The StateAggregates of all chunks, empty if there are no chunks.
+        '''
+        aggregates = None
+
+        for chunk_df in chunks:
+            if aggregates is None:
+                aggregates = StateAggregates(self.__get_numeric_columns(chunk_df))
+
+            aggregates.update(chunk_df)
+
+        if aggregates is None:
+            # without chunks, e.g. an empty file, the numeric columns of the schema give the aggregates their layout
+            aggregates = StateAggregates([column for column, target_type in column_type.items()
+                                          if column != 'business_id' and target_type not in ('object', 'category')])
+
+        return aggregates
+
+    def compare_desc_stats(self, stats_df, expected_stats_df, rtol=1e-9):
+        '''
+        Compare two descriptive statistics dataframes cell by cell, e.g. incremental results with a full recompute.
+
+        :param stats_df: The descriptive statistics to check.
+        :param expected_stats_df: The expected descriptive statistics.
+        :param rtol: The relative tolerance allowed between two values.
+        :return: The Pandas dataframe with one row per mismatching cell (empty if both dataframes match).
+        '''
+        stats_df, expected_stats_df = stats_df.align(expected_stats_df)
+
+        actual = stats_df.to_numpy(dtype='float64')
+        expected = expected_stats_df.to_numpy(dtype='float64')
+        is_close = np.isclose(actual, expected, rtol=rtol, atol=0, equal_nan=True)
+
+        rows, columns = np.nonzero(~is_close)
+        return pd.DataFrame({
+            'business_state': stats_df.index[rows],
+            'column': stats_df.columns.get_level_values(0)[columns],
+            'statistic': stats_df.columns.get_level_values(1)[columns],
+            'value': actual[rows, columns],
+            'expected_value': expected[rows, columns]
+        })
+
+    def compare_medians(self, stats_df, orig_df, rank_errors):
+        '''
+        Check estimated medians against the values they estimate. An estimate matches when its rank among the
+        values of its state is within the rank error bound of the sketch that produced it.
+
+        :param stats_df: The descriptive statistics with the estimated medians.
+        :param orig_df: The cleaned Pandas dataframe the medians were estimated from.
+        :param rank_errors: The Pandas dataframe of rank error bounds by business_state, one column per numeric column.
+        :return: The Pandas dataframe with one row per estimate outside its bound (empty if every estimate is within
+            its bound), with the layout of compare_desc_stats() and the rank_error and allowed_rank_error.
+        '''
+        mismatches = []
+
+        for state, state_df in orig_df.groupby('business_state', observed=True):
+            if state not in stats_df.index:
+                # a missing state is reported by the comparison of the exact statistics
+                continue
+
+            for column in rank_errors.columns:
+                values = state_df[column].dropna().to_numpy(dtype='float64')
+                estimate = stats_df.loc[state, (column, 'median')]
+
+                if len(values) == 0:
+                    continue
+
+                # equal values share a range of ranks, so the estimate matches if 0.5 is in that range, up to the bound
+                below = np.count_nonzero(values < estimate) / len(values)
+                at_or_below = np.count_nonzero(values <= estimate) / len(values)
+                rank_error = max(below - 0.5, 0.5 - at_or_below, 0.0)
+                allowed_rank_error = rank_errors.loc[state, column]
+
+                if not rank_error <= allowed_rank_error + 1e-12:
+                    mismatches.append({'business_state': state, 'column': column, 'statistic': 'median',
+                                       'value': estimate, 'expected_value': np.median(values),
+                                       'rank_error': rank_error, 'allowed_rank_error': allowed_rank_error})
+
+        return pd.DataFrame(mismatches, columns=['business_state', 'column', 'statistic', 'value', 'expected_value',
+                                                 'rank_error', 'allowed_rank_error'])
+
     def filter_rows(self, orig_df):
         '''
         Filter records with negative debt_to_equity.
@@ -30,16 +177,106 @@ class Analyzer:
         :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
         :return: The Pandas dataframe with negative debt_to_equity.
         '''
-        return orig_df[orig_df['debt_to_equity'] < 0]
+        rules = [rule for rule in screening_rules if rule['name'] == 'negative_debt_to_equity']
+        return self.screen_rows(orig_df, rules).get_rows()
+
+    def screen_rows(self, orig_df, rules=screening_rules):
+        '''
+        Evaluate every screening rule in one vectorized pass (see utils/screening.py). The result keeps one bit per
+        rule and row, and gives the per-rule counts and the positions of the flagged rows without copying orig_df.
+
+        :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
+        :param rules: The list of screening rules.
+        :return: The ScreeningResult of orig_df.
+        '''
+        return ScreeningResult(orig_df, rules)
+
+    def compute_ratios(self, orig_df, definitions=ratio_definitions):
+        '''
+        Compute every ratio of a list of definitions in one batched NumPy pass (see utils/ratios.py).
+        Rows whose ratio is NaN because of a zero or negative denominator are counted and printed.
+
+        :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
+        :param definitions: The list of ratio definitions.
+        :return: The Pandas dataframe with one float64 column per ratio and the index of orig_df.
+        '''
+        ratios_df, issues_df = compute_ratios(orig_df, definitions)
+
+        for definition in definitions:
+            issues = issues_df.loc[definition['name']]
+            nan_count = issues['zero_denominators']
+
+            if definition.get('negative_denominator', 'keep') == 'nan':
+                nan_count += issues['negative_denominators']
+
+            if nan_count > 0:
+                print(f"WARNING: {definition['name']} is NaN for {nan_count} rows with a zero or negative "
+                      f"{' + '.join(definition['denominator'])}.")
+
+        return ratios_df
+
+    def attach_ratios(self, orig_df):
+        '''
+        Attach the block of every ratio in utils/mapping.py to the original dataframe. The ratios are computed from
+        the rows of orig_df, so they are attached by position instead of being merged on business_id.
+
+        :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
+        :return: The original Pandas dataframe with one more column per ratio.
+        '''
+        return pd.concat([orig_df, self.compute_ratios(orig_df)], axis=1)
+
+    def compute_state_ratios(self, state_cube):
+        '''
+        Compute ratios of per-state sums, e.g. the revenue-weighted profit margin, which is the sum of net_profit
+        divided by the sum of total_revenue of each state.
+
+        :param state_cube: The aggregate cube created by build_state_cube() from a dataframe with attached ratios.
+        :return: The Pandas dataframe indexed by business_state with one column per state ratio.
+        '''
+        sums_df = state_cube.xs('sum', axis=1, level=1)
+        return self.compute_ratios(sums_df, state_ratio_definitions)
 
     def compute_debt_to_income_ratios(self, orig_df):
         '''
         Compute debt_to_income ratios by dividing total_long_term_debt by total_revenue.
+        A zero total_revenue gives NaN instead of an infinite ratio.
 
         :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
         :return: The Pandas dataframe with the result of dividing total_long_term_debt by total_revenue.
         '''
-        debt_to_income_df = orig_df[['business_id', 'total_long_term_debt', 'total_revenue']].copy()
-        debt_to_income_df['debt_to_income_ratio'] = debt_to_income_df['total_long_term_debt'] / debt_to_income_df['total_revenue']
+        definitions = [definition for definition in ratio_definitions if definition['name'] == 'debt_to_income_ratio']
+
+        debt_to_income_df = orig_df[['business_id', 'total_long_term_debt', 'total_revenue']]
+        return pd.concat([debt_to_income_df, self.compute_ratios(orig_df, definitions)], axis=1)
+
+    def get_top_states(self, state_cube, column, statistic='sum', n=5):
+        '''
+        Get the N states with the highest statistic of a column, e.g. the highest sum of total_revenue.
+        The states are selected with a partial selection instead of a sort.
+
+        :param state_cube: The aggregate cube created by build_state_cube().
+        :param column: The numeric column.
+        :param statistic: The statistic of the cube to rank by, e.g. 'sum', 'mean' or 'max'.
+        :param n: The number of states to keep.
+        :return: The Pandas series of at most n values, indexed by business_state, highest first.
+        '''
+        return top_n(state_cube[(column, statistic)], n).rename(f'{statistic}_{column}')
+
+    def get_top_businesses(self, orig_df, column, n=5, per_state=False):
+        '''
+        Get the N businesses with the highest value of a column, overall or in each state.
+        The businesses are selected with a partial selection instead of a sort.
+
+        :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
+        :param column: The numeric column to rank by.
+        :param n: The number of businesses to keep, overall or per state.
+        :param per_state: Whether to keep the top N businesses of each state.
+        :return: The Pandas dataframe with business_id, business_state and the column of the selected businesses,
+            ordered by state (if per_state) and then highest first.
+        '''
+        columns = ['business_id', 'business_state', column]
+
+        if per_state:
+            return top_n_per_group(orig_df[columns], 'business_state', column, n)
 
-        return debt_to_income_df
\ No newline at end of file
+        return orig_df[columns].iloc[select_top_positions(orig_df[column].to_numpy(), n)]
@@ -0,0 +1,163 @@
+'''
+Description:
+    This class runs the full extract, transform, analyze and visualize pipeline for many data files without
+    prompting the user. Files are processed in parallel in a bounded pool of worker processes. Each file writes its
+    console report, statistics and charts to its own output directory, failed files do not stop the run, and a
+    combined summary of all files is written at the end.
+
+Parameters:
+    output_dir (str): The directory where one sub-directory per data file and the combined summary are written.
+    max_workers (int): The maximum number of worker processes. Defaults to the number of CPUs.
+    force_rebuild (bool): Whether to convert workbooks again instead of reusing the conversion cache.
+    compact (bool): Whether to use the compact schema (categorical states, downcast integers).
+    cache_max_size_bytes (int): The maximum total size of the conversion cache of workbooks.
+
+Methods:
+    - find_data_files(path_or_pattern): Finds the excel and csv data files in a directory or matching a glob.
+    - run(path_or_pattern): Processes every data file and writes the combined summary.
+'''
+
+import contextlib
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+data_file_extensions = ('.xlsx', '.csv')
+
+def process_data_file(data_file_path, file_output_dir, force_rebuild, compact, cache_max_size_bytes=1024 ** 3):
+    '''
+    Run the full pipeline for one data file in a worker process.
+    Everything the pipeline prints is redirected to report.txt in the file's output directory.
+
+    :param data_file_path: The excel or csv data file to process.
+    :param file_output_dir: The output directory of this data file.
+    :param force_rebuild: Whether to convert the workbook again instead of reusing the conversion cache.
+    :param compact: Whether to use the compact schema.
+    :param cache_max_size_bytes: The maximum total size of the conversion cache of workbooks.
+    :return: The dictionary with the file's status, duration, error message and statistics by state.
+    '''
+    from main import Main
+
+    os.makedirs(file_output_dir, exist_ok=True)
+    start_time = time.perf_counter()
+
+    with open(os.path.join(file_output_dir, 'report.txt'), 'w') as report_file:
+        with contextlib.redirect_stdout(report_file):
+            try:
+                # the files already run in parallel, so each file renders its charts in its own worker process
+                main = Main(os.path.dirname(data_file_path) or '.', force_rebuild, file_output_dir, compact,
+                            chart_workers=1, cache_max_size_bytes=cache_max_size_bytes)
+                stats_df = main.run(data_file_path)
+                stats_df.to_csv(os.path.join(file_output_dir, 'stats.csv'))
+
+                return {'file': data_file_path, 'status': 'ok', 'seconds': time.perf_counter() - start_time,
+                        'error': '', 'stats_df': stats_df}
+            except Exception as error:
+                traceback.print_exc(file=report_file)
+
+                return {'file': data_file_path, 'status': 'failed', 'seconds': time.perf_counter() - start_time,
+                        'error': f'{type(error).__name__}: {error}', 'stats_df': None}
+
+class BatchRunner:
+    def __init__(self, output_dir='output', max_workers=None, force_rebuild=False, compact=False,
+                 cache_max_size_bytes=1024 ** 3):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.force_rebuild = force_rebuild
+        self.compact = compact
+        self.cache_max_size_bytes = cache_max_size_bytes
+
+    def __get_file_output_dir(self, data_file_path, used_names):
+        '''
+        Get a unique output directory for a data file, named after the file.
+
+        :param data_file_path: The excel or csv data file.
+        :param used_names: The set of directory names already given to other files.
+        :return: The output directory of the data file.
+        '''
+        name = os.path.splitext(os.path.basename(data_file_path))[0]
+        unique_name, suffix = name, 2
+
+        while unique_name in used_names:
+            unique_name = f'{name}_{suffix}'
+            suffix += 1
+
+        used_names.add(unique_name)
+        return os.path.join(self.output_dir, unique_name)
+
+    def find_data_files(self, path_or_pattern):
+        '''
+        Find the excel and csv data files in a directory or matching a glob pattern.
+        When a workbook and a csv file share the same name, only the workbook is kept.
+
+        :param path_or_pattern: A directory or a glob pattern.
+        :return: The sorted list of data file paths.
+        '''
+        if os.path.isdir(path_or_pattern):
+            path_or_pattern = os.path.join(path_or_pattern, '*')
+
+        data_files = [path for path in glob.glob(path_or_pattern)
+                      if os.path.isfile(path) and path.lower().endswith(data_file_extensions)]
+
+        xlsx_stems = {os.path.splitext(path)[0] for path in data_files if path.lower().endswith('.xlsx')}
+        return sorted(path for path in data_files
+                      if path.lower().endswith('.xlsx') or os.path.splitext(path)[0] not in xlsx_stems)
+
+    def run(self, path_or_pattern):
+        '''
+        Process every data file in parallel, then write and print the combined summary.
+
+        :param path_or_pattern: A directory or a glob pattern.
+        :return: The Pandas dataframe with the status of every data file.
+        '''
+        data_files = self.find_data_files(path_or_pattern)
+
+        if not data_files:
+            print(f'ERROR: No data files found for {path_or_pattern}.')
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        used_names = set()
+        file_output_dirs = {path: self.__get_file_output_dir(path, used_names) for path in data_files}
+
+        results = []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(process_data_file, path, file_output_dirs[path], self.force_rebuild,
+                                       self.compact, self.cache_max_size_bytes): path
+                       for path in data_files}
+
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    # the worker process itself died, e.g. it ran out of memory
+                    result = {'file': futures[future], 'status': 'failed', 'seconds': None,
+                              'error': f'{type(error).__name__}: {error}', 'stats_df': None}
+
+                results.append(result)
+
+                print(f"[{len(results)}/{len(data_files)}] {result['status'].upper()}: {result['file']}")
+
+        # combine the statistics by state of every successful file
+        stats_by_file = {result['file']: result['stats_df'] for result in results if result['stats_df'] is not None}
+
+        if stats_by_file:
+            summary_df = pd.concat(stats_by_file, names=['source_file'])
+            summary_df.to_csv(os.path.join(self.output_dir, 'summary.csv'))
+
+        status_df = (pd.DataFrame([{key: value for key, value in result.items() if key != 'stats_df'}
+                                   for result in results])
+                     .sort_values(by='file')
+                     .reset_index(drop=True))
+        status_df.to_csv(os.path.join(self.output_dir, 'status.csv'), index=False)
+
+        print('\n----- BATCH STATUS BY FILE -----')
+        print(f'{status_df.to_string()}\n')
+        print(f"{(status_df['status'] == 'ok').sum()} of {len(status_df)} files processed successfully")
+
+        return status_df
@@ -0,0 +1,282 @@
+'''
+Description:
+    This class measures how the pipeline scales with the number of rows. For every requested size it generates a
+    synthetic D598-schema csv file, then times and memory-profiles each stage method and the full Main.run on it.
+    Results are written to a JSON file, so runs of different versions can be compared with compare().
+
+    Each stage is timed over `repeat` runs on fresh copies of its input and the fastest run is reported. Peak memory
+    is measured in one extra run with tracemalloc, which is kept out of the timed runs because it slows them down.
+
+Parameters:
+    output_path (str): The path of the JSON results file.
+    repeat (int): The number of timed runs of each stage.
+    duplicate_rate (float): The share of generated rows that are exact duplicates.
+    negative_share (float): The share of generated businesses with negative debt-to-equity.
+    state_skew (float): The Zipf exponent of the spread of generated businesses over states.
+    seed (int): The random seed of the generated data.
+
+Methods:
+    - run_stages(data_file_path): Measures every stage method on one data file.
+    - run_pipeline(data_file_path): Measures the full Main.run on one data file.
+    - run(sizes, data_dir): Generates one file per size, measures it and writes the results file.
+    - compare(baseline_path): Compares the results with the results file of another version.
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from transformer import Transformer
+from loader import Loader
+from analyzer import Analyzer
+from visualizer import Visualizer
+from utils.synthetic import write_dataset
+
+benchmark_filepath = 'output/benchmark.json'
+
+class Benchmark:
+    def __init__(self, output_path=benchmark_filepath, repeat=3, duplicate_rate=0.01, negative_share=0.05,
+                 state_skew=1.0, seed=0):
+        self.output_path = output_path
+        self.repeat = repeat
+        self.duplicate_rate = duplicate_rate
+        self.negative_share = negative_share
+        self.state_skew = state_skew
+        self.seed = seed
+        self.results = []
+
+    def __measure(self, stage, func, setup=None, rows_in=None, repeat=None):
+        '''
+        Time a stage over several runs and measure its peak memory in one extra traced run.
+        Everything the stage prints is discarded.
+
+        :param stage: The name of the stage.
+        :param func: The function that runs the stage; it receives the arguments returned by setup.
+        :param setup: The function that builds fresh arguments for each run (not timed), or None for no arguments.
+        :param rows_in: The number of input rows.
+        :param repeat: The number of timed runs. Defaults to self.repeat.
+        :return: The result of the last run.
+        '''
+        repeat = self.repeat if repeat is None else repeat
+        wall_seconds, cpu_seconds = [], []
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(repeat):
+                args = setup() if setup else ()
+                start_wall, start_cpu = time.perf_counter(), time.process_time()
+                result = func(*args)
+                wall_seconds.append(time.perf_counter() - start_wall)
+                cpu_seconds.append(time.process_time() - start_cpu)
+                del result
+
+            args = setup() if setup else ()
+            tracemalloc.start()
+            try:
+                result = func(*args)
+                _, peak_bytes = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        # stages return a dataframe or a tuple that starts with one
+        output_df = result[0] if isinstance(result, tuple) else result
+
+        self.results.append({
+            'stage': stage,
+            'rows_in': rows_in,
+            'rows_out': len(output_df) if isinstance(output_df, pd.DataFrame) else None,
+            'repeat': repeat,
+            'wall_seconds': min(wall_seconds),
+            'mean_wall_seconds': float(np.mean(wall_seconds)),
+            'cpu_seconds': min(cpu_seconds),
+            'peak_traced_bytes': peak_bytes
+        })
+        return result
+
+    def run_stages(self, data_file_path):
+        '''
+        Measure every stage method of the Loader, Transformer, Analyzer and Visualizer on one data file.
+
+        :param data_file_path: The csv data file.
+        :return: The list of measurements of this file.
+        '''
+        first_result = len(self.results)
+        loader, transformer, analyzer = Loader(), Transformer(), Analyzer()
+
+        raw_df = self.__measure('load', loader.load_src_into_dataframe, lambda: (data_file_path,))
+        raw_df, _ = self.__measure('validate', transformer.validate, lambda: (raw_df,), len(raw_df))
+        rows = len(raw_df)
+
+        # the separate transformation steps, each on a fresh copy of the output of the previous step
+        normalized_df = self.__measure('normalize', transformer.normalize_column_names, lambda: (raw_df.copy(),),
+                                       rows)
+
+        def cast(df):
+            transformer.cast_column_data_type(df)
+            return df
+
+        cast_df = self.__measure('cast', cast, lambda: (normalized_df.copy(),), rows)
+
+        def dedup(df):
+            df, _ = transformer.identify_duplicate_rows(df)
+            return transformer.drop_column(df[~df['is_dup']])
+
+        dedup_df = self.__measure('dedup', dedup, lambda: (cast_df.copy(),), rows)
+
+        def round_floats(df):
+            transformer.round_to_two_decimal_places(df)
+            return df
+
+        self.__measure('round', round_floats, lambda: (dedup_df.copy(),), len(dedup_df))
+
+        # the fused single-pass stage used by Main.run
+        clean_df, _ = self.__measure('preprocess', transformer.preprocess, lambda: (raw_df,), rows)
+        del normalized_df, cast_df, dedup_df
+
+        self.__measure('filter', analyzer.filter_rows, lambda: (clean_df,), len(clean_df))
+        self.__measure('screening', analyzer.screen_rows, lambda: (clean_df,), len(clean_df))
+        merged_df = self.__measure('ratios', analyzer.attach_ratios, lambda: (clean_df,), len(clean_df))
+        state_cube = self.__measure('state_cube', analyzer.build_state_cube, lambda: (merged_df,), len(merged_df))
+        self.__measure('stats', analyzer.compute_desc_stats, lambda: (clean_df, state_cube), len(clean_df))
+
+        chart_dir = tempfile.mkdtemp()
+        try:
+            self.__measure('charts', Visualizer(chart_dir).create_all_charts, lambda: (state_cube, 1), len(state_cube))
+        finally:
+            shutil.rmtree(chart_dir, ignore_errors=True)
+
+        for result in self.results[first_result:]:
+            result['rows'] = rows
+
+        return self.results[first_result:]
+
+    def run_pipeline(self, data_file_path):
+        '''
+        Measure the full Main.run on one data file, charts rendered in-process and reports written to a temporary
+        directory.
+
+        :param data_file_path: The csv data file.
+        :return: The measurement of the full run.
+        '''
+        from main import Main
+
+        output_dir = tempfile.mkdtemp()
+        try:
+            main = Main(os.path.dirname(data_file_path) or '.', output_filepath=output_dir, chart_workers=1)
+            self.__measure('Main.run', main.run, lambda: (data_file_path,))
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        result = self.results[-1]
+        result['rows'] = result['rows_in'] = len(pd.read_csv(data_file_path, usecols=[0]))
+        result['rows_out'] = None
+        return result
+
+    def run(self, sizes, data_dir=None):
+        '''
+        Generate one synthetic data file per size, measure every stage and the full pipeline on it, print a summary
+        and write the results file.
+
+        :param sizes: The numbers of rows to generate.
+        :param data_dir: The directory where the generated files are kept. If None, a temporary directory is used and
+            removed afterwards.
+        :return: The Pandas dataframe with one row per size and stage.
+        '''
+        work_dir = data_dir or tempfile.mkdtemp()
+
+        try:
+            for size in sizes:
+                data_file_path = os.path.join(work_dir, f'synthetic_{size}.csv')
+
+                if not os.path.isfile(data_file_path):
+                    write_dataset(data_file_path, size, self.duplicate_rate, self.negative_share, self.state_skew,
+                                  self.seed)
+
+                print(f'Measuring {size} rows')
+                self.run_stages(data_file_path)
+                self.run_pipeline(data_file_path)
+        finally:
+            if data_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.__save()
+
+        results_df = pd.DataFrame(self.results).set_index(['rows', 'stage'])
+        print('\n----- BENCHMARK RESULTS -----')
+        print(f"{results_df[['rows_out', 'wall_seconds', 'cpu_seconds', 'peak_traced_bytes']].to_string()}\n")
+        print(f'Results written to {self.output_path}')
+        return results_df
+
+    def __save(self):
+        '''
+        Write the measurements, the generator parameters and the environment to the results file.
+        '''
+        output_dir = os.path.dirname(self.output_path)
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        with open(self.output_path, 'w') as results_file:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'environment': {'python': platform.python_version(), 'pandas': pd.__version__,
+                                'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()},
+                'parameters': {'repeat': self.repeat, 'duplicate_rate': self.duplicate_rate,
+                               'negative_share': self.negative_share, 'state_skew': self.state_skew,
+                               'seed': self.seed},
+                'results': self.results
+            }, results_file, indent=2)
+
+    def compare(self, baseline_path):
+        '''
+        Compare the results with the results file of another version, stage by stage.
+        A ratio above 1 means the current version is slower or uses more memory.
+
+        :param baseline_path: The path of the results file to compare with.
+        :return: The Pandas dataframe with the baseline and current time and peak memory of each size and stage.
+        '''
+        with open(baseline_path) as baseline_file:
+            baseline_df = pd.DataFrame(json.load(baseline_file)['results']).set_index(['rows', 'stage'])
+
+        current_df = pd.DataFrame(self.results).set_index(['rows', 'stage'])
+        columns = ['wall_seconds', 'peak_traced_bytes']
+
+        comparison_df = baseline_df[columns].join(current_df[columns], how='inner', lsuffix='_baseline',
+                                                  rsuffix='_current')
+        for column in columns:
+            comparison_df[f'{column}_ratio'] = comparison_df[f'{column}_current'] / comparison_df[f'{column}_baseline']
+
+        print(f'----- COMPARISON WITH {baseline_path} -----')
+        print(f'{comparison_df.to_string()}\n')
+        return comparison_df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the equity fund analysis pipeline on synthetic data.')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e3, 1e4, 1e5],
+                        help='numbers of rows to generate, e.g. 1e3 1e5 1e6')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each stage')
+    parser.add_argument('--duplicate-rate', type=float, default=0.01, help='share of exact duplicate rows')
+    parser.add_argument('--negative-share', type=float, default=0.05,
+                        help='share of businesses with negative debt-to-equity')
+    parser.add_argument('--state-skew', type=float, default=1.0,
+                        help='Zipf exponent of the spread of businesses over states (0 for uniform)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the generated data')
+    parser.add_argument('--data-dir', default=None, help='keep the generated csv files in this directory')
+    parser.add_argument('--output', default=benchmark_filepath, help='path of the JSON results file')
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help='compare the results with an earlier results file')
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.output, args.repeat, args.duplicate_rate, args.negative_share, args.state_skew,
+                          args.seed)
+    benchmark.run([int(size) for size in args.sizes], args.data_dir)
+
+    if args.compare:
+        benchmark.compare(args.compare)
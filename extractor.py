@@ -1,41 +1,70 @@
 '''
 Description:
     This class handles the data extraction process from source files.
+    Workbooks are streamed straight into typed columns by utils/xlsx_reader.py, and converted workbooks are kept in
+    a content-addressed conversion cache, so a workbook is only parsed again when it changes.
 
 Parameters:
     src_file_path (str): Path to the source data file used by the Extractor.
+    force_rebuild (bool): Whether to convert the workbook again even if a valid cache entry exists.
+    cache_max_size_bytes (int): The maximum total size of the conversion cache.
+    sheets (list): The sheets of each workbook to read, by name or position, or '*' for every sheet. None reads the
+        first sheet.
 
 Methods:
-    - __convert_xlsx_to_csv(filename): Converts the raw excel data file to csv file format.
-    - locate_data_file(): Finds the csv data file in the specified file path.
+    - __convert_xlsx(file_path): Converts the raw excel data file into a cached columnar dataset.
+    - locate_data_file(): Finds the converted data file in the specified file path.
+    - extract_data_file(file_path): Converts a given data file without prompting the user.
 '''
 
-import pandas as pd
+import os
+
+from utils.columnar import is_columnar
+from utils.conversion_cache import ConversionCache
+from utils.xlsx_reader import read_xlsx
+
+cache_dirname = '.cache'
 
 class Extractor:
-    def __init__(self, source_file_path):
+    def __init__(self, source_file_path, force_rebuild=False, cache_max_size_bytes=1024 ** 3, sheets=None):
         self.source_file_path = source_file_path
         self.is_file_converted = False
+        self.force_rebuild = force_rebuild
+        self.sheets = sheets
+        self.cache = ConversionCache(f'{source_file_path}/{cache_dirname}', cache_max_size_bytes)
 
-    def __convert_xlsx_to_csv(self, request_filename):
+    def __convert_xlsx(self, xlsx_file_path):
         '''
-        Convert the raw excel data file to csv file format.
+        Convert the raw excel data file into a cached columnar dataset.
+        The workbook is only parsed when it has no valid cache entry or a rebuild is forced.
 
-        :param request_filename: The filename entered by the user.
+        :param xlsx_file_path: The path of the excel data file.
+        :return: The path of the cache entry, or None if the file is not found.
         '''
+        request_filename = os.path.splitext(os.path.basename(xlsx_file_path))[0]
+
+        # each sheet selection is a conversion of its own
+        variant = '' if self.sheets is None else ','.join(str(sheet) for sheet in self.sheets)
+
         try:
-            df = pd.read_excel(f'{self.source_file_path}/{request_filename}.xlsx')
-            df.to_csv(f'{self.source_file_path}/{request_filename}.csv', index=False)
+            entry_path = None if self.force_rebuild else self.cache.lookup(xlsx_file_path, variant)
 
-            self.is_file_converted = True
+            if entry_path is not None:
+                print(f'Reusing cached conversion of {request_filename}.xlsx')
+            else:
+                df = read_xlsx(xlsx_file_path, self.sheets)
+                entry_path = self.cache.store(xlsx_file_path, df, variant)
+
+                print(f'Successfully converted {request_filename}.xlsx')
 
-            print(f'Successfully converted {request_filename}.xlsx to {request_filename}.csv')
+            self.is_file_converted = True
+            return entry_path
         except FileNotFoundError:
             print(f'ERROR: File not found.')
 
     def locate_data_file(self):
         '''
-        Find the csv data file.
+        Find the converted data file.
         '''
         is_file_found = False
 
@@ -44,10 +73,10 @@ class Extractor:
 
             if request_filename != '':
                 if request_filename != 'exit':
-                    self.__convert_xlsx_to_csv(request_filename)
+                    entry_path = self.__convert_xlsx(f'{self.source_file_path}/{request_filename}.xlsx')
 
                     if self.is_file_converted == True:
-                        return f'{self.source_file_path}/{request_filename}.csv'
+                        return entry_path
                     else:
                         # if file conversion fails, ask user enter a filename again
                         continue
@@ -56,3 +85,29 @@ class Extractor:
                     break
             else:
                 continue
+
+    def extract_data_file(self, file_path):
+        '''
+        Convert a given data file without prompting the user.
+        Excel workbooks go through the conversion cache; csv files and columnar datasets are used as they are.
+
+        :param file_path: The path of the excel or csv data file, or of a columnar dataset directory.
+        :return: The path of the file to load.
+        :raises FileNotFoundError: If the data file does not exist.
+        '''
+        if is_columnar(file_path):
+            return file_path
+
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(file_path)
+
+        if file_path.lower().endswith('.csv'):
+            return file_path
+
+        self.is_file_converted = False
+        entry_path = self.__convert_xlsx(file_path)
+
+        if not self.is_file_converted:
+            raise FileNotFoundError(file_path)
+
+        return entry_path
@@ -1,36 +1,190 @@
 '''
 Description:
     This class handles the data loading process.
+    Source files can be csv files or columnar datasets (see utils/columnar.py), such as the conversion cache
+    entries created by the Extractor. Columnar datasets are memory-mapped instead of parsed.
 
 Parameters:
     relative_src_file_path (str): The relative file path where the source csv data file is stored.
+    compact (bool): Whether to read the data with the compact schema (categorical states, downcast integers).
 
 Methods:
     - load_src_into_dataframe(filepath): Reads and loads the source csv data file into a Pandas dataframe.
-    - merge_dataframes(df, debt_to_income_df): Merges df with debt_to_income_df dataframe.
+    - stream_src_into_dataframes(filepath, chunk_size): Reads the source csv data file in chunks of bounded size.
+    - merge_dataframes(df, debt_to_income_df): Attaches debt_to_income_ratio to df by business_id, row for row.
+    - compare_memory_footprint(filepath): Compares the memory footprint of the current and compact layouts.
 '''
 
+import os
+
 import pandas as pd
 
+from utils.columnar import ColumnarDataset
+from utils.mapping import new_column_mapping, column_type, compact_column_type
+from utils.schema import apply_schema, cast_column, get_read_dtypes
+
 class Loader:
+    def __init__(self, compact=False):
+        self.compact = compact
+        self.key_collisions = None
+
+    def __read_csv(self, relative_src_file_path, compact, **kwargs):
+        '''
+        Read the source csv data file. In compact mode, business_state is parsed straight into a categorical and
+        integer columns are downcast as soon as they are parsed.
+
+        :param relative_src_file_path: The relative file path where the source csv data file is stored.
+        :param compact: Whether to read the data with the compact schema.
+        :param kwargs: Extra keyword arguments passed to pd.read_csv, e.g. chunksize.
+        :return: The Pandas dataframe, or a reader of Pandas dataframes when chunksize is given.
+        '''
+        if not compact:
+            return pd.read_csv(f'{relative_src_file_path}', sep=',', **kwargs)
+
+        # numeric columns are inferred as float64 anyway; left untyped, a malformed value is read as text and
+        # quarantined by the validation instead of failing the read
+        read_dtypes = {column: dtype for column, dtype in get_read_dtypes(compact_column_type).items()
+                       if dtype == 'category'}
+        return pd.read_csv(f'{relative_src_file_path}', sep=',', dtype=read_dtypes, **kwargs)
+
+    def __compact(self, df):
+        '''
+        Downcast the columns of a dataframe with the compact schema. Column names are kept as they are.
+
+        :param df: The Pandas dataframe read from the source file.
+        :return: The Pandas dataframe in the compact layout.
+        '''
+        schema = {source_column: compact_column_type[column] for source_column, column in new_column_mapping.items()}
+
+        for column, target_type in {**schema, **compact_column_type}.items():
+            if column in df.columns:
+                try:
+                    df[column] = cast_column(df[column], target_type)
+                except (ValueError, OverflowError):
+                    # null, malformed or overflowing values; the Transformer casts the column once their rows
+                    # are quarantined
+                    continue
+
+        return df
+
     def load_src_into_dataframe(self, relative_src_file_path):
         '''
         Read and load the source csv data file into a Pandas dataframe.
 
-        :param relative_src_file_path: The relative file path where the source csv data file is stored.
+        :param relative_src_file_path: The relative file path where the source csv data file or columnar dataset is
+            stored.
         :return: The Pandas dataframe created by reading and loading the source csv data file.
         '''
-        df = pd.read_csv(f'{relative_src_file_path}', sep=',')
+        if os.path.isdir(relative_src_file_path):
+            # in compact mode, business_state stays a categorical of the memory-mapped codes
+            df = ColumnarDataset(relative_src_file_path).to_dataframe(decode_text=not self.compact)
+        else:
+            df = self.__read_csv(relative_src_file_path, self.compact)
+
+        if self.compact:
+            df = self.__compact(df)
+
         return df
 
-    def merge_dataframes(self, orig_df, debt_to_income_df):
+    def stream_src_into_dataframes(self, relative_src_file_path, chunk_size=100_000):
+        '''
+        Read the source csv data file in chunks so that memory usage depends on the chunk size, not the file size.
+
+        :param relative_src_file_path: The relative file path where the source csv data file is stored.
+        :param chunk_size: The maximum number of rows in each chunk.
+        :return: A generator of Pandas dataframes, one per chunk of the source csv data file.
         '''
-        Merge the original Pandas dataframe with debt_to_income_df dataframe.
+        if os.path.isdir(relative_src_file_path):
+            chunks = ColumnarDataset(relative_src_file_path).iter_chunks(chunk_size, decode_text=not self.compact)
+        else:
+            chunks = self.__read_csv(relative_src_file_path, self.compact, chunksize=chunk_size)
+
+        for chunk_df in chunks:
+            yield self.__compact(chunk_df) if self.compact else chunk_df
+
+    def __find_key_collisions(self, business_ids, side):
+        '''
+        Find business_id values that appear more than once.
+
+        :param business_ids: The Pandas index of business_id values.
+        :param side: The name of the dataframe the values come from, used in the report.
+        :return: The Pandas dataframe with the side, business_id and number of rows of each duplicated key.
+        '''
+        if business_ids.is_unique:
+            return pd.DataFrame(columns=['side', 'business_id', 'cnt_of_rows'])
+
+        counts = business_ids.value_counts()
+        counts = counts[counts > 1]
+        return pd.DataFrame({'side': side, 'business_id': counts.index, 'cnt_of_rows': counts.to_numpy()})
+
+    def merge_dataframes(self, orig_df, debt_to_income_df, on_key_collision='collapse'):
+        '''
+        Attach debt_to_income_ratio to the original Pandas dataframe, joined on business_id.
+        The result always has one row per row of orig_df. When both dataframes list the same business_id values in
+        the same order, the ratios are attached by position. Otherwise debt_to_income_df is looked up through a hashed
+        business_id index in which duplicate keys are collapsed to their first row, so duplicates never multiply rows.
+        Key collisions are printed and kept in self.key_collisions.
+        Main.run() attaches its ratios with utils/ratios.py instead; this join is kept for ratios computed apart
+        from the cleaned rows.
 
         :param orig_df: The Pandas dataframe created by reading and loading the source csv data file.
         :param debt_to_income_df: The Pandas dataframe with the result of dividing total_long_term_debt by total_revenue.
-        :return: The combination of the original pandas dataframe and debt_to_income_df dataframe.
+        :param on_key_collision: 'collapse' to keep the first row of a duplicated key, or 'raise' to reject it.
+        :return: The original pandas dataframe with the debt_to_income_ratio column.
+        :raises ValueError: If on_key_collision is 'raise' and a business_id appears more than once.
         '''
-        debt_to_income_df = debt_to_income_df[['business_id', 'debt_to_income_ratio']]      # remove unnecessary columns
-        merged_df = orig_df.merge(right=debt_to_income_df, how='inner', on='business_id')
-        return merged_df
\ No newline at end of file
+        left_ids = pd.Index(orig_df['business_id'])
+        right_ids = pd.Index(debt_to_income_df['business_id'])
+        ratios = debt_to_income_df['debt_to_income_ratio'].to_numpy()
+
+        self.key_collisions = pd.concat([self.__find_key_collisions(left_ids, 'left'),
+                                         self.__find_key_collisions(right_ids, 'right')], ignore_index=True)
+
+        if len(self.key_collisions) > 0:
+            if on_key_collision == 'raise':
+                raise ValueError(f'Duplicate business_id keys found:\n{self.key_collisions.to_string()}')
+
+            print(f'WARNING: {len(self.key_collisions)} duplicate business_id keys found; '
+                  f'keeping the first debt_to_income_ratio of each key.')
+            print(f'{self.key_collisions.to_string()}\n')
+
+        if left_ids.equals(right_ids):
+            # both dataframes come from the same rows, so the ratios line up by position
+            aligned_ratios = ratios
+        else:
+            is_first = ~right_ids.duplicated(keep='first')
+            positions = right_ids[is_first].get_indexer(left_ids)
+
+            aligned_ratios = ratios[is_first][positions].astype('float64')
+            aligned_ratios[positions == -1] = float('nan')
+
+            if (positions == -1).any():
+                print(f'WARNING: {(positions == -1).sum()} rows have no matching business_id in debt_to_income_df.')
+
+        merged_df = orig_df.assign(debt_to_income_ratio=aligned_ratios)
+        return merged_df
+
+    def compare_memory_footprint(self, relative_src_file_path):
+        '''
+        Compare the memory footprint of the current layout (column_type) and the compact layout
+        (compact_column_type) of the same source file.
+
+        :param relative_src_file_path: The relative file path where the source csv data file or cache entry is stored.
+        :return: The Pandas dataframe with the dtype and size in bytes of each column in both layouts.
+        '''
+        current_df = Loader(compact=False).load_src_into_dataframe(relative_src_file_path)
+        current_df = current_df.rename(columns=new_column_mapping)
+        apply_schema(current_df, column_type)
+
+        compact_df = Loader(compact=True).load_src_into_dataframe(relative_src_file_path)
+        compact_df = compact_df.rename(columns=new_column_mapping)
+
+        footprint_df = pd.DataFrame({
+            'current_dtype': current_df.dtypes.astype(str),
+            'current_bytes': current_df.memory_usage(deep=True, index=False),
+            'compact_dtype': compact_df.dtypes.astype(str),
+            'compact_bytes': compact_df.memory_usage(deep=True, index=False)
+        })
+        footprint_df.loc['total'] = ['', footprint_df['current_bytes'].sum(), '', footprint_df['compact_bytes'].sum()]
+        footprint_df['reduction'] = footprint_df['current_bytes'] / footprint_df['compact_bytes']
+        return footprint_df
@@ -5,125 +5,648 @@ Description:
 
 Parameters:
     src_file_path (str): Path to the source data file used by the Extractor.
+    force_rebuild (bool): Whether to convert the workbook again instead of reusing the conversion cache.
+    output_filepath (str): The directory where chart figures and result files are saved.
+    compact (bool): Whether to use the compact schema (categorical states, downcast integers).
+    chart_workers (int): The number of worker processes that render charts. 1 renders them in this process and
+        0 skips the visualization stage.
+    report_format (str): The file format of the result files: 'csv', 'jsonl' or 'parquet'.
+    summary_only (bool): Whether to skip the detail tables and only write counts and the statistics by state.
+    preview_rows (int): The maximum number of rows printed to the console for each result set.
+    recorder (StageRecorder): Records the time, memory and row counts of each stage of run(). Defaults to a
+        disabled recorder.
+    checkpoint_cache (CheckpointCache): The on-disk cache of stage outputs, so stages whose inputs did not change are
+        loaded instead of executed. None disables checkpoints.
+    engine (str): 'pandas' runs the analyses on dataframes, 'sqlite' runs them as SQL queries on an indexed SQLite
+        database.
+    sqlite_path (str): The SQLite database file of the sqlite engine, or ':memory:'.
+    sheets (list): The sheets of each workbook to read, by name or position, or '*' for every sheet. None reads the
+        first sheet.
+    cache_max_size_bytes (int): The maximum total size of the conversion cache of workbooks.
 
 Methods:
-    run(): Executes the full ETL and analysis pipeline.
+    run(data_file_path): Executes the full ETL and analysis pipeline.
+    run_streaming(chunk_size): Computes the descriptive statistics by state one chunk at a time.
+    report_memory_footprint(): Prints the memory footprint of the current and compact layouts.
+    update_aggregate_store(store_path, data_file_paths): Adds new data files to the persisted per-state aggregates.
+    rebuild_aggregate_store(store_path, data_file_paths): Rebuilds the persisted per-state aggregates from raw files.
+    verify_aggregate_store(store_path): Checks the persisted aggregates against a full recompute.
+    serve(data_file_path, host, port, cache_size, reload_interval): Answers queries over the resident data set.
+    list_checkpoints(): Prints the stage checkpoints, most recently used first.
+    clear_checkpoints(stage): Removes every stage checkpoint, or only those of one stage.
 
 Functions:
     - locate_data_file(): Finds the specified data file.
+    - extract_data_file(file_path): Converts a given data file without prompting the user.
+    - read_xlsx(file_path, sheets): Streams the selected sheets of a workbook straight into typed columns.
     - load_src_into_dataframe(file_path): Loads data from the csv file into a dataframe.
+    - convert_to_columnar(file_path, dataset_dir): Writes a csv file or workbook as a memory-mapped columnar dataset.
+    - stream_src_into_dataframes(file_path, chunk_size): Loads data from the csv file in chunks of bounded size.
+    - validate(df): Checks every row against the schema and quarantines failing rows with reason codes.
     - normalize_column_names(df): Standardizes source column names using snake_case.
     - cast_column_data_type(df): Casts data type of each column to an appropriate type.
+    - compare_memory_footprint(file_path): Compares the memory footprint of the current and compact layouts.
     - identify_duplicate_rows(df): Finds duplicate records by all columns.
     - drop_column(df): Drops unnecessary column(s).
     - round_to_two_decimal_places(df): Rounds numeric columns into two decimal places.
+    - preprocess(df): Normalizes, casts, finds duplicates, counts nulls and rounds in one pass.
+    - transform_chunk(df): Normalizes, casts and rounds a chunk of the source data.
     - filter_rows(df): Filters records with negative debt_to_equity.
-    - compute_desc_stats(df): Computes for descriptive statistics (mean, median, min, max).
+    - screen_rows(df, rules): Evaluates every screening rule in utils/mapping.py in one pass into a bitmask per row.
+    - build_state_cube(df): Aggregates every metric by state in one groupby pass.
+    - compute_desc_stats(df, state_cube): Computes for descriptive statistics (mean, median, min, max).
+    - compute_desc_stats_by_chunk(chunks): Computes for descriptive statistics one chunk at a time.
+    - compute_state_aggregates(chunks): Computes mergeable per-state aggregates one chunk at a time.
+    - compare_desc_stats(df, expected_df): Compares two descriptive statistics dataframes cell by cell.
+    - compare_medians(df, orig_df, rank_errors): Checks estimated medians against the rank error bounds.
     - compute_debt_to_income_ratios(df): Computes for debt_to_income ratios.
-    - merge_dataframes(df, debt_to_income_df): Merges df with debt_to_income_df dataframe.
-     - create_bar_chart(df): Create a bar chart showing the top 5 states with the highest total liabilities.
-    - create_pie_chart(df): Create a pie chart showing the top 5 states with the highest sum of total_revenue.
-    - create_scatter_plot(df): Create a scatter plot showing the relationship between average total_revenue and
-        average debt_to_income ratio for each state.
-    - create_horizontal_bar_chart(df): Create a horizontal bar chart showing the total count of businesses for
-        each state.
+    - attach_ratios(df): Computes every ratio in utils/mapping.py in one pass and attaches them to df as a block.
+    - compute_state_ratios(state_cube): Computes ratios of per-state sums, e.g. the revenue-weighted margin.
+    - get_top_businesses(df, column, n, per_state): Gets the N businesses with the highest value of a column.
+    - load_dataframe(df, fingerprint): Bulk-loads the cleaned data into the SQLite database of the sqlite engine.
+    - load_chunks(chunks, fingerprint): Bulk-loads cleaned chunks into the SQLite database of the sqlite engine.
+    - create_bar_chart(state_cube): Create a bar chart showing the top 5 states with the highest total liabilities.
+    - create_pie_chart(state_cube): Create a pie chart showing the top 5 states with the highest sum of total_revenue.
+    - create_scatter_plot(state_cube): Create a scatter plot showing the relationship between average
+        total_revenue and average debt_to_income ratio for each state.
+    - create_horizontal_bar_chart(state_cube): Create a horizontal bar chart showing the total count of businesses
+        for each state.
+    - create_all_charts(state_cube, max_workers): Creates the four charts concurrently in worker processes.
+    - write(name, title, df): Writes a result set to a file in chunks and prints a bounded preview.
+    - stage(name, rows_in): Records the wall time, CPU time, memory and row counts of a stage.
+    - get(name): Gets the output of a pipeline stage from memory, a checkpoint or by executing it.
 '''
 
+import argparse
+import os
+
+import pandas as pd
+
 from extractor import Extractor
+from server import QueryService
 from transformer import Transformer
 from loader import Loader
 from analyzer import Analyzer
+from sqlite_analyzer import SQLiteAnalyzer
 from visualizer import Visualizer
+from reporter import ReportWriter
+from batch import BatchRunner
+from utils.aggregate_store import AggregateStore
+from utils.checkpoint import CheckpointCache
+from utils.columnar import ColumnarDataset, convert_to_columnar
+from utils.conversion_cache import hash_file
+from utils.instrumentation import StageRecorder
+from utils.mapping import (new_column_mapping, column_type, compact_column_type, column_constraints,
+                           ratio_definitions, state_ratio_definitions, screening_rules)
+from utils.pipeline import StageGraph
+from utils.validation import count_reasons
 
 src_file_path = 'source_data'
+aggregate_store_path = 'output/aggregate_store.json'
+run_record_filename = 'run_record.json'
+checkpoint_dirpath = f'{src_file_path}/.cache/checkpoints'
+
+# bump to invalidate every stage checkpoint after a change the code fingerprints do not cover
+checkpoint_version = '1'
 
 class Main:
-    def __init__(self, src_file_path):
-        self.extractor = Extractor(src_file_path)
-        self.transformer = Transformer()
-        self.loader = Loader()
+    def __init__(self, src_file_path, force_rebuild=False, output_filepath='output', compact=False, chart_workers=4,
+                 report_format='csv', summary_only=False, preview_rows=20, recorder=None, checkpoint_cache=None,
+                 engine='pandas', sqlite_path=':memory:', sheets=None, cache_max_size_bytes=1024 ** 3):
+        self.extractor = Extractor(src_file_path, force_rebuild, cache_max_size_bytes, sheets)
+        self.transformer = Transformer(compact_column_type if compact else column_type)
+        self.loader = Loader(compact)
         self.analyzer = Analyzer()
-        self.visualizer = Visualizer()
+        self.visualizer = Visualizer(output_filepath)
+        self.chart_workers = chart_workers
+        self.reporter = ReportWriter(output_filepath, report_format, preview_rows=preview_rows,
+                                     summary_only=summary_only)
+        self.recorder = recorder if recorder is not None else StageRecorder()
+        self.checkpoint_cache = checkpoint_cache
+        self.sqlite_analyzer = SQLiteAnalyzer(sqlite_path) if engine == 'sqlite' else None
+
+    def __build_stage_graph(self, src_file_path):
+        '''
+        Describe the stages of run() as a dependency graph. The load stage is fingerprinted by the content of the
+        data file and the schema; every other stage by its code and the fingerprints of the stages it reads.
 
-    def run(self):
+        :param src_file_path: The csv data file or conversion cache entry to load.
+        :return: The StageGraph of the pipeline.
+        '''
+        if os.path.isdir(src_file_path):
+            # columnar datasets, such as conversion cache entries, keep a digest of their data in the manifest
+            source_hash = ColumnarDataset(src_file_path).digest
+        else:
+            source_hash = hash_file(src_file_path)
+
+        graph = StageGraph(self.checkpoint_cache, self.recorder, checkpoint_version)
+        graph.add('load', lambda: self.loader.load_src_into_dataframe(src_file_path),
+                  params={'source': source_hash, 'compact': self.loader.compact}, code=[Loader])
+        graph.add('validate', self.transformer.validate, ['load'],
+                  params={'schema': self.transformer.schema, 'constraints': column_constraints},
+                  code=[Transformer])
+        # duplicates are reported, but stay in every statistic as in the streaming paths
+        graph.add('preprocess', lambda validated: self.transformer.preprocess(validated[0], drop_duplicates=False),
+                  ['validate'], params={'schema': self.transformer.schema, 'mapping': new_column_mapping},
+                  code=[Transformer])
+        graph.add('duplicates', lambda validated, preprocessed: validated[0].iloc[preprocessed[1].duplicate_positions]
+                  .rename(columns=new_column_mapping), ['validate', 'preprocess'])
+
+        if self.sqlite_analyzer is None:
+            graph.add('filter', lambda preprocessed: self.analyzer.filter_rows(preprocessed[0]), ['preprocess'],
+                      code=[Analyzer])
+        else:
+            # the analyses run as SQL queries on the cleaned data, which is loaded into SQLite once per fingerprint
+            def load_sqlite(preprocessed):
+                if not self.sqlite_analyzer.is_loaded(graph.fingerprint('preprocess')):
+                    with self.recorder.stage('sqlite_load', len(preprocessed[0])) as stage:
+                        stage.rows_out = self.sqlite_analyzer.load_dataframe(preprocessed[0],
+                                                                             graph.fingerprint('preprocess'))
+                return self.sqlite_analyzer
+
+            graph.add('filter', lambda preprocessed: load_sqlite(preprocessed).filter_rows(), ['preprocess'],
+                      params={'engine': 'sqlite'}, code=[SQLiteAnalyzer])
+
+        # every screening rule is evaluated in one pass; only the counts and the flags of flagged rows are kept
+        def screen(preprocessed):
+            screening_result = self.analyzer.screen_rows(preprocessed[0])
+            flagged_df = screening_result.get_rows()[['business_id', 'business_state']]
+
+            return screening_result.get_counts().reset_index(), flagged_df.join(screening_result.get_flags())
+
+        graph.add('screening', screen, ['preprocess'], params={'rules': screening_rules},
+                  code=[Analyzer])
+
+        # every ratio is computed in one NumPy pass over the cleaned rows and attached to them, without a merge
+        graph.add('ratios', lambda preprocessed: self.analyzer.attach_ratios(preprocessed[0]), ['preprocess'],
+                  params={'definitions': ratio_definitions}, code=[Analyzer])
+        graph.add('state_cube', self.analyzer.build_state_cube, ['ratios'])
+        graph.add('top_businesses', lambda preprocessed: self.analyzer.get_top_businesses(preprocessed[0],
+                                                                                          'total_revenue', 3, True),
+                  ['preprocess'], code=[Analyzer])
+        graph.add('state_ratios', self.analyzer.compute_state_ratios, ['state_cube'],
+                  params={'definitions': state_ratio_definitions}, code=[Analyzer])
+
+        if self.sqlite_analyzer is None:
+            graph.add('stats', lambda preprocessed, state_cube: self.analyzer.compute_desc_stats(preprocessed[0],
+                                                                                                 state_cube),
+                      ['preprocess', 'state_cube'], code=[Analyzer])
+        else:
+            graph.add('stats', lambda preprocessed: load_sqlite(preprocessed).compute_desc_stats(), ['preprocess'],
+                      params={'engine': 'sqlite'}, code=[SQLiteAnalyzer])
+
+        return graph
+
+    def __report_quarantine(self, quarantine_df):
+        '''
+        Write the number of quarantined rows by reason code and, unless only summaries are written, the
+        quarantined rows themselves.
+
+        :param quarantine_df: The Pandas dataframe of quarantined rows with their reasons.
+        '''
+        reasons_df = count_reasons(quarantine_df)
+        self.reporter.write('quarantine_reasons', 'QUARANTINED RECORDS BY REASON', reasons_df,
+                            preview_rows=len(reasons_df))
+
+        if not self.reporter.summary_only:
+            self.reporter.write('quarantined_records', 'QUARANTINED RECORDS', quarantine_df)
+
+    def __validate_chunks(self, chunks, quarantined_chunks):
+        '''
+        Validate chunks one at a time and keep their quarantined rows.
+
+        :param chunks: The Pandas dataframe chunks read from the source file.
+        :param quarantined_chunks: The list the quarantined rows of each chunk are appended to.
+        :return: A generator of the valid rows of each chunk.
+        '''
+        for chunk_df in chunks:
+            valid_df, quarantine_df = self.transformer.validate(chunk_df)
+
+            if len(quarantine_df) > 0:
+                quarantined_chunks.append(quarantine_df)
+
+            yield valid_df
+
+    def run(self, data_file_path=None):
         '''
         Execute functions that extract, transform, load, and analyze business data.
+
+        :param data_file_path: The excel or csv data file to process. If None, the user is asked for a filename.
+        :return: The Pandas dataframe with descriptive statistics by state, or None if the user exits.
         '''
-        src_file_path = self.extractor.locate_data_file()
+        # with a prompt, the locate stage includes the time the user takes to answer
+        with self.recorder.stage('locate'):
+            if data_file_path is None:
+                src_file_path = self.extractor.locate_data_file()
+            else:
+                src_file_path = self.extractor.extract_data_file(data_file_path)
 
         if src_file_path == None:
             return      # end program
 
-        # load source csv data into a dataframe
-        original_df = self.loader.load_src_into_dataframe(src_file_path)
+        # stages are only executed when their output is needed and has no checkpoint
+        graph = self.__build_stage_graph(src_file_path)
 
         # ----- data pre-processing starts here ------
-        # normalize column names
-        original_df = self.transformer.normalize_column_names(original_df)
+        # check every row against the schema before casting; failing rows are quarantined with reason codes
+        quarantine_df = graph.get('validate')[1]
 
-        # cast data types for columns
-        self.transformer.cast_column_data_type(original_df)
+        print()
+        self.__report_quarantine(quarantine_df)
+        del quarantine_df
 
-        # identify duplicate rows
-        original_df, dup_df = self.transformer.identify_duplicate_rows(original_df)
+        # normalize column names, cast data types, find duplicate rows, count null values and round to
+        # two decimal places in a single pass
+        original_df, preprocess_stats = graph.get('preprocess')
 
-        print('\n----- DUPLICATE RECORDS -----')
-        print(f'{dup_df.to_string()}\n')
+        if not self.reporter.summary_only:
+            dup_df = graph.get('duplicates')
+
+            with self.recorder.stage('report_duplicates', len(dup_df)):
+                self.reporter.write('duplicate_records', 'DUPLICATE RECORDS', dup_df)
+            del dup_df
+        graph.release('load')
+        graph.release('validate')
 
         # get count of unique and duplicate records in original_df
         print('----- TOTAL COUNT OF UNIQUE & DUPLICATE RECORDS -----')
-        cnt_of_is_dup = original_df.groupby('is_dup').count().to_string()
-        print(f'{cnt_of_is_dup}\n')
-
-        # drop is_dup column from orig_df dataframe
-        original_df = self.transformer.drop_column(original_df)
+        print(f'Count of unique records: {preprocess_stats.unique_count}')
+        print(f'Count of duplicate records: {preprocess_stats.duplicate_count}\n')
 
         # check null values
         print('----- TOTAL COUNT OF NON-NULL VALUES -----')
-        for column in original_df.columns:
-            cnt_of_non_null_values = original_df[column].count()
-
+        for column, cnt_of_non_null_values in preprocess_stats.non_null_counts.items():
             print(f'Count of non-null values for {column}: {cnt_of_non_null_values}')
-
-        # round to nearest n decimal places
-        self.transformer.round_to_two_decimal_places(original_df)
         # ----- data pre-processing ends here ------
 
         # ----- analysis starts here -----
         # filter all businesses with negative debt-to-equity ratios
-        print('\n----- BUSINESSES WITH NEGATIVE DEBT-TO-EQUITY RATIOS -----')
-        neg_debt_to_equity_df = self.analyzer.filter_rows(original_df)
-        print(f"{neg_debt_to_equity_df[['business_id', 'business_state', 'debt_to_equity']].to_string()}\n")
+        print()
+        if self.reporter.summary_only:
+            with self.recorder.stage('filter', len(original_df)) as stage:
+                stage.rows_out = int((original_df['debt_to_equity'] < 0).sum())
 
-        # get descriptive statistics by state
-        print('----- DESCRIPTIVE STATISTICS BY STATE -----')
-        stats_df = self.analyzer.compute_desc_stats(original_df)
-        print(f'{stats_df.to_string()}\n')
+            print('----- BUSINESSES WITH NEGATIVE DEBT-TO-EQUITY RATIOS -----')
+            print(f'Count of businesses: {stage.rows_out}\n')
+        else:
+            neg_debt_to_equity_df = graph.get('filter')
+            self.reporter.write('negative_debt_to_equity', 'BUSINESSES WITH NEGATIVE DEBT-TO-EQUITY RATIOS',
+                                neg_debt_to_equity_df[['business_id', 'business_state', 'debt_to_equity']])
+            del neg_debt_to_equity_df
+
+        # count the businesses flagged by each screening rule, and list the flags of each flagged business
+        screening_counts_df, screening_flags_df = graph.get('screening')
+        self.reporter.write('screening_summary', 'SCREENING RULES', screening_counts_df,
+                            preview_rows=len(screening_counts_df))
 
-        # get debt-to-income ratio for all rows
-        print('----- DEBT-TO-INCOME RATIO FOR EVERY BUSINESS -----')
+        if not self.reporter.summary_only:
+            self.reporter.write('screening_flags', 'BUSINESSES FLAGGED BY SCREENING RULES', screening_flags_df)
+        del screening_flags_df
 
-        debt_to_income_df = self.analyzer.compute_debt_to_income_ratios(original_df)
-        print('----- DEBT-TO-INCOME DATAFRAME-----')
-        print(f'{debt_to_income_df.to_string()}\n')
+        # the per-state cube aggregates every metric in one pass; the statistics and every chart read from it
+        state_cube = graph.get('state_cube')
 
-        # merge debt_to_income_df dataframe with original_df dataframe by business_id
-        print('----- MERGE OF DEBT_TO_INCOME_DF AND ORIGINAL_DF DATAFRAME-----')
-        merged_df = self.loader.merge_dataframes(original_df, debt_to_income_df)
-        print(merged_df.to_string())
+        # get descriptive statistics by state; there is one row per state, so the whole table is printed
+        stats_df = graph.get('stats')
+        self.reporter.write('desc_stats_by_state', 'DESCRIPTIVE STATISTICS BY STATE', stats_df,
+                            preview_rows=len(stats_df))
+
+        # get the revenue-weighted profit margin and the other ratios of per-state sums
+        state_ratios_df = graph.get('state_ratios')
+        self.reporter.write('ratios_by_state', 'RATIOS BY STATE', state_ratios_df, preview_rows=len(state_ratios_df))
+
+        if not self.reporter.summary_only:
+            # the ratios of every row are already attached to original_df
+            merged_df = graph.get('ratios')
+            debt_to_income_df = merged_df[['business_id', 'total_long_term_debt', 'total_revenue',
+                                           'debt_to_income_ratio']]
+
+            top_businesses_df = graph.get('top_businesses')
+
+            with self.recorder.stage('report_details', len(merged_df)):
+                self.reporter.write('top_revenue_by_state', 'TOP 3 BUSINESSES BY TOTAL REVENUE IN EACH STATE',
+                                    top_businesses_df)
+                self.reporter.write('debt_to_income', 'DEBT-TO-INCOME RATIO FOR EVERY BUSINESS', debt_to_income_df)
+                self.reporter.write('merged', 'MERGE OF DEBT_TO_INCOME_DF AND ORIGINAL_DF DATAFRAME', merged_df)
         # ----- analysis ends here -----
 
         # ----- visualization starts here -----
-        self.visualizer.create_bar_chart(merged_df)
+        if self.chart_workers != 0:
+            with self.recorder.stage('charts', len(state_cube)):
+                chart_timings = self.visualizer.create_all_charts(state_cube, self.chart_workers)
 
-        self.visualizer.create_pie_chart(merged_df)
+            # each chart is timed in the process that rendered it
+            for chart_name, wall_seconds, cpu_seconds in chart_timings:
+                self.recorder.add(f'chart_{chart_name}', wall_seconds, cpu_seconds, len(state_cube))
+        # ----- visualization ends here -----
 
-        self.visualizer.create_scatter_plot(merged_df)
+        return stats_df
 
-        self.visualizer.create_horizontal_bar_chart(merged_df)
-        # ----- visualization ends here -----
+    def run_streaming(self, chunk_size):
+        '''
+        Compute the descriptive statistics by state without loading the whole source file into memory.
+        Each chunk is validated, pushed through the transformation steps and folded into running per-state
+        aggregates, or loaded into the SQLite database with the sqlite engine.
+
+        :param chunk_size: The maximum number of rows held in memory at a time.
+        '''
+        src_file_path = self.extractor.locate_data_file()
+
+        if src_file_path == None:
+            return      # end program
+
+        # each chunk is validated before it is cast, so a failing row is quarantined instead of aborting the run
+        quarantined_chunks = []
+        chunks = (self.transformer.transform_chunk(valid_df)
+                  for valid_df in self.__validate_chunks(
+                      self.loader.stream_src_into_dataframes(src_file_path, chunk_size), quarantined_chunks))
+
+        if self.sqlite_analyzer is None:
+            stats_df = self.analyzer.compute_desc_stats_by_chunk(chunks)
+        else:
+            # out-of-core path: the chunks are loaded into SQLite, so medians are exact instead of estimated
+            row_count = self.sqlite_analyzer.load_chunks(chunks)
+            print(f'Loaded {row_count} rows into {self.sqlite_analyzer.database_path}')
+            stats_df = self.sqlite_analyzer.compute_desc_stats()
+
+        print('----- DESCRIPTIVE STATISTICS BY STATE -----')
+        print(f'{stats_df.to_string()}\n')
+
+        if quarantined_chunks:
+            self.__report_quarantine(pd.concat(quarantined_chunks))
+
+    def report_memory_footprint(self):
+        '''
+        Print the memory footprint of the current and compact layouts of a data file, column by column.
+        '''
+        src_file_path = self.extractor.locate_data_file()
+
+        if src_file_path == None:
+            return      # end program
+
+        print('----- MEMORY FOOTPRINT: CURRENT VS COMPACT LAYOUT -----')
+        footprint_df = self.loader.compare_memory_footprint(src_file_path)
+        print(f'{footprint_df.to_string()}\n')
+
+    def serve(self, data_file_path, host='127.0.0.1', port=8598, cache_size=256, reload_interval=2.0):
+        '''
+        Load and preprocess a data file once and answer queries over it from a local HTTP service until
+        interrupted. The data file is loaded again when it changes.
+
+        :param data_file_path: The excel or csv data file, or columnar dataset directory, to serve.
+        :param host: The address to bind to.
+        :param port: The port to listen on.
+        :param cache_size: The maximum number of cached responses.
+        :param reload_interval: The number of seconds between two checks of the data file.
+        '''
+        service = QueryService(data_file_path, self.extractor, self.loader, self.transformer, self.analyzer,
+                               cache_size, reload_interval)
+        service.serve(host, port)
+
+    def list_checkpoints(self):
+        '''
+        Print the stage checkpoints, most recently used first.
+
+        :return: The Pandas dataframe with the stage, size, creation and last use time of each checkpoint.
+        '''
+        entries_df = self.checkpoint_cache.list_entries()
+
+        print('----- STAGE CHECKPOINTS -----')
+        print(f'{entries_df.to_string()}')
+        print(f"{len(entries_df)} checkpoints, {entries_df['size'].sum()} bytes in {self.checkpoint_cache.cache_dir}\n")
+        return entries_df
+
+    def clear_checkpoints(self, stage=None):
+        '''
+        Remove every stage checkpoint, or only those of one stage.
+
+        :param stage: The name of the stage, or None to remove every checkpoint.
+        '''
+        removed_count = self.checkpoint_cache.clear(stage)
+        print(f'Removed {removed_count} checkpoints')
+
+    def __stream_transformed_chunks(self, data_file_path, chunk_size):
+        '''
+        Read a data file in chunks and push each chunk through the transformation steps.
+
+        :param data_file_path: The excel or csv data file.
+        :param chunk_size: The maximum number of rows held in memory at a time.
+        :return: A generator of transformed Pandas dataframe chunks.
+        '''
+        src_file_path = self.extractor.extract_data_file(data_file_path)
+        quarantined_chunks = []
+
+        for valid_df in self.__validate_chunks(self.loader.stream_src_into_dataframes(src_file_path, chunk_size),
+                                               quarantined_chunks):
+            yield self.transformer.transform_chunk(valid_df)
+
+        if quarantined_chunks:
+            print(f'Quarantined {sum(len(chunk_df) for chunk_df in quarantined_chunks)} rows of {data_file_path}')
+
+    def update_aggregate_store(self, store_path, data_file_paths, chunk_size=100_000):
+        '''
+        Add new data files to the persisted per-state aggregates. Only the rows of the new files are read, and files
+        that were already added (by content) are skipped.
+
+        :param store_path: The path of the aggregate store file.
+        :param data_file_paths: The excel or csv data files to add.
+        :param chunk_size: The maximum number of rows held in memory at a time.
+        :return: The Pandas dataframe with descriptive statistics by state of every file in the store.
+        '''
+        store = AggregateStore(store_path)
+
+        for data_file_path in data_file_paths:
+            if store.is_ingested(data_file_path):
+                print(f'Skipping {data_file_path}: already in the aggregate store')
+                continue
+
+            aggregates = self.analyzer.compute_state_aggregates(
+                self.__stream_transformed_chunks(data_file_path, chunk_size))
+            store.add(data_file_path, aggregates)
+
+            print(f'Added {aggregates.row_count} rows from {data_file_path} to the aggregate store')
+
+        aggregates, _ = store.load()
+
+        if aggregates is None:
+            return None
+
+        print('\n----- DESCRIPTIVE STATISTICS BY STATE (AGGREGATE STORE) -----')
+        stats_df = aggregates.to_stats_df()
+        print(f'{stats_df.to_string()}\n')
+        return stats_df
+
+    def rebuild_aggregate_store(self, store_path, data_file_paths=None, chunk_size=100_000):
+        '''
+        Rebuild the persisted per-state aggregates from raw data files.
+
+        :param store_path: The path of the aggregate store file.
+        :param data_file_paths: The excel or csv data files. If None, the files recorded in the store are used.
+        :param chunk_size: The maximum number of rows held in memory at a time.
+        :return: The Pandas dataframe with descriptive statistics by state of every file in the store.
+        '''
+        store = AggregateStore(store_path)
+
+        if data_file_paths is None:
+            _, ingested_files = store.load()
+            data_file_paths = [details['file'] for details in ingested_files.values()]
+
+        store.clear()
+        return self.update_aggregate_store(store_path, data_file_paths, chunk_size)
+
+    def verify_aggregate_store(self, store_path):
+        '''
+        Check the persisted aggregates against a full recompute over the files recorded in the store.
+        Counts, means, minimums and maximums must match. Medians are estimates once a state has more values than the
+        sketch capacity, so their rank among the values of the state must be within the rank error bound of the sketch.
+
+        :param store_path: The path of the aggregate store file.
+        :return: The Pandas dataframe with one row per mismatching statistic (empty if the store is consistent).
+        '''
+        aggregates, ingested_files = AggregateStore(store_path).load()
+
+        if aggregates is None:
+            print('ERROR: The aggregate store is empty.')
+            return None
+
+        # quarantined rows were never added to the store, so they are left out of the recompute too
+        full_df = pd.concat([self.transformer.transform_chunk(self.transformer.validate(
+                                 self.loader.load_src_into_dataframe(
+                                     self.extractor.extract_data_file(details['file'])))[0])
+                             for details in ingested_files.values()], ignore_index=True)
+
+        stats_df = aggregates.to_stats_df()
+        expected_stats_df = self.analyzer.compute_desc_stats(full_df)
+        exact_statistics = [statistic for statistic in stats_df.columns.levels[1] if statistic != 'median']
+
+        # the counts are compared as statistics of their own, next to the exact statistics
+        counts_df = pd.concat({'count': aggregates.count}, axis=1).swaplevel(axis=1)
+        expected_counts_df = pd.concat(
+            {'count': full_df.groupby('business_state', observed=True)[aggregates.numeric_columns].count()},
+            axis=1).swaplevel(axis=1)
+
+        mismatch_df = pd.concat([
+            self.analyzer.compare_desc_stats(
+                pd.concat([stats_df.loc[:, (slice(None), exact_statistics)], counts_df], axis=1),
+                pd.concat([expected_stats_df.loc[:, (slice(None), exact_statistics)], expected_counts_df], axis=1)),
+            self.analyzer.compare_medians(stats_df, full_df, aggregates.get_median_rank_errors())
+        ], ignore_index=True)
+
+        print('----- AGGREGATE STORE VS FULL RECOMPUTE -----')
+        if len(mismatch_df) == 0:
+            print(f'All statistics match the full recompute over {len(ingested_files)} files; medians are within '
+                  f'the rank error bounds of their sketches.\n')
+        else:
+            print(f'{mismatch_df.to_string()}\n')
+
+        return mismatch_df
 
 if __name__ == '__main__':
-    main = Main(src_file_path)
+    parser = argparse.ArgumentParser(description='Equity fund analysis pipeline.')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='stream the source file in chunks of this many rows and only compute the statistics '
+                             'by state')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help='convert the workbook again even if the conversion cache is up to date')
+    parser.add_argument('--cache-max-size', type=int, default=1024,
+                        help='maximum size of the workbook conversion cache in MB; least recently used entries are '
+                             'evicted, and a workbook larger than the whole cache is not cached')
+    parser.add_argument('--batch', metavar='PATH_OR_GLOB',
+                        help='process every data file in a directory or matching a glob pattern without prompting')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='maximum number of worker processes used by --batch')
+    parser.add_argument('--output-dir', default='output',
+                        help='directory where outputs are written')
+    parser.add_argument('--compact', action='store_true',
+                        help='read business_state as a categorical and downcast integer columns')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='only print the memory footprint of the current and compact layouts')
+    parser.add_argument('--store', default=aggregate_store_path,
+                        help='path of the persisted per-state aggregate store')
+    parser.add_argument('--store-update', metavar='PATH_OR_GLOB',
+                        help='add new data files to the aggregate store, reading only their rows')
+    parser.add_argument('--store-rebuild', metavar='PATH_OR_GLOB', nargs='?', const='',
+                        help='rebuild the aggregate store from raw files (default: the files already in the store)')
+    parser.add_argument('--store-verify', action='store_true',
+                        help='check the aggregate store against a full recompute')
+    parser.add_argument('--chart-workers', type=int, default=4,
+                        help='worker processes used to render the charts (1 renders them in-process, 0 skips charts)')
+    parser.add_argument('--report-format', choices=['csv', 'jsonl', 'parquet'], default='csv',
+                        help='file format of the result files written to the output directory')
+    parser.add_argument('--summary-only', action='store_true',
+                        help='skip the detail tables and only write counts and the statistics by state')
+    parser.add_argument('--preview-rows', type=int, default=20,
+                        help='maximum number of rows printed to the console for each result set')
+    parser.add_argument('--instrument', action='store_true',
+                        help='record the time, memory and row counts of each stage to output/run_record.json')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='with --instrument, also record the tracemalloc peak of each stage (slower)')
+    parser.add_argument('--prometheus-textfile', metavar='PATH',
+                        help='with --instrument, also write the stage metrics to a Prometheus textfile')
+    parser.add_argument('--no-checkpoints', action='store_true',
+                        help='execute every stage instead of loading unchanged stage outputs from checkpoints')
+    parser.add_argument('--checkpoint-max-size', type=int, default=2048,
+                        help='maximum size of the stage checkpoints in MB; least recently used ones are evicted')
+    parser.add_argument('--checkpoints-list', action='store_true', help='list the stage checkpoints')
+    parser.add_argument('--checkpoints-clear', metavar='STAGE', nargs='?', const='',
+                        help='remove every stage checkpoint, or only those of one stage')
+    parser.add_argument('--engine', choices=['pandas', 'sqlite'], default='pandas',
+                        help='run the analyses on dataframes or as SQL queries on an indexed SQLite database')
+    parser.add_argument('--sqlite-path', default=':memory:',
+                        help="SQLite database file of the sqlite engine (default ':memory:'); a file keeps the "
+                             'loaded data and indexes between runs')
+    parser.add_argument('--to-columnar', metavar=('SOURCE', 'DATASET_DIR'), nargs=2,
+                        help='write a csv file or workbook as a memory-mapped columnar dataset, which can then be '
+                             'processed in place of the file without parsing it')
+    parser.add_argument('--sheet', action='append', dest='sheets', metavar='NAME',
+                        help="sheet of the workbook to read; repeat it to read several sheets with the same header "
+                             "as one data set, or use '*' for every sheet (default: the first sheet)")
+    parser.add_argument('--serve', metavar='DATA_FILE',
+                        help='load and preprocess DATA_FILE once and answer queries over it from a local HTTP '
+                             'service, reloading it when it changes')
+    parser.add_argument('--host', default='127.0.0.1', help='with --serve, the address to bind to')
+    parser.add_argument('--port', type=int, default=8598, help='with --serve, the port to listen on')
+    parser.add_argument('--cache-entries', type=int, default=256,
+                        help='with --serve, maximum number of cached responses; least recently used ones are evicted')
+    parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help='with --serve, seconds between two checks of DATA_FILE for changes')
+    args = parser.parse_args()
+    sheets = '*' if args.sheets and '*' in args.sheets else args.sheets
+
+    recorder = StageRecorder(args.instrument, args.trace_memory)
+    checkpoint_cache = CheckpointCache(checkpoint_dirpath, args.checkpoint_max_size * 1024 ** 2)
+    main = Main(src_file_path, args.rebuild_cache, args.output_dir, args.compact, args.chart_workers,
+                args.report_format, args.summary_only, args.preview_rows, recorder,
+                None if args.no_checkpoints else checkpoint_cache, args.engine, args.sqlite_path, sheets,
+                args.cache_max_size * 1024 ** 2)
+
+    if args.checkpoints_list:
+        main.list_checkpoints()
+    elif args.checkpoints_clear is not None:
+        main.clear_checkpoints(args.checkpoints_clear or None)
+    elif args.serve:
+        main.serve(args.serve, args.host, args.port, args.cache_entries, args.reload_interval)
+    elif args.to_columnar:
+        print(f'Columnar dataset written to {convert_to_columnar(*args.to_columnar, sheets)}')
+    elif args.memory_report:
+        main.report_memory_footprint()
+    elif args.store_update:
+        main.update_aggregate_store(args.store, BatchRunner().find_data_files(args.store_update))
+    elif args.store_rebuild is not None:
+        main.rebuild_aggregate_store(args.store,
+                                     BatchRunner().find_data_files(args.store_rebuild) if args.store_rebuild else None)
+    elif args.store_verify:
+        main.verify_aggregate_store(args.store)
+    elif args.batch:
+        BatchRunner(args.output_dir, args.workers, args.rebuild_cache, args.compact,
+                    args.cache_max_size * 1024 ** 2).run(args.batch)
+    elif args.chunk_size:
+        main.run_streaming(args.chunk_size)
+    else:
+        main.run()
+
+        if args.instrument:
+            recorder.write_json(os.path.join(args.output_dir, run_record_filename))
 
-    main.run()
+            if args.prometheus_textfile:
+                recorder.write_prometheus(args.prometheus_textfile)
@@ -0,0 +1,153 @@
+'''
+Description:
+    This class writes result sets to files in the output directory instead of printing whole dataframes.
+    Each result set is streamed to disk in chunks of bounded size as csv, JSON Lines or Parquet, and the console
+    only shows the row count and a bounded preview.
+
+Parameters:
+    output_dir (str): The directory where result files are written.
+    file_format (str): The file format of the result files: 'csv', 'jsonl' or 'parquet' (requires pyarrow, checked
+        when the writer is created).
+    chunk_size (int): The maximum number of rows serialized at a time.
+    preview_rows (int): The maximum number of rows printed to the console for each result set.
+    summary_only (bool): Whether detail tables are skipped entirely; only summaries are written and printed.
+
+Methods:
+    - __flatten_columns(df): Joins multi-level column names into single strings.
+    - __iter_chunks(df): Iterates over a dataframe in chunks of bounded size.
+    - __write_csv(df, file_path): Streams a dataframe to a csv file in chunks.
+    - __write_jsonl(df, file_path): Streams a dataframe to a JSON Lines file in chunks.
+    - __write_parquet(df, file_path): Streams a dataframe to a Parquet file in chunks (requires pyarrow).
+    - write(name, title, df, preview_rows): Writes a result set to a file and prints its row count and a preview.
+'''
+
+import os
+
+file_extensions = {'csv': 'csv', 'jsonl': 'jsonl', 'parquet': 'parquet'}
+
+class ReportWriter:
+    def __init__(self, output_dir='output', file_format='csv', chunk_size=100_000, preview_rows=20,
+                 summary_only=False):
+        if file_format not in file_extensions:
+            raise ValueError(f"Unknown report format '{file_format}'. Expected one of {list(file_extensions)}.")
+
+        if file_format == 'parquet':
+            # fail before the pipeline runs rather than when the first result set is written
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as error:
+                raise ValueError("The 'parquet' report format requires pyarrow. Install it or use 'csv' or "
+                                 "'jsonl'.") from error
+
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.preview_rows = preview_rows
+        self.summary_only = summary_only
+
+    def __flatten_columns(self, df):
+        '''
+        Join multi-level column names, e.g. ('total_equity', 'mean'), into single strings such as 'total_equity_mean',
+        because JSON Lines and Parquet need plain string column names.
+
+        :param df: The Pandas dataframe to write.
+        :return: The Pandas dataframe with single-level string column names.
+        '''
+        if df.columns.nlevels > 1:
+            df = df.set_axis(['_'.join(str(level) for level in column) for column in df.columns], axis=1)
+
+        return df
+
+    def __iter_chunks(self, df):
+        '''
+        Iterate over a dataframe in chunks of at most chunk_size rows.
+
+        :param df: The Pandas dataframe to write.
+        :return: A generator of Pandas dataframe chunks.
+        '''
+        for start in range(0, len(df), self.chunk_size):
+            yield df.iloc[start:start + self.chunk_size]
+
+    def __write_csv(self, df, file_path):
+        '''
+        Stream a dataframe to a csv file in chunks.
+
+        :param df: The Pandas dataframe to write.
+        :param file_path: The path of the csv file.
+        '''
+        with open(file_path, 'w', newline='') as file:
+            if len(df) == 0:
+                df.to_csv(file)
+
+            for position, chunk_df in enumerate(self.__iter_chunks(df)):
+                chunk_df.to_csv(file, header=position == 0)
+
+    def __write_jsonl(self, df, file_path):
+        '''
+        Stream a dataframe to a JSON Lines file in chunks, one JSON object per row.
+
+        :param df: The Pandas dataframe to write.
+        :param file_path: The path of the JSON Lines file.
+        '''
+        df = self.__flatten_columns(df)
+
+        with open(file_path, 'w') as file:
+            for chunk_df in self.__iter_chunks(df):
+                lines = chunk_df.reset_index().to_json(orient='records', lines=True)
+
+                # older pandas versions do not end the last line with a newline
+                file.write(lines if lines.endswith('\n') else f'{lines}\n')
+
+    def __write_parquet(self, df, file_path):
+        '''
+        Stream a dataframe to a Parquet file in chunks, one row group per chunk.
+
+        :param df: The Pandas dataframe to write.
+        :param file_path: The path of the Parquet file.
+        '''
+        # pyarrow is only imported for Parquet reports; __init__ already checked that it is installed
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = self.__flatten_columns(df).reset_index()
+        schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+
+        with pq.ParquetWriter(file_path, schema) as writer:
+            for chunk_df in self.__iter_chunks(df):
+                writer.write_table(pa.Table.from_pandas(chunk_df, schema=schema, preserve_index=False))
+
+    def write(self, name, title, df, preview_rows=None):
+        '''
+        Write a result set to a file in the output directory, then print its title, row count, file path and a
+        bounded preview.
+
+        :param name: The file name of the result set, without extension.
+        :param title: The title printed to the console.
+        :param df: The Pandas dataframe to write.
+        :param preview_rows: The maximum number of rows to print. Defaults to the writer's preview_rows.
+        :return: The path of the written file.
+        '''
+        preview_rows = self.preview_rows if preview_rows is None else preview_rows
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_path = os.path.join(self.output_dir, f'{name}.{file_extensions[self.file_format]}')
+
+        if self.file_format == 'csv':
+            self.__write_csv(df, file_path)
+        elif self.file_format == 'jsonl':
+            self.__write_jsonl(df, file_path)
+        else:
+            self.__write_parquet(df, file_path)
+
+        print(f'----- {title} -----')
+        print(f'{len(df)} rows written to {file_path}')
+
+        if len(df) > 0 and preview_rows > 0:
+            if len(df) > preview_rows:
+                print(f'First {preview_rows} rows:')
+
+            print(f'{df.head(preview_rows).to_string()}')
+
+        print()
+        return file_path
@@ -0,0 +1,463 @@
+'''
+Description:
+    This class keeps the cleaned data set resident in a long-running local HTTP service, so questions such as
+    "stats for Texas" or "businesses with negative D/E in Ohio" are answered in milliseconds instead of by a full
+    Main.run.
+
+    The data file is extracted, loaded, validated and preprocessed once, the ratios are attached and the per-state
+    cube, statistics and ratios are computed once. A per-state index holds the row positions of every state, so a
+    query for one state only touches that state's rows. Responses are cached as encoded JSON in a least-recently-used
+    cache of bounded size.
+
+    A watcher thread checks the data file every few seconds. When it changes, a new snapshot is built next to the
+    current one and swapped in when it is complete, so queries keep being answered during a reload. The cache is
+    cleared at the same time. A file that fails to load, e.g. one that is still being written, leaves the current
+    snapshot in place.
+
+    The service binds to localhost by default and answers GET requests:
+    - /health: The data file, generation, row count and cache statistics.
+    - /stats?state=: Descriptive statistics by state.
+    - /ratios?state=: Ratios of per-state sums, e.g. the revenue-weighted profit margin.
+    - /negative_debt_to_equity?state=: Businesses with negative debt_to_equity.
+    - /screening?state=&rule=: Counts of the screening rules, or the businesses flagged by one rule.
+    - /top_businesses?column=&n=&state=: The N businesses with the highest value of a column.
+    - /top_states?column=&statistic=&n=: The N states with the highest statistic of a column.
+    - /businesses?state=&limit=: The rows of the businesses, with their ratios.
+    POST /reload reloads the data file immediately.
+
+Parameters:
+    data_file_path (str): The excel or csv data file, or columnar dataset directory, to serve.
+    extractor (Extractor): Converts the data file.
+    loader (Loader): Loads the converted data file.
+    transformer (Transformer): Preprocesses the loaded data.
+    analyzer (Analyzer): Answers the queries.
+    cache_size (int): The maximum number of cached responses.
+    reload_interval (float): The number of seconds between two checks of the data file.
+
+Methods:
+    - get_source_signature(): Gets the modification time and size of the data file.
+    - load(): Builds a new snapshot of the data file and swaps it in.
+    - check_reload(): Reloads the data file if it changed since the last load.
+    - query(name, params): Answers a query, from the cache if possible.
+    - get_health(): Describes the data file, the snapshot and the cache.
+    - serve(host, port): Answers HTTP requests until interrupted.
+'''
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from utils.columnar import manifest_filename
+
+class DataSnapshot:
+    '''
+    The cleaned data and precomputed per-state results of one load of the data file.
+
+    Parameters:
+        df (DataFrame): The cleaned Pandas dataframe with the ratios attached.
+        state_cube (DataFrame): The aggregate cube created by Analyzer.build_state_cube().
+        stats_df (DataFrame): The descriptive statistics by state.
+        state_ratios_df (DataFrame): The ratios of per-state sums.
+        generation (int): The number of the load, starting at 1.
+    '''
+    def __init__(self, df, state_cube, stats_df, state_ratios_df, generation):
+        self.df = df
+        self.state_cube = state_cube
+        self.stats_df = stats_df
+        self.state_ratios_df = state_ratios_df
+        self.generation = generation
+        self.loaded_at = time.time()
+
+        # a stable sort of the state codes buckets the row positions by state in O(n)
+        codes, states = pd.factorize(df['business_state'], sort=True)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.cumsum(np.bincount(codes + 1, minlength=len(states) + 1))
+
+        # the first bucket holds the rows without a state (code -1)
+        self.state_index = {str(state): order[start:stop]
+                            for state, start, stop in zip(states, bounds[:-1], bounds[1:])}
+
+    def get_rows(self, state=None):
+        '''
+        Get the rows of one state through the per-state index, or every row.
+
+        :param state: The business_state, or None for every state.
+        :return: The Pandas dataframe of the rows.
+        :raises KeyError: If the state has no rows.
+        '''
+        if state is None:
+            return self.df
+
+        return self.df.iloc[self.state_index[state]]
+
+class QueryService:
+    def __init__(self, data_file_path, extractor, loader, transformer, analyzer, cache_size=256, reload_interval=2.0):
+        self.data_file_path = data_file_path
+        self.extractor = extractor
+        self.loader = loader
+        self.transformer = transformer
+        self.analyzer = analyzer
+        self.cache_size = cache_size
+        self.reload_interval = reload_interval
+
+        self.snapshot = None
+        self.source_signature = None
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # the cache lock guards the cache and its counters; the reload lock makes concurrent reloads wait
+        self.cache_lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        self.queries = {
+            'stats': self.__query_stats,
+            'ratios': self.__query_ratios,
+            'negative_debt_to_equity': self.__query_negative_debt_to_equity,
+            'screening': self.__query_screening,
+            'top_businesses': self.__query_top_businesses,
+            'top_states': self.__query_top_states,
+            'businesses': self.__query_businesses
+        }
+
+    def get_source_signature(self):
+        '''
+        Get the modification time and size of the data file; for a columnar dataset, of its manifest, which is
+        written last.
+
+        :return: The tuple of (modification time in nanoseconds, size in bytes), or None if the file is missing.
+        '''
+        path = self.data_file_path
+
+        if os.path.isdir(path):
+            path = os.path.join(path, manifest_filename)
+
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        return status.st_mtime_ns, status.st_size
+
+    def load(self):
+        '''
+        Extract, load and preprocess the data file, attach the ratios and precompute the per-state results into a
+        new snapshot, then swap it in and clear the cache. Queries keep using the current snapshot until then.
+
+        :return: The new DataSnapshot.
+        '''
+        with self.reload_lock:
+            start_time = time.perf_counter()
+            signature = self.get_source_signature()
+
+            src_file_path = self.extractor.extract_data_file(self.data_file_path)
+            valid_df, quarantine_df = self.transformer.validate(self.loader.load_src_into_dataframe(src_file_path))
+            clean_df, _ = self.transformer.preprocess(valid_df)
+
+            merged_df = self.analyzer.attach_ratios(clean_df)
+            state_cube = self.analyzer.build_state_cube(merged_df)
+            generation = 1 if self.snapshot is None else self.snapshot.generation + 1
+
+            snapshot = DataSnapshot(merged_df, state_cube, self.analyzer.compute_desc_stats(clean_df, state_cube),
+                                    self.analyzer.compute_state_ratios(state_cube), generation)
+
+            with self.cache_lock:
+                self.snapshot = snapshot
+                self.source_signature = signature
+                self.cache.clear()
+
+            print(f'Loaded {len(merged_df)} rows of {self.data_file_path} (generation {generation}, '
+                  f'{len(quarantine_df)} rows quarantined) in {time.perf_counter() - start_time:.2f} seconds')
+            return snapshot
+
+    def check_reload(self):
+        '''
+        Reload the data file if its modification time or size changed since the last load. A file that fails to
+        load leaves the current snapshot in place; it is loaded again when it changes again.
+
+        :return: True if a new snapshot was loaded, otherwise False.
+        '''
+        signature = self.get_source_signature()
+
+        if signature is None or signature == self.source_signature:
+            return False
+
+        try:
+            self.load()
+            return True
+        except Exception as error:
+            self.source_signature = signature
+            print(f'WARNING: Could not reload {self.data_file_path}, still serving generation '
+                  f'{self.snapshot.generation}: {error!r}')
+            return False
+
+    def __watch_source(self):
+        '''
+        Check the data file for changes every reload_interval seconds until the service stops.
+        '''
+        while not self.stop_event.wait(self.reload_interval):
+            self.check_reload()
+
+    def __query_stats(self, snapshot, state=None):
+        '''
+        Get the descriptive statistics by state, precomputed at load time.
+
+        :param snapshot: The DataSnapshot to query.
+        :param state: The business_state, or None for every state.
+        :return: The Pandas dataframe with descriptive statistics.
+        '''
+        return snapshot.stats_df if state is None else snapshot.stats_df.loc[[state]]
+
+    def __query_ratios(self, snapshot, state=None):
+        '''
+        Get the ratios of per-state sums, precomputed at load time.
+
+        :param snapshot: The DataSnapshot to query.
+        :param state: The business_state, or None for every state.
+        :return: The Pandas dataframe with the ratios by state.
+        '''
+        return snapshot.state_ratios_df if state is None else snapshot.state_ratios_df.loc[[state]]
+
+    def __query_negative_debt_to_equity(self, snapshot, state=None):
+        '''
+        Get the businesses with negative debt_to_equity.
+
+        :param snapshot: The DataSnapshot to query.
+        :param state: The business_state, or None for every state.
+        :return: The Pandas dataframe with business_id, business_state and debt_to_equity.
+        '''
+        return self.analyzer.filter_rows(snapshot.get_rows(state))[['business_id', 'business_state',
+                                                                     'debt_to_equity']]
+
+    def __query_screening(self, snapshot, state=None, rule=None):
+        '''
+        Count the businesses flagged by each screening rule, or get the businesses flagged by one rule.
+
+        :param snapshot: The DataSnapshot to query.
+        :param state: The business_state, or None for every state.
+        :param rule: The name of a screening rule, or None for the counts of every rule.
+        :return: The Pandas dataframe with the counts, or with business_id and business_state of flagged rows.
+        '''
+        screening_result = self.analyzer.screen_rows(snapshot.get_rows(state))
+
+        if rule is None:
+            return screening_result.get_counts().reset_index()
+
+        return screening_result.get_rows(rule)[['business_id', 'business_state']]
+
+    def __query_top_businesses(self, snapshot, column='total_revenue', n='5', state=None):
+        '''
+        Get the N businesses with the highest value of a column.
+
+        :param snapshot: The DataSnapshot to query.
+        :param column: The numeric column to rank by.
+        :param n: The number of businesses to keep.
+        :param state: The business_state, or None for every state.
+        :return: The Pandas dataframe with business_id, business_state and the column.
+        '''
+        return self.analyzer.get_top_businesses(snapshot.get_rows(state), column, int(n))
+
+    def __query_top_states(self, snapshot, column='total_revenue', statistic='sum', n='5'):
+        '''
+        Get the N states with the highest statistic of a column, from the cube computed at load time.
+
+        :param snapshot: The DataSnapshot to query.
+        :param column: The numeric column.
+        :param statistic: The statistic of the cube to rank by.
+        :param n: The number of states to keep.
+        :return: The Pandas dataframe with one row per state.
+        '''
+        return self.analyzer.get_top_states(snapshot.state_cube, column, statistic, int(n)).to_frame()
+
+    def __query_businesses(self, snapshot, state=None, limit='100'):
+        '''
+        Get the rows of the businesses, with their ratios.
+
+        :param snapshot: The DataSnapshot to query.
+        :param state: The business_state, or None for every state.
+        :param limit: The maximum number of rows.
+        :return: The Pandas dataframe of at most limit rows.
+        '''
+        return snapshot.get_rows(state).head(int(limit))
+
+    def __encode(self, name, params, snapshot, result_df):
+        '''
+        Encode a query result as JSON. Multi-level columns are joined with '_' and the index becomes columns.
+
+        :param name: The name of the query.
+        :param params: The dictionary of query parameters.
+        :param snapshot: The DataSnapshot that answered the query.
+        :param result_df: The Pandas dataframe of the result.
+        :return: The UTF-8 encoded JSON response.
+        '''
+        if isinstance(result_df.columns, pd.MultiIndex):
+            result_df = result_df.set_axis(['_'.join(map(str, column)) for column in result_df.columns], axis=1)
+
+        if not isinstance(result_df.index, pd.RangeIndex):
+            result_df = result_df.reset_index()
+
+        return json.dumps({
+            'query': name,
+            'params': params,
+            'generation': snapshot.generation,
+            'rows': len(result_df),
+            'data': json.loads(result_df.to_json(orient='records', double_precision=15))
+        }).encode()
+
+    def query(self, name, params):
+        '''
+        Answer a query from the least-recently-used cache, or run it against the current snapshot and cache the
+        encoded response. Cached responses belong to one generation and are cleared on reload.
+
+        :param name: The name of the query, e.g. 'stats'.
+        :param params: The dictionary of query parameters, e.g. {'state': 'Texas'}.
+        :returns:
+         - The UTF-8 encoded JSON response.
+         - True if the response came from the cache, otherwise False.
+        :raises KeyError: If the query is unknown or the state has no rows.
+        :raises TypeError: If a parameter is unknown.
+        :raises ValueError: If a parameter is not valid.
+        '''
+        snapshot = self.snapshot
+
+        if name not in self.queries:
+            raise KeyError(f'Unknown query {name!r}; the queries are {list(self.queries)}.')
+
+        if params.get('state') is not None and params['state'] not in snapshot.state_index:
+            raise KeyError(f"Unknown state {params['state']!r}.")
+
+        key = (snapshot.generation, name, tuple(sorted(params.items())))
+
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.cache_hits += 1
+                return self.cache[key], True
+
+            self.cache_misses += 1
+
+        # queries run outside the lock, so slow queries do not block cache hits
+        response = self.__encode(name, params, snapshot, self.queries[name](snapshot, **params))
+
+        with self.cache_lock:
+            self.cache[key] = response
+
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return response, False
+
+    def get_health(self):
+        '''
+        Describe the data file, the current snapshot and the cache.
+
+        :return: The dictionary of service details.
+        '''
+        with self.cache_lock:
+            return {
+                'data_file': self.data_file_path,
+                'generation': self.snapshot.generation,
+                'rows': len(self.snapshot.df),
+                'states': len(self.snapshot.state_index),
+                'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.snapshot.loaded_at)),
+                'cache_entries': len(self.cache),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses
+            }
+
+    def serve(self, host='127.0.0.1', port=8598):
+        '''
+        Load the data file and answer HTTP requests until interrupted, checking the data file for changes in a
+        background thread.
+
+        :param host: The address to bind to; localhost by default, so the service is not reachable from other hosts.
+        :param port: The port to listen on.
+        '''
+        self.load()
+
+        server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+        server.daemon_threads = True
+        server.service = self
+
+        watcher = threading.Thread(target=self.__watch_source, daemon=True)
+        watcher.start()
+
+        print(f'Serving queries on http://{host}:{server.server_port}/ (Ctrl+C to stop)')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop_event.set()
+            server.server_close()
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    '''
+    Answers the HTTP requests of a QueryService, which the server holds as server.service.
+    '''
+    def __send(self, status, body, cached=False):
+        '''
+        Send a JSON response.
+
+        :param status: The HTTP status code.
+        :param body: The UTF-8 encoded JSON body.
+        :param cached: Whether the body came from the cache.
+        '''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', 'hit' if cached else 'miss')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __send_error(self, status, message):
+        '''
+        Send a JSON error response.
+
+        :param status: The HTTP status code.
+        :param message: The error message.
+        '''
+        self.__send(status, json.dumps({'error': message}).encode())
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        name = url.path.strip('/')
+
+        if name == 'health':
+            self.__send(200, json.dumps(service.get_health()).encode())
+            return
+
+        # repeated parameters keep their last value
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        try:
+            response, cached = service.query(name, params)
+        except KeyError as error:
+            self.__send_error(404, f'Not found: {error.args[0]}')
+        except (TypeError, ValueError) as error:
+            self.__send_error(400, str(error))
+        else:
+            self.__send(200, response, cached)
+
+    def do_POST(self):
+        service = self.server.service
+
+        if urlparse(self.path).path.strip('/') != 'reload':
+            self.__send_error(404, f'Not found: {self.path}')
+            return
+
+        try:
+            service.load()
+        except Exception as error:
+            self.__send_error(500, f'Reload failed: {error!r}')
+        else:
+            self.__send(200, json.dumps(service.get_health()).encode())
@@ -0,0 +1,300 @@
+'''
+Description:
+    This class runs the analyses of the Analyzer as SQL queries on an indexed SQLite database, so they work on data
+    sets that do not fit in one Pandas dataframe and repeated queries reuse the indexes.
+
+    Cleaned data is bulk-loaded with batched executemany inserts, one dataframe or one chunk at a time, into the
+    businesses table; row_index keeps the dataframe index so results line up with the Pandas engine. Indexes on
+    business_state, on (business_state, column) for every numeric column and on debt_to_equity are built after the
+    load. The median is computed with ROW_NUMBER() and COUNT() window functions over each state.
+    The database can be a file, which keeps the data and indexes between runs, or ':memory:'.
+
+Parameters:
+    database_path (str): The path of the SQLite database file, or ':memory:'.
+    batch_size (int): The number of rows inserted by each executemany call.
+
+Methods:
+    - load_dataframe(df, fingerprint): Bulk-loads a cleaned dataframe into the businesses table.
+    - load_chunks(chunks, fingerprint): Bulk-loads cleaned dataframe chunks into the businesses table.
+    - is_loaded(fingerprint): Checks whether the database already holds the data with a fingerprint.
+    - filter_rows(): Filters records with negative debt_to_equity.
+    - compute_desc_stats(): Computes descriptive statistics (mean, median, min, max) by business_state.
+    - compute_debt_to_income_ratios(): Computes for debt_to_income ratios.
+    - close(): Closes the database connection.
+'''
+
+import itertools
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from analyzer import desc_statistics
+
+table_name = 'businesses'
+metadata_table_name = 'load_metadata'
+
+class SQLiteAnalyzer:
+    def __init__(self, database_path=':memory:', batch_size=50_000):
+        self.database_path = database_path
+        self.batch_size = batch_size
+        self.dtypes = None
+
+        database_dir = os.path.dirname(database_path) if database_path != ':memory:' else ''
+        if database_dir:
+            os.makedirs(database_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(database_path)
+
+    def __get_sql_type(self, dtype):
+        '''
+        Get the SQLite column type of a Pandas dtype.
+
+        :param dtype: The Pandas dtype.
+        :return: 'INTEGER', 'REAL' or 'TEXT'.
+        '''
+        if pd.api.types.is_integer_dtype(dtype):
+            return 'INTEGER'
+
+        if pd.api.types.is_float_dtype(dtype):
+            return 'REAL'
+
+        return 'TEXT'
+
+    def __read_metadata(self):
+        '''
+        Read what was loaded: the fingerprint, the column dtypes and the numeric columns.
+
+        :return: The metadata dictionary, or None if nothing was loaded.
+        '''
+        try:
+            row = self.connection.execute(f'SELECT metadata FROM {metadata_table_name}').fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+        return json.loads(row[0]) if row is not None else None
+
+    def __create_table(self, df):
+        '''
+        Drop the businesses table and create it again with the columns of a dataframe.
+
+        :param df: The first cleaned Pandas dataframe (chunk) to load.
+        '''
+        columns = ', '.join(f'"{column}" {self.__get_sql_type(dtype)}' for column, dtype in df.dtypes.items())
+
+        self.connection.execute(f'DROP TABLE IF EXISTS {table_name}')
+        self.connection.execute(f'DROP TABLE IF EXISTS {metadata_table_name}')
+        self.connection.execute(f'CREATE TABLE {table_name} (row_index INTEGER PRIMARY KEY, {columns})')
+        self.connection.execute(f'CREATE TABLE {metadata_table_name} (metadata TEXT)')
+
+    def __insert(self, df):
+        '''
+        Insert the rows of a dataframe with batched executemany calls.
+
+        :param df: The cleaned Pandas dataframe (chunk).
+        '''
+        placeholders = ', '.join(['?'] * (len(df.columns) + 1))
+        statement = f'INSERT INTO {table_name} VALUES ({placeholders})'
+
+        # tolist() turns NumPy scalars into Python values, which sqlite3 can bind; NaN is stored as NULL
+        rows = zip(df.index.tolist(), *[df[column].tolist() for column in df.columns])
+
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+
+            if not batch:
+                break
+
+            self.connection.executemany(statement, batch)
+
+    def __create_indexes(self, numeric_columns):
+        '''
+        Create the indexes used by the queries, after the load so the rows are not indexed one by one.
+
+        :param numeric_columns: The numeric columns, except business_id.
+        '''
+        self.connection.execute(f'CREATE INDEX idx_state ON {table_name} (business_state)')
+        self.connection.execute(f'CREATE INDEX idx_debt_to_equity ON {table_name} (debt_to_equity)')
+
+        # (state, value) indexes let the median window functions read each state's values in order
+        for column in numeric_columns:
+            self.connection.execute(f'CREATE INDEX "idx_state_{column}" ON {table_name} (business_state, "{column}")')
+
+        self.connection.execute('ANALYZE')
+
+    def load_chunks(self, chunks, fingerprint=None):
+        '''
+        Bulk-load cleaned dataframe chunks into the businesses table, replacing what was loaded before.
+        Only one chunk is held in memory at a time.
+
+        :param chunks: An iterable of cleaned Pandas dataframe chunks with the same columns.
+        :param fingerprint: An identifier of the data, e.g. the StageGraph fingerprint, checked by is_loaded().
+        :return: The number of loaded rows.
+        '''
+        row_count = 0
+        dtypes = None
+
+        # the database is a derived copy of the data, so durability is traded for load speed
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('PRAGMA journal_mode = MEMORY')
+
+        with self.connection:
+            for chunk_df in chunks:
+                if dtypes is None:
+                    self.__create_table(chunk_df)
+                    dtypes = chunk_df.dtypes
+
+                self.__insert(chunk_df)
+                row_count += len(chunk_df)
+
+            if dtypes is None:
+                raise ValueError('No data to load into the SQLite database.')
+
+            numeric_columns = [column for column, dtype in dtypes.items()
+                               if pd.api.types.is_numeric_dtype(dtype) and column != 'business_id']
+            self.__create_indexes(numeric_columns)
+
+            metadata = {
+                'fingerprint': fingerprint,
+                'rows': row_count,
+                'dtypes': {column: str(dtype) for column, dtype in dtypes.items()},
+                'numeric_columns': numeric_columns
+            }
+            self.connection.execute(f'INSERT INTO {metadata_table_name} VALUES (?)', (json.dumps(metadata),))
+
+        self.dtypes = dtypes
+        return row_count
+
+    def load_dataframe(self, df, fingerprint=None):
+        '''
+        Bulk-load a cleaned dataframe into the businesses table, unless the same data is already loaded.
+
+        :param df: The cleaned Pandas dataframe.
+        :param fingerprint: An identifier of the data, e.g. the StageGraph fingerprint, checked by is_loaded().
+        :return: The number of loaded rows; 0 if the data was already loaded.
+        '''
+        if fingerprint is not None and self.is_loaded(fingerprint):
+            self.dtypes = df.dtypes
+            return 0
+
+        return self.load_chunks([df], fingerprint)
+
+    def is_loaded(self, fingerprint):
+        '''
+        Check whether the database already holds the data with a fingerprint, e.g. from a previous run.
+
+        :param fingerprint: An identifier of the data.
+        :return: True if the loaded data has the same fingerprint, otherwise False.
+        '''
+        metadata = self.__read_metadata()
+        return metadata is not None and metadata['fingerprint'] == fingerprint
+
+    def __get_dtypes(self):
+        '''
+        Get the Pandas dtypes of the loaded columns, to restore them on query results.
+
+        :return: The dictionary of {column name: dtype}.
+        '''
+        if self.dtypes is not None:
+            return dict(self.dtypes.items())
+
+        metadata = self.__read_metadata()
+
+        if metadata is None:
+            raise ValueError('No data has been loaded into the SQLite database.')
+
+        return metadata['dtypes']
+
+    def __query(self, query, parameters=()):
+        '''
+        Run a query that selects row_index and some columns, and restore the index and column dtypes.
+
+        :param query: The SQL query.
+        :param parameters: The query parameters.
+        :return: The Pandas dataframe indexed like the loaded dataframe.
+        '''
+        df = pd.read_sql_query(query, self.connection, params=parameters, index_col='row_index')
+        df.index.name = None
+
+        dtypes = self.__get_dtypes()
+        return df.astype({column: dtypes[column] for column in df.columns if column in dtypes})
+
+    def filter_rows(self):
+        '''
+        Filter records with negative debt_to_equity, using the debt_to_equity index.
+
+        :return: The Pandas dataframe with negative debt_to_equity.
+        '''
+        return self.__query(f'SELECT * FROM {table_name} WHERE debt_to_equity < 0 ORDER BY row_index')
+
+    def compute_debt_to_income_ratios(self):
+        '''
+        Compute debt_to_income ratios by dividing total_long_term_debt by total_revenue.
+        SQLite returns NULL when dividing by zero, so zero revenue gives NaN, as the ratio definitions ask for.
+
+        :return: The Pandas dataframe with the result of dividing total_long_term_debt by total_revenue.
+        '''
+        return self.__query(f'''
+            SELECT row_index, business_id, total_long_term_debt, total_revenue,
+                   CAST(total_long_term_debt AS REAL) / total_revenue AS debt_to_income_ratio
+            FROM {table_name}
+            ORDER BY row_index''')
+
+    def __compute_column_stats(self, column):
+        '''
+        Compute the mean, median, min and max of one column by business_state. Null values are skipped, as in Pandas.
+        The median is the average of the one or two middle values found by numbering each state's values in order.
+
+        :param column: The numeric column.
+        :return: The Pandas dataframe with mean, median, min and max columns, indexed by business_state.
+        '''
+        return pd.read_sql_query(f'''
+            WITH ranked AS (
+                SELECT business_state, "{column}" AS value,
+                       ROW_NUMBER() OVER (PARTITION BY business_state ORDER BY "{column}") AS position,
+                       COUNT(*) OVER (PARTITION BY business_state) AS value_count
+                FROM {table_name}
+                WHERE "{column}" IS NOT NULL
+            )
+            SELECT business_state,
+                   AVG(value) AS mean,
+                   AVG(CASE WHEN position IN ((value_count + 1) / 2, (value_count + 2) / 2) THEN value END) AS median,
+                   MIN(value) AS min,
+                   MAX(value) AS max
+            FROM ranked
+            GROUP BY business_state
+            ORDER BY business_state''', self.connection, index_col='business_state')
+
+    def compute_desc_stats(self):
+        '''
+        Compute descriptive statistics (mean, median, min, max) by business_state for all numeric columns except
+        business_id.
+
+        :return: The Pandas dataframe with the same layout as Analyzer.compute_desc_stats().
+        '''
+        metadata = self.__read_metadata()
+
+        if metadata is None:
+            raise ValueError('No data has been loaded into the SQLite database.')
+
+        dtypes = self.__get_dtypes()
+        column_stats = {}
+
+        for column in metadata['numeric_columns']:
+            stats_df = self.__compute_column_stats(column)
+
+            # min and max keep the column type, as they do in Pandas
+            if pd.api.types.is_integer_dtype(dtypes[column]):
+                stats_df = stats_df.astype({'min': dtypes[column], 'max': dtypes[column]})
+
+            column_stats[column] = stats_df[desc_statistics]
+
+        # states with only null values in a column are missing from that column's query and get NaN statistics
+        return pd.concat(column_stats, axis=1)
+
+    def close(self):
+        '''
+        Close the database connection.
+        '''
+        self.connection.close()
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import Analyzer
+from utils.aggregates import StateAggregates
+
+@pytest.fixture
+def transformed_df():
+    return pd.DataFrame({
+        'business_id': np.arange(1, 9, dtype='int64'),
+        'business_state': ['Ohio', 'Texas', 'Ohio', 'Utah', 'Texas', 'Ohio', 'Utah', 'Texas'],
+        'total_long_term_debt': np.array([10, 20, 30, 40, 50, 60, 70, 80], dtype='int64'),
+        'total_equity': np.array([-5, 5, 15, 25, 35, 45, 55, 65], dtype='int64'),
+        'debt_to_equity': [1.5, np.nan, 2.0, 0.5, 3.0, 1.0, 0.25, 4.0],
+        'total_liabilities': np.array([1, 2, 3, 4, 5, 6, 7, 8], dtype='int64'),
+        'total_revenue': np.array([100, 200, 300, 400, 500, 600, 700, 800], dtype='int64'),
+        'profit_margin': [0.1, 0.2, -0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+    })
+
+def test_chunked_stats_match_single_pass(transformed_df):
+    analyzer = Analyzer()
+    chunks = [transformed_df.iloc[:3], transformed_df.iloc[3:5], transformed_df.iloc[5:]]
+
+    stats_df = analyzer.compute_desc_stats_by_chunk(chunks)
+    expected_stats_df = analyzer.compute_desc_stats(transformed_df)
+
+    assert stats_df.columns.equals(expected_stats_df.columns)
+    assert analyzer.compare_desc_stats(stats_df, expected_stats_df).empty
+
+def test_no_chunks_give_empty_stats(transformed_df):
+    analyzer = Analyzer()
+
+    stats_df = analyzer.compute_desc_stats_by_chunk(iter([]))
+    expected_columns = analyzer.compute_desc_stats(transformed_df).columns
+
+    assert stats_df.empty
+    assert stats_df.index.name == 'business_state'
+    assert stats_df.columns.equals(expected_columns)
+
+def test_empty_aggregates_round_trip():
+    aggregates = StateAggregates(['total_revenue'])
+    rebuilt = StateAggregates.from_dict(aggregates.to_dict())
+
+    assert rebuilt.to_stats_df().empty
+
+def test_merge_of_split_aggregates(transformed_df):
+    analyzer = Analyzer()
+    left = analyzer.compute_state_aggregates([transformed_df.iloc[:4]])
+    right = analyzer.compute_state_aggregates([transformed_df.iloc[4:]])
+    left.merge(right)
+
+    assert analyzer.compare_desc_stats(left.to_stats_df(), analyzer.compute_desc_stats(transformed_df)).empty
+
+def test_estimated_medians_are_within_their_bounds():
+    rng = np.random.default_rng(0)
+    size = 50_000
+    df = pd.DataFrame({'business_state': rng.choice(['Ohio', 'Texas'], size=size),
+                       'total_revenue': rng.integers(0, 10 ** 6, size=size),
+                       'profit_margin': rng.uniform(-1, 1, size=size).round(2)})
+    analyzer = Analyzer()
+
+    aggregates = StateAggregates(['total_revenue', 'profit_margin'], sketch_capacity=100)
+    for start in range(0, size, 7000):
+        aggregates.update(df.iloc[start:start + 7000])
+
+    stats_df = aggregates.to_stats_df()
+    rank_errors = aggregates.get_median_rank_errors()
+
+    assert (rank_errors > 0).all().all()
+    assert analyzer.compare_medians(stats_df, df, rank_errors).empty
+
+    # an estimate far from the median is reported
+    stats_df.loc['Ohio', ('total_revenue', 'median')] = 10 ** 6
+    mismatch_df = analyzer.compare_medians(stats_df, df, rank_errors)
+
+    assert mismatch_df[['business_state', 'column', 'statistic']].values.tolist() == [
+        ['Ohio', 'total_revenue', 'median']]
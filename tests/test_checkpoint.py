@@ -0,0 +1,84 @@
+import itertools
+import os
+
+import pandas as pd
+import pytest
+
+from utils import checkpoint
+from utils.checkpoint import CheckpointCache
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # every call gets a later time, so the least-recently-used order never ties
+    ticks = itertools.count(1_700_000_000)
+    monkeypatch.setattr(checkpoint.time, 'time', lambda: float(next(ticks)))
+
+def test_store_and_load(tmp_path):
+    cache = CheckpointCache(str(tmp_path))
+    value = pd.DataFrame({'total_revenue': [1, 2, 3]})
+
+    path = cache.store('abc', 'load', value)
+    is_loaded, loaded = cache.load('abc')
+
+    assert os.path.isfile(path)
+    assert is_loaded
+    assert loaded.equals(value)
+
+def test_missing_key(tmp_path):
+    assert CheckpointCache(str(tmp_path / 'missing')).load('abc') == (False, None)
+
+def test_missing_file_is_a_miss(tmp_path):
+    cache = CheckpointCache(str(tmp_path))
+    os.remove(cache.store('abc', 'load', 1))
+
+    assert cache.load('abc') == (False, None)
+
+def test_truncated_checkpoint_is_removed(tmp_path):
+    cache = CheckpointCache(str(tmp_path))
+    path = cache.store('abc', 'load', list(range(100)))
+
+    with open(path, 'r+b') as checkpoint_file:
+        checkpoint_file.truncate(10)
+
+    assert cache.load('abc') == (False, None)
+    assert not os.path.exists(path)
+
+def test_least_recently_used_are_evicted(tmp_path):
+    value = b'x' * 1000
+    cache = CheckpointCache(str(tmp_path), max_size_bytes=2500)
+
+    cache.store('first', 'load', value)
+    cache.store('second', 'load', value)
+    cache.load('first')
+    cache.store('third', 'preprocess', value)
+
+    assert cache.list_entries().index.tolist() == ['third', 'first']
+    assert cache.load('second') == (False, None)
+
+def test_checkpoint_above_max_size_is_not_kept(tmp_path):
+    cache = CheckpointCache(str(tmp_path), max_size_bytes=100)
+
+    cache.store('abc', 'load', b'x' * 1000)
+
+    assert cache.list_entries().empty
+    assert cache.load('abc') == (False, None)
+
+def test_clear_by_stage(tmp_path):
+    cache = CheckpointCache(str(tmp_path))
+    cache.store('first', 'load', 1)
+    cache.store('second', 'preprocess', 2)
+    cache.store('third', 'load', 3)
+
+    assert cache.clear('load') == 2
+    assert cache.list_entries().index.tolist() == ['second']
+    assert cache.clear('unknown') == 0
+    assert cache.clear() == 1
+    assert cache.list_entries().empty
+
+def test_corrupt_index_is_empty(tmp_path):
+    cache = CheckpointCache(str(tmp_path))
+    cache.store('abc', 'load', 1)
+    (tmp_path / checkpoint.index_filename).write_text('{')
+
+    assert cache.list_entries().empty
+    assert cache.load('abc') == (False, None)
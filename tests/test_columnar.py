@@ -0,0 +1,114 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.columnar import ColumnarDataset, convert_to_columnar, is_columnar, manifest_filename, write_columnar
+
+@pytest.fixture
+def cleaned_df():
+    return pd.DataFrame({
+        'business_id': np.array([11, 12, 13, 14], dtype='int64'),
+        'business_state': ['Texas', None, 'Ohio', 'Texas'],
+        'total_revenue': [100.0, 200.0, 300.0, 2009999.9999999998],
+        'profit_margin': [0.1, np.nan, -0.3, 0.4]
+    })
+
+def test_round_trip(cleaned_df, tmp_path):
+    dataset = ColumnarDataset(write_columnar(cleaned_df, str(tmp_path / 'dataset')))
+    df = dataset.to_dataframe()
+
+    assert dataset.row_count == 4
+    assert df['business_id'].tolist() == [11, 12, 13, 14]
+    assert df['business_state'].tolist()[::2] == ['Texas', 'Ohio']
+    assert pd.isna(df['business_state'].iloc[1])
+
+    # integer columns stored as floats are rounded before the cast
+    assert df['total_revenue'].dtype == 'int64'
+    assert df['total_revenue'].iloc[-1] == 2010000
+    np.testing.assert_array_equal(df['profit_margin'], cleaned_df['profit_margin'])
+
+def test_text_columns_are_dictionary_encoded(cleaned_df, tmp_path):
+    dataset = ColumnarDataset(write_columnar(cleaned_df, str(tmp_path / 'dataset')))
+
+    assert dataset.get_arrays()['business_state'].dtype == 'int8'
+    assert dataset.get_arrays()['business_state'].tolist() == [1, -1, 0, 1]
+    assert dataset.get_categories('business_state').tolist() == ['Ohio', 'Texas']
+
+    categorical = dataset.to_dataframe(decode_text=False)['business_state']
+    assert categorical.cat.codes.tolist() == [1, -1, 0, 1]
+
+def test_int_column_with_nulls_keeps_source_type(tmp_path):
+    df = pd.DataFrame({'total_equity': [1.0, np.nan]})
+
+    dataset = ColumnarDataset(write_columnar(df, str(tmp_path / 'dataset')))
+
+    assert dataset.get_arrays()['total_equity'].dtype == 'float64'
+
+@pytest.mark.parametrize('value', [1e20, -1e20, 2.0 ** 63, np.inf, 12.7, 12.5])
+def test_int_column_that_is_not_integral_keeps_its_values(value, tmp_path):
+    df = pd.DataFrame({'business_id': [1.0, value]})
+
+    values = ColumnarDataset(write_columnar(df, str(tmp_path / 'dataset'))).get_arrays()['business_id']
+
+    assert values.dtype == 'float64'
+    assert values.tolist() == [1.0, value]
+
+def test_slices_and_chunks(cleaned_df, tmp_path):
+    dataset = ColumnarDataset(write_columnar(cleaned_df, str(tmp_path / 'dataset')))
+
+    assert dataset.to_dataframe(1, 3).index.tolist() == [1, 2]
+    assert dataset.to_dataframe(3, 10).index.tolist() == [3]
+    assert [len(chunk) for chunk in dataset.iter_chunks(3)] == [3, 1]
+
+def test_empty_frame(cleaned_df, tmp_path):
+    dataset = ColumnarDataset(write_columnar(cleaned_df.iloc[:0], str(tmp_path / 'dataset')))
+    df = dataset.to_dataframe()
+
+    assert df.empty
+    assert list(df.columns) == list(cleaned_df.columns)
+    assert list(dataset.iter_chunks(10)) == []
+
+def test_digest_identifies_the_data(cleaned_df, tmp_path):
+    first = ColumnarDataset(write_columnar(cleaned_df, str(tmp_path / 'first'), {'source': 'a.csv'}))
+    second = ColumnarDataset(write_columnar(cleaned_df, str(tmp_path / 'second'), {'source': 'b.csv'}))
+    changed = ColumnarDataset(write_columnar(cleaned_df.assign(business_id=[11, 12, 13, 15]),
+                                             str(tmp_path / 'changed')))
+
+    assert first.digest == second.digest
+    assert first.digest != changed.digest
+    assert first.manifest['source'] == 'a.csv'
+
+def test_source_column_names_are_normalized(tmp_path):
+    df = pd.read_csv(io.StringIO('Business ID,Business State\n1,Ohio\n'))
+
+    dataset = ColumnarDataset(write_columnar(df, str(tmp_path / 'dataset')))
+
+    assert set(dataset.columns) == {'business_id', 'business_state'}
+
+def test_is_columnar(cleaned_df, tmp_path):
+    dataset_dir = write_columnar(cleaned_df, str(tmp_path / 'dataset'))
+
+    assert is_columnar(dataset_dir)
+    assert not is_columnar(str(tmp_path / 'missing'))
+    assert not is_columnar(str(tmp_path / 'dataset' / manifest_filename))
+
+def test_old_format_is_rejected(cleaned_df, tmp_path):
+    dataset_dir = write_columnar(cleaned_df, str(tmp_path / 'dataset'))
+    manifest_path = tmp_path / 'dataset' / manifest_filename
+    manifest_path.write_text(json.dumps({**json.loads(manifest_path.read_text()), 'format': 1}))
+
+    assert not is_columnar(dataset_dir)
+    with pytest.raises(ValueError):
+        ColumnarDataset(dataset_dir)
+
+def test_convert_csv(cleaned_df, tmp_path):
+    source_path = tmp_path / 'source.csv'
+    cleaned_df.to_csv(source_path, index=False)
+
+    dataset = ColumnarDataset(convert_to_columnar(str(source_path), str(tmp_path / 'dataset')))
+
+    assert dataset.row_count == 4
+    assert dataset.manifest['source'] == str(source_path)
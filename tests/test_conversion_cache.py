@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import conversion_cache
+from utils.conversion_cache import ConversionCache
+
+@pytest.fixture
+def workbook_df():
+    return pd.DataFrame({'Business ID': np.arange(1, 1001, dtype='float64'),
+                         'Business State': ['Ohio', 'Texas'] * 500})
+
+def make_workbook(tmp_path, name, content=b'workbook'):
+    # the cache only hashes the workbook, so any file stands in for it
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+def test_store_and_lookup(tmp_path, workbook_df):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    workbook_path = make_workbook(tmp_path, 'a.xlsx')
+
+    assert cache.lookup(workbook_path) is None
+
+    entry_path = cache.store(workbook_path, workbook_df)
+
+    assert cache.lookup(workbook_path) == entry_path
+    assert cache.load(entry_path)['business_id'].tolist() == list(range(1, 1001))
+
+def test_changed_workbook_is_converted_again(tmp_path, workbook_df):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    workbook_path = make_workbook(tmp_path, 'a.xlsx')
+    entry_path = cache.store(workbook_path, workbook_df)
+
+    make_workbook(tmp_path, 'a.xlsx', b'changed workbook')
+
+    assert cache.lookup(workbook_path) is None
+    assert not os.path.exists(entry_path)
+
+def test_changed_schema_is_converted_again(tmp_path, workbook_df, monkeypatch):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    workbook_path = make_workbook(tmp_path, 'a.xlsx')
+    cache.store(workbook_path, workbook_df)
+
+    monkeypatch.setattr(conversion_cache, 'schema_fingerprint', 'another schema')
+
+    assert cache.lookup(workbook_path) is None
+
+def test_variants_have_their_own_entries(tmp_path, workbook_df):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    workbook_path = make_workbook(tmp_path, 'a.xlsx')
+
+    first = cache.store(workbook_path, workbook_df)
+    second = cache.store(workbook_path, workbook_df.iloc[:10], 'Second')
+
+    assert first != second
+    assert cache.lookup(workbook_path) == first
+    assert cache.lookup(workbook_path, 'Second') == second
+
+def test_least_recently_used_entries_are_evicted(tmp_path, workbook_df):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    first = cache.store(make_workbook(tmp_path, 'a.xlsx', b'a'), workbook_df)
+    entry_size = sum(os.path.getsize(os.path.join(first, name)) for name in os.listdir(first))
+
+    # room for two entries; the manifests of the entries differ by a few bytes
+    cache.max_size_bytes = entry_size * 2 + 100
+    second = cache.store(make_workbook(tmp_path, 'b.xlsx', b'b'), workbook_df)
+    third = cache.store(make_workbook(tmp_path, 'c.xlsx', b'c'), workbook_df)
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(third)
+
+def test_workbook_larger_than_the_cache_is_not_cached(tmp_path, workbook_df, capsys):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    other_path = cache.store(make_workbook(tmp_path, 'b.xlsx', b'b'), workbook_df.iloc[:1])
+    cache.max_size_bytes = sum(os.path.getsize(os.path.join(other_path, name)) for name in os.listdir(other_path))
+    workbook_path = make_workbook(tmp_path, 'a.xlsx')
+
+    dataset_path = cache.store(workbook_path, workbook_df)
+
+    assert 'not cached' in capsys.readouterr().out
+    assert cache.load(dataset_path)['business_id'].tolist() == list(range(1, 1001))
+    assert cache.lookup(workbook_path) is None
+
+    # the small entry is not evicted to make room for an entry that cannot fit anyway
+    assert os.path.exists(other_path)
+
+def test_clear(tmp_path, workbook_df):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    workbook_path = make_workbook(tmp_path, 'a.xlsx')
+    cache.store(workbook_path, workbook_df)
+
+    cache.clear()
+
+    assert cache.lookup(workbook_path) is None
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from loader import Loader
+
+def make_frames(left_ids, right_ids):
+    orig_df = pd.DataFrame({'business_id': left_ids, 'total_revenue': np.arange(len(left_ids)) * 100.0})
+    debt_to_income_df = pd.DataFrame({'business_id': right_ids,
+                                      'debt_to_income_ratio': np.arange(len(right_ids)) + 0.5})
+    return orig_df, debt_to_income_df
+
+def test_same_ids_are_attached_by_position():
+    orig_df, debt_to_income_df = make_frames([3, 1, 2], [3, 1, 2])
+    loader = Loader()
+
+    merged_df = loader.merge_dataframes(orig_df, debt_to_income_df)
+
+    assert merged_df['debt_to_income_ratio'].tolist() == [0.5, 1.5, 2.5]
+    assert merged_df['total_revenue'].tolist() == orig_df['total_revenue'].tolist()
+    assert loader.key_collisions.empty
+
+def test_reordered_ids_are_looked_up():
+    orig_df, debt_to_income_df = make_frames([1, 2, 3, 4], [3, 2, 1])
+
+    merged_df = Loader().merge_dataframes(orig_df, debt_to_income_df)
+
+    assert merged_df['debt_to_income_ratio'].tolist()[:3] == [2.5, 1.5, 0.5]
+    assert np.isnan(merged_df['debt_to_income_ratio'].iloc[3])
+
+def test_duplicate_keys_never_multiply_rows():
+    orig_df, debt_to_income_df = make_frames([1, 1, 2], [2, 1, 1])
+    loader = Loader()
+
+    merged_df = loader.merge_dataframes(orig_df, debt_to_income_df)
+
+    # an inner merge would give 5 rows; the first ratio of each key is kept
+    assert len(merged_df) == 3
+    assert merged_df['debt_to_income_ratio'].tolist() == [1.5, 1.5, 0.5]
+    assert loader.key_collisions[['side', 'business_id', 'cnt_of_rows']].values.tolist() == [
+        ['left', 1, 2], ['right', 1, 2]]
+
+def test_duplicate_keys_can_be_rejected():
+    orig_df, debt_to_income_df = make_frames([1, 1, 2], [1, 1, 2])
+
+    with pytest.raises(ValueError, match='Duplicate business_id keys'):
+        Loader().merge_dataframes(orig_df, debt_to_income_df, on_key_collision='raise')
@@ -0,0 +1,143 @@
+import importlib
+import os
+
+import pandas as pd
+import pytest
+
+import analyzer
+from utils import pipeline
+from utils.checkpoint import CheckpointCache
+from utils.pipeline import StageGraph, find_project_modules, is_local
+
+def build_graph(calls, checkpoint_cache=None, scale=2):
+    '''
+    Build a graph of two stages, load and double, that records every execution in calls.
+    '''
+    def load():
+        calls.append('load')
+        return pd.DataFrame({'total_revenue': [1.0, 2.0, 3.0]})
+
+    def double(df):
+        calls.append('double')
+        return df * scale
+
+    graph = StageGraph(checkpoint_cache)
+    graph.add('load', load, params={'file': 'abc'})
+    graph.add('double', double, ['load'], params={'scale': scale})
+    return graph
+
+def test_get_memoizes_outputs():
+    calls = []
+    graph = build_graph(calls)
+
+    assert graph.get('double')['total_revenue'].tolist() == [2.0, 4.0, 6.0]
+    graph.get('double')
+    graph.get('load')
+
+    assert calls == ['load', 'double']
+
+def test_checkpoint_skips_execution(tmp_path):
+    build_graph([], CheckpointCache(str(tmp_path))).get('double')
+
+    calls = []
+    graph = build_graph(calls, CheckpointCache(str(tmp_path)))
+
+    assert graph.get('double')['total_revenue'].tolist() == [2.0, 4.0, 6.0]
+    # the dependency is not needed when the stage itself is loaded from its checkpoint
+    assert calls == []
+    assert 'load' not in graph.values
+
+def test_release_loads_from_checkpoint(tmp_path):
+    calls = []
+    graph = build_graph(calls, CheckpointCache(str(tmp_path)))
+
+    graph.get('load')
+    graph.release('load')
+
+    assert 'load' not in graph.values
+    assert graph.get('load')['total_revenue'].tolist() == [1.0, 2.0, 3.0]
+    assert calls == ['load']
+
+def test_release_without_checkpoints_executes_again():
+    calls = []
+    graph = build_graph(calls)
+
+    graph.get('load')
+    graph.release('load')
+    graph.get('load')
+
+    assert calls == ['load', 'load']
+
+def test_plan(tmp_path):
+    graph = build_graph([], CheckpointCache(str(tmp_path)))
+    assert graph.plan(['double'])['action'].to_dict() == {'double': 'execute', 'load': 'execute'}
+
+    graph.get('load')
+    assert graph.plan(['double'])['action'].to_dict() == {'double': 'execute', 'load': 'cached'}
+
+    graph.get('double')
+    assert graph.plan(['double'])['action'].to_dict() == {'double': 'cached'}
+
+def test_param_change_invalidates_downstream_stages(tmp_path):
+    build_graph([], CheckpointCache(str(tmp_path))).get('double')
+
+    calls = []
+    graph = build_graph(calls, CheckpointCache(str(tmp_path)), scale=3)
+
+    assert graph.fingerprint('load') == build_graph([]).fingerprint('load')
+    assert graph.fingerprint('double') != build_graph([]).fingerprint('double')
+    assert graph.get('double')['total_revenue'].tolist() == [3.0, 6.0, 9.0]
+    assert calls == ['double']
+
+def test_version_invalidates_every_stage():
+    graph = build_graph([])
+    bumped = build_graph([])
+    bumped.version = '2'
+
+    assert graph.fingerprint('load') != bumped.fingerprint('load')
+
+def test_unknown_dependency():
+    graph = StageGraph()
+
+    with pytest.raises(ValueError, match='unknown stage'):
+        graph.add('double', lambda df: df, ['load'])
+
+def test_is_local():
+    def local_func():
+        pass
+
+    assert is_local(lambda: None)
+    assert is_local(local_func)
+    assert not is_local(build_graph)
+
+def test_find_project_modules_follows_imports():
+    source_files = {os.path.relpath(source_file, pipeline.project_dir)
+                    for source_file in find_project_modules(analyzer.__file__)}
+
+    # helpers imported by name and modules that only hold data are both found
+    assert {'analyzer.py', os.path.join('utils', 'topn.py'), os.path.join('utils', 'screening.py'),
+            os.path.join('utils', 'sketch.py'), os.path.join('utils', 'mapping.py')} <= source_files
+    assert not any('site-packages' in source_file for source_file in source_files)
+
+def test_helper_change_invalidates_stage(tmp_path, monkeypatch):
+    (tmp_path / 'pipeline_helper.py').write_text('def scale(df):\n    return df * 2\n')
+    (tmp_path / 'pipeline_stage.py').write_text(
+        'from pipeline_helper import scale\n\ndef run(df):\n    return scale(df)\n')
+
+    monkeypatch.setattr(pipeline, 'project_dir', str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+    stage_module = importlib.import_module('pipeline_stage')
+
+    def fingerprint():
+        graph = StageGraph()
+        graph.add('load', lambda: None)
+        graph.add('scale', lambda df: stage_module.run(df), ['load'], code=[stage_module.run])
+        return graph.fingerprint('scale')
+
+    before = fingerprint()
+    assert fingerprint() == before
+
+    # only the helper changes; the stage module and the code list stay the same
+    (tmp_path / 'pipeline_helper.py').write_text('def scale(df):\n    return df * 3\n')
+    assert fingerprint() != before
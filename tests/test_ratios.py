@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.mapping import ratio_definitions
+from utils.ratios import compute_ratios
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'business_id': np.arange(1, 6, dtype='int64'),
+        'total_long_term_debt': np.array([10, 20, 30, 40, 50], dtype='int64'),
+        'total_equity': np.array([5, 0, -10, 20, 25], dtype='int64'),
+        'total_liabilities': np.array([15, 25, 35, 0, 55], dtype='int64'),
+        'total_revenue': np.array([100, 0, 300, -400, 500], dtype='int64'),
+        'profit_margin': [0.1, 0.2, np.nan, 0.4, 0.5]
+    }, index=[10, 11, 12, 13, 14])
+
+def ratio(denominator, **policies):
+    return [{'name': 'ratio', 'numerator': ['total_long_term_debt'], 'denominator': [denominator], **policies}]
+
+def test_zero_denominator_gives_nan(df):
+    ratios_df, issues_df = compute_ratios(df, ratio('total_revenue'))
+
+    assert np.isnan(ratios_df['ratio'].loc[11])
+    assert not np.isinf(ratios_df['ratio']).any()
+    assert issues_df.loc['ratio'].to_dict() == {'zero_denominators': 1, 'negative_denominators': 1}
+
+def test_negative_denominator_is_kept_by_default(df):
+    ratios_df, _ = compute_ratios(df, ratio('total_revenue'))
+
+    assert ratios_df['ratio'].tolist()[2:] == [0.1, -0.1, 0.1]
+
+def test_negative_denominator_gives_nan(df):
+    ratios_df, issues_df = compute_ratios(df, ratio('total_equity', negative_denominator='nan'))
+
+    assert ratios_df['ratio'].isna().tolist() == [False, True, True, False, False]
+    assert ratios_df['ratio'].loc[[10, 13, 14]].tolist() == [2.0, 2.0, 2.0]
+    assert issues_df.loc['ratio'].to_dict() == {'zero_denominators': 1, 'negative_denominators': 1}
+
+@pytest.mark.parametrize('policies, message', [
+    ({'zero_denominator': 'raise'}, '1 zero denominators'),
+    ({'negative_denominator': 'raise'}, '1 negative denominators')
+])
+def test_raise_policies(df, policies, message):
+    with pytest.raises(ValueError, match=message):
+        compute_ratios(df, ratio('total_revenue', **policies))
+
+def test_raise_policies_pass_valid_denominators(df):
+    ratios_df, _ = compute_ratios(df.iloc[[0, 4]], ratio('total_revenue', zero_denominator='raise',
+                                                         negative_denominator='raise'))
+
+    assert ratios_df['ratio'].tolist() == [0.1, 0.1]
+
+@pytest.mark.parametrize('definition, message', [
+    ({'name': 'ratio', 'numerator': ['total_revenue'], 'denominator': ['total_equity'], 'zero_denominator': 'keep'},
+     'Unknown zero_denominator policy'),
+    ({'name': 'ratio', 'numerator': ['total_revenue'], 'denominator': ['total_equity'],
+      'negative_denominator': 'abs'}, 'Unknown negative_denominator policy'),
+    ({'name': 'ratio', 'numerator': ['total_revenue'], 'denominator': ['total_assets']}, 'reads missing columns'),
+    ({'name': 'ratio'}, 'needs a name and a numerator')
+])
+def test_invalid_definitions(df, definition, message):
+    with pytest.raises(ValueError, match=message):
+        compute_ratios(df, [definition])
+
+def test_declared_ratios(df):
+    ratios_df, issues_df = compute_ratios(df)
+
+    assert list(ratios_df.columns) == [definition['name'] for definition in ratio_definitions]
+    assert ratios_df.index.equals(df.index)
+    assert not np.isinf(ratios_df.to_numpy()).any()
+
+    # the equity multiplier sums its numerator columns and turns negative equity into NaN
+    assert ratios_df['equity_multiplier'].loc[10] == 4.0
+    assert np.isnan(ratios_df['equity_multiplier'].loc[12])
+
+    # a ratio without a denominator is the weighted numerator and has no denominator issues
+    assert ratios_df['net_profit'].loc[10] == pytest.approx(10.0)
+    assert issues_df.loc['net_profit'].tolist() == [0, 0]
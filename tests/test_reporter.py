@@ -0,0 +1,32 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+from reporter import ReportWriter
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError, match='Unknown report format'):
+        ReportWriter(str(tmp_path), 'xml')
+
+def test_parquet_without_pyarrow_fails_on_creation(tmp_path, monkeypatch):
+    # a None entry in sys.modules makes the import fail as if pyarrow were not installed
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    monkeypatch.setitem(sys.modules, 'pyarrow.parquet', None)
+
+    with pytest.raises(ValueError, match='requires pyarrow') as error_info:
+        ReportWriter(str(tmp_path), 'parquet')
+
+    assert isinstance(error_info.value.__cause__, ImportError)
+
+def test_write_jsonl(tmp_path):
+    df = pd.DataFrame({'business_id': [1, 2, 3], 'total_revenue': [10.0, 20.0, 30.0]})
+    writer = ReportWriter(str(tmp_path), 'jsonl', chunk_size=2, preview_rows=1)
+
+    writer.write('revenue', 'Revenue', df)
+
+    with open(tmp_path / 'revenue.jsonl') as file:
+        rows = [json.loads(line) for line in file]
+
+    assert [row['total_revenue'] for row in rows] == [10.0, 20.0, 30.0]
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.mapping import screening_rules
+from utils.screening import ScreeningResult, compute_group_zscores, evaluate_rules, validate_rules
+
+@pytest.fixture
+def screened_df():
+    return pd.DataFrame({
+        'business_state': ['Ohio', 'Ohio', 'Ohio', 'Texas', 'Texas', None],
+        'debt_to_equity': [-1.0, 0.5, np.nan, 2.0, -0.1, 1.0],
+        'total_equity': [10, -5, 3, -1, 7, 8],
+        'profit_margin': [0.2, 0.01, 0.1, np.nan, 0.04, 0.3],
+        'total_liabilities': [40, 1, 2, 100, 5, 6],
+        'total_revenue': [10, 10, 10, 20, 20, 1]
+    })
+
+def test_bitmask_matches_pandas_masks(screened_df):
+    result = ScreeningResult(screened_df)
+
+    expected = {
+        'negative_debt_to_equity': screened_df['debt_to_equity'] < 0,
+        'negative_equity': screened_df['total_equity'] < 0,
+        'low_profit_margin': screened_df['profit_margin'] < 0.05,
+        'liabilities_above_3x_revenue': screened_df['total_liabilities'] > screened_df['total_revenue'] * 3,
+        'revenue_outlier_in_state': pd.Series(False, index=screened_df.index)
+    }
+
+    for name, mask in expected.items():
+        assert result.get_positions(name).tolist() == np.flatnonzero(mask).tolist()
+
+    assert result.get_counts().to_dict() == {name: int(mask.sum()) for name, mask in expected.items()}
+
+def test_any_and_all_positions(screened_df):
+    result = ScreeningResult(screened_df)
+    rules = ['negative_debt_to_equity', 'low_profit_margin']
+
+    assert result.get_positions(rules).tolist() == [0, 1, 4]
+    assert result.get_positions(rules, match='all').tolist() == [4]
+    assert result.get_rows(rules, match='all').index.tolist() == [4]
+
+def test_flags_of_flagged_rows(screened_df):
+    flags = ScreeningResult(screened_df).get_flags()
+
+    assert flags.index.tolist() == [0, 1, 3, 4, 5]
+    assert flags.loc[4].tolist() == [True, False, True, False, False]
+
+def test_empty_frame(screened_df):
+    result = ScreeningResult(screened_df.iloc[:0])
+
+    assert result.get_counts().tolist() == [0] * len(screening_rules)
+    assert len(result.get_positions()) == 0
+    assert result.get_flags().empty
+
+@pytest.mark.parametrize('n_rules, dtype', [(1, 'uint8'), (8, 'uint8'), (9, 'uint16'), (17, 'uint32'),
+                                            (33, 'uint64'), (64, 'uint64')])
+def test_bitmask_width(n_rules, dtype):
+    df = pd.DataFrame({'value': np.arange(n_rules + 1, dtype='float64')})
+    rules = [{'name': f'above_{i}', 'column': 'value', 'operator': '>', 'value': i} for i in range(n_rules)]
+
+    result = ScreeningResult(df, rules)
+
+    assert result.bitmask.dtype == dtype
+    assert result.get_counts().tolist() == list(range(n_rules, 0, -1))
+    assert result.get_positions(f'above_{n_rules - 1}').tolist() == [n_rules]
+
+def test_too_many_rules():
+    rules = [{'name': f'rule_{i}', 'column': 'value', 'operator': '>', 'value': i} for i in range(65)]
+
+    with pytest.raises(ValueError, match='64-bit'):
+        evaluate_rules(pd.DataFrame({'value': [1.0]}), rules)
+
+def test_missing_column_is_reported_once():
+    rules = [{'name': 'negative', 'column': 'missing', 'operator': '<', 'value': 0}]
+
+    with pytest.raises(ValueError, match=r"reads missing columns \['missing'\]\."):
+        validate_rules(pd.DataFrame({'value': [1.0]}), rules)
+
+def test_missing_other_column_is_reported():
+    rules = [{'name': 'above', 'column': 'value', 'operator': '>', 'other_column': 'missing'}]
+
+    with pytest.raises(ValueError, match=r"reads missing columns \['missing'\]\."):
+        validate_rules(pd.DataFrame({'value': [1.0]}), rules)
+
+@pytest.mark.parametrize('rule, message', [
+    ({'name': 'no_column', 'operator': '<', 'value': 0}, 'needs a name and a column'),
+    ({'name': 'unknown', 'column': 'value', 'operator': '=~', 'value': 0}, 'Unknown operator'),
+    ({'name': 'no_value', 'column': 'value', 'operator': '<'}, 'needs a value or another column')
+])
+def test_invalid_rules(rule, message):
+    with pytest.raises(ValueError, match=message):
+        validate_rules(pd.DataFrame({'value': [1.0]}), [rule])
+
+def test_unknown_rule_name(screened_df):
+    with pytest.raises(KeyError):
+        ScreeningResult(screened_df).get_positions('unknown')
+
+def test_group_zscores_match_pandas():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=200)
+    values[::17] = np.nan
+    groups = rng.choice(['a', 'b', 'c', None], size=200)
+
+    series = pd.Series(values)
+    grouped = series.groupby(pd.Series(groups))
+    expected = ((series - grouped.transform('mean')) / grouped.transform('std')).to_numpy()
+
+    np.testing.assert_allclose(compute_group_zscores(values, groups), expected, equal_nan=True)
+
+def test_group_zscores_of_single_and_constant_groups():
+    zscores = compute_group_zscores(np.array([1.0, 2.0, 2.0, 5.0]), np.array(['a', 'b', 'b', 'c']))
+
+    assert np.isnan(zscores).all()
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from analyzer import Analyzer
+from extractor import Extractor
+from loader import Loader
+from server import QueryRequestHandler, QueryService, ThreadingHTTPServer
+from transformer import Transformer
+from utils.mapping import new_column_mapping
+
+def write_data_file(file_path, revenues):
+    states = ['Ohio', 'Texas', 'Utah']
+    df = pd.DataFrame({
+        'business_id': range(1, len(revenues) + 1),
+        'business_state': [states[position % 3] for position in range(len(revenues))],
+        'total_long_term_debt': [10 * (position + 1) for position in range(len(revenues))],
+        'total_equity': [(-1) ** position * 50 for position in range(len(revenues))],
+        'debt_to_equity': [(-1) ** position * 0.5 for position in range(len(revenues))],
+        'total_liabilities': [20 * (position + 1) for position in range(len(revenues))],
+        'total_revenue': revenues,
+        'profit_margin': [0.1] * len(revenues)
+    })
+    df.rename(columns={column: source for source, column in new_column_mapping.items()}).to_csv(file_path,
+                                                                                              index=False)
+
+@pytest.fixture
+def data_file_path(tmp_path):
+    file_path = str(tmp_path / 'businesses.csv')
+    write_data_file(file_path, [100, 200, 300, 400, 500, 600])
+    return file_path
+
+def make_service(data_file_path, cache_size=256):
+    service = QueryService(data_file_path, Extractor(os.path.dirname(data_file_path)), Loader(), Transformer(),
+                           Analyzer(), cache_size)
+    service.load()
+    return service
+
+def decode(response):
+    return json.loads(response)
+
+def test_repeated_query_is_a_cache_hit(data_file_path):
+    service = make_service(data_file_path)
+
+    response, cached = service.query('stats', {'state': 'Texas'})
+    cached_response, is_cached = service.query('stats', {'state': 'Texas'})
+
+    assert not cached and is_cached
+    assert cached_response == response
+    assert decode(response)['data'][0]['business_state'] == 'Texas'
+    assert decode(response)['data'][0]['total_revenue_mean'] == 350.0
+
+    # other parameters are another cache entry
+    assert not service.query('stats', {'state': 'Ohio'})[1]
+    assert service.get_health()['cache_hits'] == 1
+    assert service.get_health()['cache_misses'] == 2
+
+def test_least_recently_used_response_is_evicted(data_file_path):
+    service = make_service(data_file_path, cache_size=2)
+
+    service.query('stats', {'state': 'Ohio'})
+    service.query('stats', {'state': 'Texas'})
+    service.query('stats', {'state': 'Ohio'})
+    service.query('stats', {'state': 'Utah'})
+
+    assert service.query('stats', {'state': 'Ohio'})[1]
+    assert not service.query('stats', {'state': 'Texas'})[1]
+    assert len(service.cache) == 2
+
+def test_state_queries_use_the_state_rows(data_file_path):
+    service = make_service(data_file_path)
+
+    rows = decode(service.query('negative_debt_to_equity', {'state': 'Texas'})[0])['data']
+    expected_df = service.snapshot.df[(service.snapshot.df['business_state'] == 'Texas')
+                                      & (service.snapshot.df['debt_to_equity'] < 0)]
+
+    assert [row['business_id'] for row in rows] == expected_df['business_id'].tolist()
+
+@pytest.mark.parametrize('name, params', [('unknown', {}), ('stats', {'state': 'Atlantis'})])
+def test_unknown_query_or_state(data_file_path, name, params):
+    with pytest.raises(KeyError):
+        make_service(data_file_path).query(name, params)
+
+def test_changed_file_is_reloaded(data_file_path):
+    service = make_service(data_file_path)
+    service.query('stats', {'state': 'Texas'})
+
+    assert not service.check_reload()
+
+    write_data_file(data_file_path, [100, 200, 300, 400, 500, 600, 700, 800, 900])
+
+    assert service.check_reload()
+    assert service.snapshot.generation == 2
+    assert len(service.cache) == 0
+
+    response, cached = service.query('stats', {'state': 'Texas'})
+    assert not cached
+    assert decode(response)['generation'] == 2
+    assert decode(response)['data'][0]['total_revenue_mean'] == 500.0
+
+def test_failed_reload_keeps_the_snapshot(data_file_path, monkeypatch):
+    service = make_service(data_file_path)
+    response, _ = service.query('stats', {'state': 'Texas'})
+
+    def fail(_):
+        raise ValueError('the file is still being written')
+
+    monkeypatch.setattr(service.loader, 'load_src_into_dataframe', fail)
+    write_data_file(data_file_path, [1, 2, 3, 4, 5, 6, 7])
+
+    assert not service.check_reload()
+    assert service.snapshot.generation == 1
+    assert service.query('stats', {'state': 'Texas'}) == (response, True)
+
+    # the same failed version is not loaded again on every check
+    assert not service.check_reload()
+
+def test_http_requests(data_file_path):
+    service = make_service(data_file_path)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), QueryRequestHandler)
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = f'http://127.0.0.1:{server.server_port}'
+
+    try:
+        cache_headers = []
+        for _ in range(2):
+            with urllib.request.urlopen(f'{url}/top_businesses?n=2') as response:
+                cache_headers.append(response.headers['X-Cache'])
+                body = json.loads(response.read())
+
+        assert cache_headers == ['miss', 'hit']
+        assert [row['total_revenue'] for row in body['data']] == [600, 500]
+
+        with pytest.raises(urllib.error.HTTPError) as error_info:
+            urllib.request.urlopen(f'{url}/stats?state=Atlantis')
+        assert error_info.value.code == 404
+
+        request = urllib.request.Request(f'{url}/reload', method='POST')
+        with urllib.request.urlopen(request) as response:
+            assert json.loads(response.read())['generation'] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils.sketch import QuantileSketch
+
+def test_empty_sketch_has_no_median():
+    sketch = QuantileSketch(capacity=10)
+    sketch.update([np.nan, np.nan])
+
+    assert sketch.count == 0
+    assert np.isnan(sketch.median())
+
+def test_median_is_exact_below_capacity():
+    values = np.array([5.0, 1.0, 4.0, 2.0, np.nan, 3.0, 10.0])
+    sketch = QuantileSketch(capacity=100)
+    sketch.update(values)
+
+    assert sketch.count == 6
+    assert sketch.median() == pd.Series(values).median()
+
+def test_median_is_exact_at_capacity():
+    values = np.arange(100, dtype='float64')
+    sketch = QuantileSketch(capacity=100)
+    sketch.update(values)
+
+    assert sketch.median() == np.median(values)
+
+def test_median_estimate_above_capacity():
+    values = np.random.default_rng(0).normal(size=100_000)
+    sketch = QuantileSketch(capacity=200)
+    sketch.update(values)
+
+    # the estimate is close in rank, not in value
+    rank = (values < sketch.median()).mean()
+    assert sketch.count == len(values)
+    assert abs(rank - 0.5) < 0.02
+
+def test_merge_matches_single_sketch_below_capacity():
+    values = np.arange(50, dtype='float64')
+    left, right = QuantileSketch(capacity=100), QuantileSketch(capacity=100)
+    left.update(values[:20])
+    right.update(values[20:])
+    left.merge(right)
+
+    assert left.count == 50
+    assert left.median() == np.median(values)
+
+def test_merge_with_empty_sketch():
+    sketch = QuantileSketch(capacity=10)
+    sketch.update([1.0, 2.0, 3.0])
+    sketch.merge(QuantileSketch(capacity=10))
+
+    assert sketch.count == 3
+    assert sketch.median() == 2.0
+
+def test_dict_round_trip():
+    sketch = QuantileSketch(capacity=20)
+    sketch.update(np.arange(1000, dtype='float64'))
+
+    rebuilt = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+    assert rebuilt.count == sketch.count
+    assert rebuilt.median() == sketch.median()
+
+def test_rank_error_bound_holds():
+    values = np.random.default_rng(1).integers(0, 1000, size=200_000).astype('float64')
+    sketches = [QuantileSketch(capacity=50) for _ in range(4)]
+    for sketch, part in zip(sketches, np.array_split(values, 4)):
+        for chunk in np.array_split(part, 13):
+            sketch.update(chunk)
+
+    for sketch in sketches[1:]:
+        sketches[0].merge(sketch)
+
+    bound = QuantileSketch.from_dict(sketches[0].to_dict()).get_rank_error()
+    for q in [0.1, 0.5, 0.9]:
+        estimate = sketches[0].quantile(q)
+        below, at_or_below = (values < estimate).mean(), (values <= estimate).mean()
+
+        assert max(below - q, q - at_or_below, 0) <= bound
+
+def test_exact_sketch_has_no_rank_error():
+    sketch = QuantileSketch(capacity=100)
+    sketch.update(np.arange(100, dtype='float64'))
+
+    assert sketch.get_rank_error() == 0.0
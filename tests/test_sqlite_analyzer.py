@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import Analyzer
+from sqlite_analyzer import SQLiteAnalyzer
+
+@pytest.fixture
+def transformed_df():
+    rng = np.random.default_rng(598)
+    row_count = 1001
+
+    debt_to_equity = rng.normal(1.0, 2.0, row_count).round(2)
+    debt_to_equity[rng.random(row_count) < 0.05] = np.nan
+
+    df = pd.DataFrame({
+        'business_id': np.arange(1, row_count + 1, dtype='int64'),
+        'business_state': rng.choice(['Ohio', 'Texas', 'Utah', 'Iowa'], row_count),
+        'total_long_term_debt': rng.integers(0, 10 ** 9, row_count),
+        'total_equity': rng.integers(-10 ** 8, 10 ** 9, row_count),
+        'debt_to_equity': debt_to_equity,
+        'total_liabilities': rng.integers(0, 10 ** 9, row_count),
+        'total_revenue': rng.integers(0, 10 ** 9, row_count),
+        'profit_margin': rng.normal(0.1, 0.2, row_count).round(2)
+    })
+
+    # a state with only null values in a column, and a zero revenue
+    df.loc[df['business_state'] == 'Iowa', 'profit_margin'] = np.nan
+    df.loc[7, 'total_revenue'] = 0
+
+    # an index that is not a range, as after duplicates or quarantined rows are removed
+    return df.set_axis(np.arange(row_count) * 2 + 1)
+
+def test_stats_match_pandas(transformed_df):
+    analyzer = Analyzer()
+    sqlite_analyzer = SQLiteAnalyzer()
+    sqlite_analyzer.load_dataframe(transformed_df)
+
+    stats_df = sqlite_analyzer.compute_desc_stats()
+    expected_stats_df = analyzer.compute_desc_stats(transformed_df)
+
+    assert stats_df.columns.equals(expected_stats_df.columns)
+    assert stats_df.index.tolist() == expected_stats_df.index.tolist()
+    assert analyzer.compare_desc_stats(stats_df, expected_stats_df).empty
+    assert stats_df[('total_revenue', 'min')].dtype == 'int64'
+    assert stats_df.loc['Iowa', 'profit_margin'].isna().all()
+
+def test_chunked_load_matches_single_load(transformed_df):
+    sqlite_analyzer = SQLiteAnalyzer(batch_size=100)
+    chunks = [transformed_df.iloc[start:start + 300] for start in range(0, len(transformed_df), 300)]
+
+    assert sqlite_analyzer.load_chunks(chunks) == len(transformed_df)
+
+    expected_stats_df = Analyzer().compute_desc_stats(transformed_df)
+    assert Analyzer().compare_desc_stats(sqlite_analyzer.compute_desc_stats(), expected_stats_df).empty
+
+def test_filter_rows_match_pandas(transformed_df):
+    sqlite_analyzer = SQLiteAnalyzer()
+    sqlite_analyzer.load_dataframe(transformed_df)
+
+    filtered_df = sqlite_analyzer.filter_rows()
+    expected_df = Analyzer().filter_rows(transformed_df)
+
+    assert len(filtered_df) > 0
+    pd.testing.assert_frame_equal(filtered_df, expected_df, check_index_type=False)
+
+def test_zero_revenue_gives_nan_ratio(transformed_df):
+    sqlite_analyzer = SQLiteAnalyzer()
+    sqlite_analyzer.load_dataframe(transformed_df)
+
+    ratios = sqlite_analyzer.compute_debt_to_income_ratios()['debt_to_income_ratio']
+    expected_ratios = Analyzer().compute_debt_to_income_ratios(transformed_df)['debt_to_income_ratio']
+
+    assert np.isnan(ratios.loc[transformed_df.index[7]])
+    np.testing.assert_allclose(ratios.to_numpy(), expected_ratios.to_numpy(), rtol=1e-12)
+
+def test_loaded_file_is_reused(transformed_df, tmp_path):
+    database_path = str(tmp_path / 'businesses.sqlite')
+
+    sqlite_analyzer = SQLiteAnalyzer(database_path)
+    assert sqlite_analyzer.load_dataframe(transformed_df, 'abc') == len(transformed_df)
+    sqlite_analyzer.close()
+
+    reopened = SQLiteAnalyzer(database_path)
+    assert reopened.is_loaded('abc')
+    assert not reopened.is_loaded('def')
+    assert reopened.load_dataframe(transformed_df, 'abc') == 0
+    assert len(reopened.filter_rows()) == (transformed_df['debt_to_equity'] < 0).sum()
+
+def test_queries_before_loading():
+    with pytest.raises(ValueError, match='No data has been loaded'):
+        SQLiteAnalyzer().compute_desc_stats()
+
+    with pytest.raises(ValueError, match='No data to load'):
+        SQLiteAnalyzer().load_chunks([])
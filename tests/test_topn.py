@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.topn import select_top_positions, top_n, top_n_groups, top_n_per_group
+
+def test_ties_keep_array_order():
+    values = np.array([3, 5, 5, 1, 5, 2])
+
+    assert select_top_positions(values, 2).tolist() == [1, 2]
+    assert select_top_positions(values, 4).tolist() == [1, 2, 4, 0]
+    assert select_top_positions(values, 2, ascending=True).tolist() == [3, 5]
+
+def test_nulls_are_never_selected():
+    values = np.array([np.nan, 2.0, np.nan, 1.0])
+
+    assert select_top_positions(values, 10).tolist() == [1, 3]
+    assert select_top_positions(values, 10, ascending=True).tolist() == [3, 1]
+
+def test_extreme_integers_do_not_overflow():
+    values = np.array([0, np.iinfo('int64').min, np.iinfo('int64').max], dtype='int64')
+
+    assert select_top_positions(values, 1).tolist() == [2]
+    assert select_top_positions(values, 1, ascending=True).tolist() == [1]
+
+@pytest.mark.parametrize('n', [0, -1])
+def test_no_positions_for_non_positive_n(n):
+    assert len(select_top_positions(np.arange(5), n)) == 0
+
+def test_empty_values():
+    assert len(select_top_positions(np.array([], dtype='float64'), 3)) == 0
+
+def test_top_n_matches_nlargest():
+    series = pd.Series(np.random.default_rng(0).integers(0, 50, size=1000), index=np.arange(1000) * 2)
+
+    assert top_n(series, 10).equals(series.nlargest(10))
+    assert top_n(series, 10, ascending=True).equals(series.nsmallest(10))
+
+def test_top_n_groups():
+    df = pd.DataFrame({'state': ['a', 'b', 'a', 'c', 'b'], 'value': [1, 5, 2, 4, 1]})
+
+    assert top_n_groups(df, 'state', 'value', 2).to_dict() == {'b': 6, 'c': 4}
+
+@pytest.mark.parametrize('n_groups', [1, 127, 128, 129, 256, 32768, 40000])
+def test_top_n_per_group_matches_pandas(n_groups):
+    rng = np.random.default_rng(n_groups)
+    # every group has three rows, so the largest group code is n_groups - 1
+    df = pd.DataFrame({'group': rng.permutation(np.repeat(np.arange(n_groups), 3)),
+                       'value': rng.integers(0, 10, size=3 * n_groups)})
+
+    result = top_n_per_group(df, 'group', 'value', 2)
+    expected = (df.sort_values(['group', 'value'], ascending=[True, False], kind='stable')
+                .groupby('group').head(2))
+
+    assert result.index.tolist() == expected.index.tolist()
+    assert result['group'].nunique() == n_groups
+
+def test_top_n_per_group_skips_null_groups_and_values():
+    df = pd.DataFrame({'group': ['a', None, 'b', 'a', 'b', None],
+                       'value': [1.0, 9.0, np.nan, 3.0, 2.0, 8.0]})
+
+    assert top_n_per_group(df, 'group', 'value', 5).index.tolist() == [3, 0, 4]
+
+def test_top_n_per_group_of_empty_frame():
+    df = pd.DataFrame({'group': pd.Series([], dtype='object'), 'value': pd.Series([], dtype='float64')})
+
+    assert top_n_per_group(df, 'group', 'value', 3).empty
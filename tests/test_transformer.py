@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import Analyzer
+from transformer import Transformer
+from utils.mapping import new_column_mapping, state_names
+
+@pytest.fixture
+def source_df():
+    rng = np.random.default_rng(0)
+    size = 2000
+    df = pd.DataFrame({
+        'Business ID': np.arange(1, size + 1),
+        'Business State': rng.choice(state_names[:5], size=size),
+        'Total Long-term Debt': rng.integers(0, 1000, size=size),
+        'Total Equity': rng.integers(-500, 1000, size=size),
+        'Debt to Equity': rng.normal(size=size).round(2),
+        'Total Liabilities': rng.integers(0, 1000, size=size),
+        'Total Revenue': rng.integers(0, 1000, size=size),
+        'Profit Margin': rng.uniform(-1, 1, size=size)
+    })
+
+    # 5% of the rows are repeated
+    return pd.concat([df, df.sample(frac=0.05, random_state=0)], ignore_index=True)
+
+def test_source_columns_are_mapped(source_df):
+    assert set(source_df.columns) <= set(new_column_mapping)
+
+def test_duplicates_are_reported_and_kept(source_df):
+    clean_df, stats = Transformer().preprocess(source_df.copy())
+
+    assert len(clean_df) == len(source_df)
+    assert stats.duplicate_count == 100
+    assert stats.unique_count == 2000
+    assert sorted(stats.duplicate_positions) == list(range(2000, 2100))
+
+def test_duplicates_are_dropped_on_request(source_df):
+    clean_df, stats = Transformer().preprocess(source_df.copy(), drop_duplicates=True)
+
+    assert len(clean_df) == 2000
+    assert clean_df.index.tolist() == list(range(2000))
+
+def test_preprocess_matches_transform_chunk(source_df):
+    transformer = Transformer()
+    clean_df, _ = transformer.preprocess(source_df.copy())
+    chunk_df = transformer.transform_chunk(source_df.copy())
+
+    pd.testing.assert_frame_equal(clean_df, chunk_df)
+
+def test_full_and_chunked_stats_agree(source_df):
+    transformer, analyzer = Transformer(), Analyzer()
+    clean_df, _ = transformer.preprocess(source_df.copy())
+    chunks = (transformer.transform_chunk(source_df.iloc[start:start + 300].copy())
+              for start in range(0, len(source_df), 300))
+
+    stats_df = analyzer.compute_desc_stats_by_chunk(chunks)
+    mismatches = analyzer.compare_desc_stats(stats_df, analyzer.compute_desc_stats(clean_df))
+
+    # medians are exact below the sketch capacity, so every cell agrees
+    assert mismatches.empty
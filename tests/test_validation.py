@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.mapping import column_type, compact_column_type
+from utils.validation import count_reasons, find_missing, match_allowed, parse_numeric, split_valid_rows
+
+def make_rows(**columns):
+    rows = {
+        'business_id': ['1', '2', '3'],
+        'business_state': ['Ohio', 'Texas', 'Utah'],
+        'total_long_term_debt': ['10', '20', '30'],
+        'total_equity': ['-5', '5', '15'],
+        'debt_to_equity': ['1.5', '', '2.0'],
+        'total_liabilities': ['1', '2', '3'],
+        'total_revenue': ['100', '200', '300'],
+        'profit_margin': ['0.1', '0.2', '-0.3']
+    }
+    rows.update(columns)
+    return pd.DataFrame(rows, dtype='object')
+
+def test_clean_rows_are_parsed():
+    valid_df, quarantine_df = split_valid_rows(make_rows())
+
+    assert len(valid_df) == 3
+    assert quarantine_df.empty
+    assert valid_df['total_revenue'].tolist() == [100.0, 200.0, 300.0]
+    assert np.isnan(valid_df['debt_to_equity'].iloc[1])
+
+def test_mixed_case_states_are_kept_and_rewritten():
+    valid_df, quarantine_df = split_valid_rows(make_rows(business_state=['MInnesota', ' texas ', 'UTAH']))
+
+    assert quarantine_df.empty
+    assert valid_df['business_state'].tolist() == ['Minnesota', 'Texas', 'Utah']
+
+def test_unknown_state_is_quarantined():
+    valid_df, quarantine_df = split_valid_rows(make_rows(business_state=['Ohio', 'Texass', 'ohio']))
+
+    assert valid_df['business_state'].tolist() == ['Ohio', 'Ohio']
+    assert quarantine_df['business_state'].tolist() == ['Texass']
+    assert quarantine_df['reasons'].tolist() == ['business_state:not_allowed']
+
+def test_mixed_case_categorical_states():
+    df = make_rows(business_state=pd.Categorical(['MInnesota', 'Ohio', 'Narnia']))
+
+    valid_df, quarantine_df = split_valid_rows(df, compact_column_type)
+
+    assert valid_df['business_state'].tolist() == ['Minnesota', 'Ohio']
+    assert quarantine_df['reasons'].tolist() == ['business_state:not_allowed']
+
+def test_match_allowed_without_rewrites():
+    is_allowed, values = match_allowed(pd.Series(['Ohio', None, 'Mars']), ['Ohio', 'Texas'])
+
+    assert is_allowed.tolist() == [True, False, False]
+    assert values is None
+
+@pytest.mark.parametrize('column, value, reason', [
+    ('total_revenue', ' ', 'total_revenue:missing'),
+    ('total_revenue', None, 'total_revenue:missing'),
+    ('total_revenue', 'n/a', 'total_revenue:malformed'),
+    ('total_revenue', '-1', 'total_revenue:below_min'),
+    ('business_id', '1e30', 'business_id:overflow'),
+    ('business_id', 'inf', 'business_id:overflow'),
+    ('business_id', '12.7', 'business_id:non_integer'),
+    ('total_revenue', '100.5', 'total_revenue:non_integer'),
+    ('business_id', '0', 'business_id:below_min'),
+    ('profit_margin', '1.5', 'profit_margin:above_max'),
+    ('business_state', '', 'business_state:missing')
+])
+def test_failed_checks(column, value, reason):
+    values = make_rows()[column].tolist()
+    values[1] = value
+
+    valid_df, quarantine_df = split_valid_rows(make_rows(**{column: values}))
+
+    assert len(valid_df) == 2
+    assert quarantine_df.index.tolist() == [1]
+    assert quarantine_df['reasons'].tolist() == [reason]
+
+def test_several_reasons_of_one_row():
+    df = make_rows(total_revenue=['100', 'abc', '300'], business_state=['Ohio', 'Atlantis', 'Utah'])
+
+    _, quarantine_df = split_valid_rows(df)
+
+    assert quarantine_df['reasons'].tolist() == ['business_state:not_allowed;total_revenue:malformed']
+    assert count_reasons(quarantine_df).set_index('reason')['cnt_of_rows'].to_dict() == {
+        'business_state:not_allowed': 1, 'total_revenue:malformed': 1}
+
+def test_missing_schema_column_quarantines_every_row():
+    valid_df, quarantine_df = split_valid_rows(make_rows().drop(columns=['total_revenue']))
+
+    assert valid_df.empty
+    assert quarantine_df['reasons'].tolist() == ['total_revenue:column_missing'] * 3
+
+def test_numeric_columns_are_used_as_they_are():
+    df = make_rows().assign(total_revenue=np.array([100, 200, 300], dtype='int64'))
+
+    valid_df, quarantine_df = split_valid_rows(df)
+
+    assert quarantine_df.empty
+    assert valid_df['total_revenue'].dtype == 'int64'
+
+def test_fractions_of_float_integer_columns_are_quarantined():
+    # a workbook or columnar dataset keeps a column with fractions as float64 (see utils/columnar.py)
+    df = make_rows(business_id=np.array([1.0, 12.7, 3.0]), total_revenue=np.array([100.0, 200.0, 1e20]))
+
+    valid_df, quarantine_df = split_valid_rows(df)
+
+    # 1e20 is a whole number, so it only overflows
+    assert valid_df['business_id'].tolist() == [1.0]
+    assert quarantine_df['reasons'].tolist() == ['business_id:non_integer', 'total_revenue:overflow']
+
+def test_empty_frame():
+    valid_df, quarantine_df = split_valid_rows(make_rows().iloc[:0])
+
+    assert valid_df.empty
+    assert quarantine_df.empty
+    assert list(quarantine_df.columns) == list(column_type) + ['reasons']
+
+def test_find_missing_and_parse_numeric():
+    series = pd.Series(['1', ' ', None, 'x', '2.5'], dtype='object')
+
+    values, is_missing, is_malformed = parse_numeric(series)
+
+    assert find_missing(series).tolist() == [False, True, True, False, False]
+    assert is_missing.tolist() == [False, True, True, False, False]
+    assert is_malformed.tolist() == [False, False, False, True, False]
+    assert values[[0, 4]].tolist() == [1.0, 2.5]
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from utils.xlsx_reader import build_column_array, get_column_position, get_sheet_names, read_xlsx, select_sheets
+
+header = ['Business ID', 'Business State', 'Total Revenue']
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'First'
+    sheet.append(header)
+    sheet.append([1, 'Ohio', 100])
+    sheet.append([])
+    sheet.append([2, 'Texas'])
+    sheet['A5'], sheet['C5'] = 3, 300.5
+
+    second = workbook.create_sheet('Second')
+    second.append(header)
+    second.append([4, 'Utah', 'n/a'])
+
+    workbook.create_sheet('Empty')
+
+    other = workbook.create_sheet('Other')
+    other.append(['Business ID', 'Business State'])
+
+    path = tmp_path / 'workbook.xlsx'
+    workbook.save(path)
+    return str(path)
+
+@pytest.mark.parametrize('reference, position', [('A1', 0), ('Z9', 25), ('AA10', 26), ('AZ1', 51), ('BA1', 52),
+                                                 ('XFD1048576', 16383)])
+def test_column_position(reference, position):
+    assert get_column_position(reference) == position
+
+def test_select_sheets():
+    sheet_names = ['First', 'Second', 'Third']
+
+    assert select_sheets(sheet_names, None) == ['First']
+    assert select_sheets(sheet_names, '*') == sheet_names
+    assert select_sheets(sheet_names, 'Second') == ['Second']
+    assert select_sheets(sheet_names, [2, 'First']) == ['Third', 'First']
+
+@pytest.mark.parametrize('sheets', ['Missing', 3, -1, ['First', 'Missing']])
+def test_select_missing_sheet(sheets):
+    with pytest.raises(ValueError, match='not found'):
+        select_sheets(['First', 'Second', 'Third'], sheets)
+
+def test_build_column_array():
+    numbers = build_column_array((1.0, None, 3.0), 'total_revenue')
+    text = build_column_array((1.0, 'n/a'), 'total_revenue')
+    states = build_column_array(('Ohio', None), 'business_state')
+
+    assert numbers.dtype == 'float64' and np.isnan(numbers[1])
+    assert text.dtype == 'object' and text.tolist() == [1.0, 'n/a']
+    assert states.dtype == 'object' and np.isnan(states[1])
+
+def test_read_first_sheet(workbook_path):
+    df = read_xlsx(workbook_path)
+
+    assert get_sheet_names(workbook_path) == ['First', 'Second', 'Empty', 'Other']
+    assert list(df.columns) == header
+
+    # the empty row is skipped, short rows and skipped cells are filled with empty cells
+    assert df['Business ID'].tolist() == [1.0, 2.0, 3.0]
+    assert df['Business State'].tolist()[:2] == ['Ohio', 'Texas']
+    assert np.isnan(df['Business State'].iloc[2])
+    np.testing.assert_array_equal(df['Total Revenue'], [100.0, np.nan, 300.5])
+
+def test_matches_read_excel(workbook_path):
+    df = read_xlsx(workbook_path)
+    # pd.read_excel keeps the empty row, the reader skips it
+    expected = pd.read_excel(workbook_path).dropna(how='all')
+
+    np.testing.assert_array_equal(df['Total Revenue'].to_numpy(dtype='float64'),
+                                  expected['Total Revenue'].to_numpy(dtype='float64'))
+
+@pytest.mark.parametrize('batch_size', [1, 2, 50_000])
+def test_read_several_sheets(workbook_path, batch_size):
+    df = read_xlsx(workbook_path, ['First', 'Second', 'Empty'], batch_size=batch_size)
+
+    assert df.index.tolist() == [0, 1, 2, 3]
+    assert df['Business ID'].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+    # text in a numeric column keeps the values of its batch as objects, so the schema cast can report it
+    assert df['Total Revenue'].iloc[-1] == 'n/a'
+
+def test_different_headers(workbook_path):
+    with pytest.raises(ValueError, match='header'):
+        read_xlsx(workbook_path, ['First', 'Other'])
+
+def test_empty_sheet(workbook_path):
+    assert read_xlsx(workbook_path, 'Empty').empty
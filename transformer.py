@@ -4,18 +4,97 @@ Description:
 
 Parameters:
     orig_df (DataFrame): The Pandas DataFrame created by reading and loading the source csv data file.
+    schema (dict): The column types to cast to, e.g. column_type or compact_column_type from utils/mapping.py.
 
 Methods:
+    - validate(df): Checks every row against the schema and column constraints, quarantining the failing rows.
     - normalize_column_names(df): Standardizes source column names using snake_case.
     - cast_column_data_type(df): Casts data type of each column to an appropriate type.
     - identify_duplicate_rows(df): Finds duplicate records by all columns.
     - drop_column(df): Drops unnecessary column(s).
     - round_to_two_decimal_places(df): Rounds numeric columns into two decimal places.
+    - transform_chunk(df): Normalizes, casts and rounds a chunk of the source csv data file.
+    - preprocess(df, drop_duplicates): Normalizes, casts, finds duplicates, counts nulls and rounds in one pass over
+      the columns.
 '''
 
+import numpy as np
+import pandas as pd
+
 from utils.mapping import new_column_mapping, column_type
+from utils.schema import apply_schema, cast_column
+from utils.validation import split_valid_rows
+
+class PreprocessStats:
+    '''
+    Counts collected by Transformer.preprocess().
+
+    Parameters:
+        row_count (int): The number of rows before duplicates are removed.
+        duplicate_positions (ndarray): The positions of the duplicate rows in the source dataframe.
+        null_counts (Series): The number of null values of each column.
+    '''
+    def __init__(self, row_count, duplicate_positions, null_counts):
+        self.row_count = row_count
+        self.duplicate_positions = duplicate_positions
+        self.null_counts = null_counts
+
+    @property
+    def duplicate_count(self):
+        '''
+        The number of duplicate records.
+        '''
+        return len(self.duplicate_positions)
+
+    @property
+    def unique_count(self):
+        '''
+        The number of unique records.
+        '''
+        return self.row_count - self.duplicate_count
+
+    @property
+    def non_null_counts(self):
+        '''
+        The number of non-null values of each column.
+        '''
+        return self.row_count - self.null_counts
 
 class Transformer:
+    def __init__(self, schema=column_type):
+        self.schema = schema
+
+    def __rename_columns(self, orig_df):
+        '''
+        Rename the source columns using the new column mapping.
+
+        :param orig_df: The Pandas DataFrame created by reading and loading the source csv data file.
+        :return: The Pandas DataFrame with column names in standardized format.
+        '''
+        return orig_df.rename(columns=new_column_mapping)
+
+    def __cast_columns(self, orig_df):
+        '''
+        Cast each mapped column whose data type differs from the schema.
+
+        :param orig_df: The Pandas DataFrame with column names in standardized format.
+        '''
+        apply_schema(orig_df, self.schema)
+
+    def validate(self, orig_df):
+        '''
+        Check every row against the schema and the column constraints in utils/mapping.py in one vectorized pass
+        (see utils/validation.py), before the columns are cast. Null, blank, malformed, out-of-range values and
+        unknown states no longer abort the cast: their rows are quarantined with reason codes and the valid rows
+        continue. Nothing is printed, so the method can be called once per chunk.
+
+        :param orig_df: The Pandas DataFrame created by reading and loading the source csv data file.
+        :returns:
+         - The Pandas DataFrame of the valid rows, which can be cast to the schema.
+         - The Pandas DataFrame of the quarantined rows as they were read, with a reasons column.
+        '''
+        return split_valid_rows(orig_df, self.schema)
+
     def normalize_column_names(self, orig_df):
         '''
         Standardize column names.
@@ -23,7 +102,7 @@ class Transformer:
         :param orig_df: The Pandas DataFrame created by reading and loading the source csv data file.
         :return: The Pandas DataFrame with column names in standardized format.
         '''
-        orig_df = orig_df.rename(columns=new_column_mapping)
+        orig_df = self.__rename_columns(orig_df)
 
         print('Column names are normalized')
         return orig_df
@@ -34,9 +113,7 @@ class Transformer:
 
         :param orig_df: The Pandas DataFrame created by reading and loading the source csv data file.
         '''
-        for column in orig_df.columns:
-            if column in column_type.keys() and orig_df[column].dtypes != column_type[column]:
-                orig_df[column] = orig_df[column].astype(column_type[column])
+        self.__cast_columns(orig_df)
 
         print('The data type of each column is cast')
 
@@ -74,4 +151,95 @@ class Transformer:
 
         :param orig_df: The Pandas DataFrame created by reading and loading the source csv data file.
         '''
-        orig_df[orig_df.select_dtypes(include='float64').columns] = orig_df.select_dtypes(include='float64').round(2)
\ No newline at end of file
+        orig_df[orig_df.select_dtypes(include='float64').columns] = orig_df.select_dtypes(include='float64').round(2)
+
+    def transform_chunk(self, chunk_df):
+        '''
+        Normalize column names, cast data types and round float columns of a chunk of the source csv data file.
+        Unlike the individual steps, nothing is printed so the method can be called once per chunk.
+
+        :param chunk_df: A Pandas DataFrame chunk read from the source csv data file.
+        :return: The transformed Pandas DataFrame chunk.
+        '''
+        chunk_df = self.__rename_columns(chunk_df)
+        self.__cast_columns(chunk_df)
+        self.round_to_two_decimal_places(chunk_df)
+        return chunk_df
+
+    def __find_duplicate_positions(self, row_hashes, columns):
+        '''
+        Find duplicate rows from their row hashes. Rows that share a hash with an earlier row are compared with
+        that row, so a hash collision is never reported as a duplicate.
+
+        :param row_hashes: The uint64 hash of each row.
+        :param columns: The dictionary of {column name: NumPy array} the hashes were built from.
+        :return: The positions of the duplicate rows, keeping the first occurrence of each row.
+        '''
+        codes, uniques = pd.factorize(row_hashes)
+
+        if len(uniques) == len(row_hashes):
+            return np.empty(0, dtype='int64')
+
+        # the first position of each hash, found by writing positions in reverse so the first one wins
+        positions = np.arange(len(row_hashes))
+        first_positions = np.empty(len(uniques), dtype='int64')
+        first_positions[codes[::-1]] = positions[::-1]
+
+        candidates = positions[first_positions[codes] != positions]
+        originals = first_positions[codes[candidates]]
+
+        is_equal = np.ones(len(candidates), dtype='bool')
+        for values in columns.values():
+            left, right = values[candidates], values[originals]
+            is_equal &= (left == right) | (pd.isna(left) & pd.isna(right))
+
+        return candidates[is_equal]
+
+    def preprocess(self, orig_df, drop_duplicates=False):
+        '''
+        Normalize column names, cast data types, find duplicate records, count null values and round float columns
+        in a single pass over the columns. Duplicates are found by hashing every row, column by column, while the
+        column is being cast; null values are counted and float columns rounded in the same step.
+        Duplicate records are only reported by default and stay in the returned DataFrame, as in transform_chunk(),
+        so the statistics agree with the streaming and aggregate store paths.
+
+        :param orig_df: The Pandas DataFrame created by reading and loading the source csv data file.
+        :param drop_duplicates: Whether to remove duplicate records from the returned DataFrame.
+        :returns:
+         - The cleaned Pandas DataFrame.
+         - The PreprocessStats with the duplicate and null counts.
+        '''
+        row_hashes = np.zeros(len(orig_df), dtype='uint64')
+        columns, hashed_columns, null_counts = {}, {}, {}
+
+        for source_column in orig_df.columns:
+            column = new_column_mapping.get(source_column, source_column)
+            series = orig_df[source_column].rename(column)
+
+            if column in self.schema.keys():
+                series = cast_column(series, self.schema[column])
+
+            # combine the column hash into the row hash the same way pandas combines hashes
+            column_hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+            row_hashes = row_hashes * np.uint64(1000003) ^ column_hashes
+
+            null_counts[column] = int(series.isna().sum())
+            hashed_columns[column] = series.to_numpy()
+
+            # round after hashing, as the separate steps identify duplicates before rounding
+            if series.dtype == 'float64':
+                series = series.round(2)
+
+            columns[column] = series
+
+        duplicate_positions = self.__find_duplicate_positions(row_hashes, hashed_columns)
+        stats = PreprocessStats(len(orig_df), duplicate_positions, pd.Series(null_counts))
+
+        clean_df = pd.DataFrame(columns, index=orig_df.index)
+
+        if drop_duplicates and len(duplicate_positions) > 0:
+            keep = np.ones(len(clean_df), dtype='bool')
+            keep[duplicate_positions] = False
+            clean_df = clean_df.iloc[np.flatnonzero(keep)]
+
+        return clean_df, stats
@@ -0,0 +1,103 @@
+'''
+Description:
+    This class persists per-business_state StateAggregates on disk so descriptive statistics can be updated
+    incrementally. Every ingested file is recorded by its content hash, so adding a new quarterly file only costs
+    time proportional to its own rows, and the same file is never counted twice.
+
+Parameters:
+    store_path (str): The path of the JSON file that holds the aggregates.
+
+Methods:
+    - load(): Loads the aggregates and the list of ingested files.
+    - is_ingested(file_path): Checks whether a file has already been added to the store.
+    - add(file_path, aggregates): Merges the aggregates of a new file into the store.
+    - clear(): Removes the store file.
+'''
+
+import json
+import os
+import time
+
+from utils.aggregates import StateAggregates
+from utils.conversion_cache import hash_file
+
+class AggregateStore:
+    def __init__(self, store_path):
+        self.store_path = store_path
+
+    def __save(self, aggregates, ingested_files):
+        '''
+        Write the aggregates and the list of ingested files to the store file.
+
+        :param aggregates: The StateAggregates of every ingested file.
+        :param ingested_files: The dictionary of {content hash: file details}.
+        '''
+        store_dir = os.path.dirname(self.store_path)
+
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+
+        # write to a temporary file first so an interrupted update never leaves a corrupt store
+        temp_path = f'{self.store_path}.tmp'
+
+        with open(temp_path, 'w') as store_file:
+            json.dump({'ingested_files': ingested_files, 'aggregates': aggregates.to_dict()}, store_file)
+
+        os.replace(temp_path, self.store_path)
+
+    def load(self):
+        '''
+        Load the aggregates and the list of ingested files.
+
+        :returns:
+         - The StateAggregates of every ingested file, or None if the store is empty.
+         - The dictionary of {content hash: file details}.
+        '''
+        if not os.path.isfile(self.store_path):
+            return None, {}
+
+        with open(self.store_path) as store_file:
+            store = json.load(store_file)
+
+        return StateAggregates.from_dict(store['aggregates']), store['ingested_files']
+
+    def is_ingested(self, file_path):
+        '''
+        Check whether a file has already been added to the store, by content.
+
+        :param file_path: The path of the source data file.
+        :return: True if a file with the same content was already added, otherwise False.
+        '''
+        _, ingested_files = self.load()
+        return hash_file(file_path) in ingested_files
+
+    def add(self, file_path, aggregates):
+        '''
+        Merge the aggregates of a new file into the store.
+
+        :param file_path: The path of the source data file the aggregates were computed from.
+        :param aggregates: The StateAggregates of the new file.
+        :raises ValueError: If the file was already added or its numeric columns differ from the store.
+        '''
+        stored_aggregates, ingested_files = self.load()
+        file_hash = hash_file(file_path)
+
+        if file_hash in ingested_files:
+            raise ValueError(f'{file_path} has already been added to the aggregate store.')
+
+        if stored_aggregates is None:
+            stored_aggregates = aggregates
+        elif stored_aggregates.numeric_columns != aggregates.numeric_columns:
+            raise ValueError(f'The numeric columns of {file_path} do not match the aggregate store.')
+        else:
+            stored_aggregates.merge(aggregates)
+
+        ingested_files[file_hash] = {'file': file_path, 'rows': aggregates.row_count, 'added_at': time.time()}
+        self.__save(stored_aggregates, ingested_files)
+
+    def clear(self):
+        '''
+        Remove the store file.
+        '''
+        if os.path.isfile(self.store_path):
+            os.remove(self.store_path)
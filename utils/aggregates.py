@@ -0,0 +1,210 @@
+'''
+Description:
+    This class keeps running per-business_state aggregates of numeric columns so that descriptive statistics can be
+    computed one chunk at a time. Count, sum, min and max are exact; the median is estimated with a mergeable
+    QuantileSketch.
+
+Parameters:
+    numeric_columns (list): The numeric columns to aggregate.
+    sketch_capacity (int): The capacity of each QuantileSketch used to estimate the median.
+
+Methods:
+    - update(df): Adds the rows of a dataframe chunk to the aggregates.
+    - merge(other): Merges another StateAggregates into this one.
+    - to_stats_df(): Builds the descriptive statistics (mean, median, min, max) by business_state.
+    - get_median_rank_errors(): Gets the rank error bound of every estimated median by business_state.
+    - to_dict(): Serializes the aggregates into a dictionary.
+    - from_dict(state): Rebuilds aggregates from a dictionary created by to_dict().
+'''
+
+import pandas as pd
+
+from utils.sketch import QuantileSketch
+
+class StateAggregates:
+    def __init__(self, numeric_columns, sketch_capacity=1000):
+        self.numeric_columns = list(numeric_columns)
+        self.sketch_capacity = sketch_capacity
+        self.row_count = 0
+        self.count = None
+        self.sum = None
+        self.min = None
+        self.max = None
+        self.sketches = {}
+
+    def __combine(self, running_df, chunk_df, how):
+        '''
+        Combine a running aggregate with the aggregate of a new chunk.
+
+        :param running_df: The running aggregate by business_state, or None before the first chunk.
+        :param chunk_df: The aggregate by business_state of the new chunk.
+        :param how: The name of the reduction used to combine both aggregates ('sum', 'min' or 'max').
+        :return: The combined aggregate by business_state.
+        '''
+        if running_df is None:
+            return chunk_df
+
+        return pd.concat([running_df, chunk_df]).groupby(level=0).agg(how)
+
+    def __get_sketches(self, state):
+        '''
+        Get the sketches of a state, creating them the first time the state is seen.
+
+        :param state: The business_state.
+        :return: The dictionary of QuantileSketch by column.
+        '''
+        if state not in self.sketches:
+            self.sketches[state] = {column: QuantileSketch(self.sketch_capacity) for column in self.numeric_columns}
+
+        return self.sketches[state]
+
+    def update(self, chunk_df):
+        '''
+        Add the rows of a dataframe chunk to the aggregates.
+
+        :param chunk_df: The Pandas dataframe chunk with business_state and the numeric columns.
+        '''
+        grouped = chunk_df.groupby('business_state', observed=True)[self.numeric_columns]
+        chunk_stats = grouped.agg(['count', 'sum', 'min', 'max'])
+
+        self.row_count += len(chunk_df)
+        self.count = self.__combine(self.count, chunk_stats.xs('count', axis=1, level=1), 'sum')
+        self.sum = self.__combine(self.sum, chunk_stats.xs('sum', axis=1, level=1), 'sum')
+        self.min = self.__combine(self.min, chunk_stats.xs('min', axis=1, level=1), 'min')
+        self.max = self.__combine(self.max, chunk_stats.xs('max', axis=1, level=1), 'max')
+
+        # feed the values of each state into its median sketches
+        for state, positions in grouped.indices.items():
+            sketches = self.__get_sketches(state)
+
+            for column in self.numeric_columns:
+                sketches[column].update(chunk_df[column].to_numpy()[positions])
+
+    def merge(self, other):
+        '''
+        Merge another StateAggregates into this one.
+
+        :param other: The StateAggregates to merge.
+        '''
+        if other.count is None:
+            return
+
+        self.row_count += other.row_count
+        self.count = self.__combine(self.count, other.count, 'sum')
+        self.sum = self.__combine(self.sum, other.sum, 'sum')
+        self.min = self.__combine(self.min, other.min, 'min')
+        self.max = self.__combine(self.max, other.max, 'max')
+
+        for state, other_sketches in other.sketches.items():
+            sketches = self.__get_sketches(state)
+
+            for column in self.numeric_columns:
+                sketches[column].merge(other_sketches[column])
+
+    def to_stats_df(self):
+        '''
+        Build the descriptive statistics (mean, median, min, max) by business_state from the aggregates.
+
+        :return: The Pandas dataframe with the same layout as Analyzer.compute_desc_stats(); without any rows, it
+            has the same columns and no states.
+        '''
+        if self.count is None:
+            return pd.DataFrame(columns=pd.MultiIndex.from_product(
+                                    [self.numeric_columns, ['mean', 'median', 'min', 'max']]),
+                                index=pd.Index([], name='business_state'), dtype='float64')
+
+        states = sorted(self.sketches.keys())
+
+        median_df = pd.DataFrame(
+            {column: [self.sketches[state][column].median() for state in states] for column in self.numeric_columns},
+            index=states)
+
+        stats = {}
+        for column in self.numeric_columns:
+            stats[(column, 'mean')] = (self.sum[column] / self.count[column]).reindex(states)
+            stats[(column, 'median')] = median_df[column]
+            stats[(column, 'min')] = self.min[column].reindex(states)
+            stats[(column, 'max')] = self.max[column].reindex(states)
+
+        stats_df = pd.DataFrame(stats)
+        stats_df.index.name = 'business_state'
+        return stats_df
+
+    def get_median_rank_errors(self):
+        '''
+        Get the bound on the rank error of every estimated median (see QuantileSketch.get_rank_error()).
+
+        :return: The Pandas dataframe of bounds by business_state, one column per numeric column.
+        '''
+        states = sorted(self.sketches.keys())
+
+        return pd.DataFrame({column: [self.sketches[state][column].get_rank_error() for state in states]
+                             for column in self.numeric_columns},
+                            index=pd.Index(states, name='business_state'), dtype='float64')
+
+    def __frame_to_dict(self, df):
+        '''
+        Serialize a running aggregate into a dictionary of plain Python values, keeping the column dtypes.
+
+        :param df: The running aggregate by business_state.
+        :return: The dictionary that represents the aggregate.
+        '''
+        return {
+            'index': [str(state) for state in df.index],
+            'columns': {column: df[column].tolist() for column in df.columns},
+            'dtypes': {column: str(df[column].dtype) for column in df.columns}
+        }
+
+    @staticmethod
+    def __frame_from_dict(state):
+        '''
+        Rebuild a running aggregate from a dictionary created by __frame_to_dict().
+
+        :param state: The dictionary that represents the aggregate.
+        :return: The running aggregate by business_state.
+        '''
+        df = pd.DataFrame(state['columns'], index=pd.Index(state['index'], name='business_state'))
+        return df.astype(state['dtypes'])
+
+    def to_dict(self):
+        '''
+        Serialize the aggregates into a dictionary of plain Python values, e.g. to persist them as JSON.
+
+        :return: The dictionary that represents the aggregates.
+        '''
+        if self.count is None:
+            frames = None
+        else:
+            frames = {name: self.__frame_to_dict(df)
+                      for name, df in [('count', self.count), ('sum', self.sum), ('min', self.min), ('max', self.max)]}
+
+        return {
+            'numeric_columns': self.numeric_columns,
+            'sketch_capacity': self.sketch_capacity,
+            'row_count': self.row_count,
+            'frames': frames,
+            'sketches': {str(state): {column: sketch.to_dict() for column, sketch in sketches.items()}
+                         for state, sketches in self.sketches.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        '''
+        Rebuild aggregates from a dictionary created by to_dict().
+
+        :param state: The dictionary that represents the aggregates.
+        :return: The rebuilt StateAggregates.
+        '''
+        aggregates = cls(state['numeric_columns'], state['sketch_capacity'])
+        aggregates.row_count = state['row_count']
+
+        if state['frames'] is not None:
+            aggregates.count = cls.__frame_from_dict(state['frames']['count'])
+            aggregates.sum = cls.__frame_from_dict(state['frames']['sum'])
+            aggregates.min = cls.__frame_from_dict(state['frames']['min'])
+            aggregates.max = cls.__frame_from_dict(state['frames']['max'])
+
+        aggregates.sketches = {
+            state_name: {column: QuantileSketch.from_dict(sketch) for column, sketch in sketches.items()}
+            for state_name, sketches in state['sketches'].items()}
+        return aggregates
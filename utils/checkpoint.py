@@ -0,0 +1,189 @@
+'''
+Description:
+    This class stores the outputs of pipeline stages on disk so a stage whose inputs did not change is loaded
+    instead of executed again.
+
+    Each checkpoint is a pickle file named after the fingerprint of the stage that produced it (see StageGraph).
+    An index records the stage, size, creation and last use time of every checkpoint. Checkpoints are evicted in
+    least-recently-used order once the cache grows beyond its maximum size.
+
+Parameters:
+    cache_dir (str): The directory where checkpoints are stored.
+    max_size_bytes (int): The maximum total size of all checkpoints.
+
+Methods:
+    - load(key): Loads a checkpoint, if it exists.
+    - store(key, stage, value): Stores the output of a stage as a checkpoint.
+    - list_entries(): Lists the checkpoints, most recently used first.
+    - evict(): Removes least-recently-used checkpoints until the cache fits its maximum size.
+    - clear(stage): Removes every checkpoint, or only the checkpoints of one stage.
+'''
+
+import json
+import os
+import pickle
+import time
+
+import pandas as pd
+
+index_filename = 'index.json'
+
+class CheckpointCache:
+    def __init__(self, cache_dir, max_size_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+
+    def __read_index(self):
+        '''
+        Read the index of the checkpoints.
+
+        :return: The dictionary of {key: {'stage', 'size', 'created', 'last_used'}}.
+        '''
+        try:
+            with open(os.path.join(self.cache_dir, index_filename)) as index_file:
+                return json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def __write_index(self, index):
+        '''
+        Write the index of the checkpoints.
+
+        :param index: The dictionary of {key: {'stage', 'size', 'created', 'last_used'}}.
+        '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # write to a temporary file first so concurrent readers never see a partial index
+        index_path = os.path.join(self.cache_dir, index_filename)
+        temp_path = f'{index_path}.{os.getpid()}.tmp'
+
+        with open(temp_path, 'w') as index_file:
+            json.dump(index, index_file, indent=2)
+
+        os.replace(temp_path, index_path)
+
+    def __checkpoint_path(self, key):
+        '''
+        Get the file of a checkpoint.
+
+        :param key: The fingerprint of the stage.
+        :return: The path of the pickle file.
+        '''
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def __remove_checkpoint(self, key):
+        '''
+        Remove the file of a checkpoint.
+
+        :param key: The fingerprint of the stage.
+        '''
+        try:
+            os.remove(self.__checkpoint_path(key))
+        except FileNotFoundError:
+            pass
+
+    def load(self, key):
+        '''
+        Load a checkpoint and record that it was just used, so it is evicted last.
+
+        :param key: The fingerprint of the stage.
+        :returns:
+         - True if the checkpoint exists, otherwise False.
+         - The output of the stage, or None if the checkpoint does not exist.
+        '''
+        index = self.__read_index()
+
+        if key not in index or not os.path.isfile(self.__checkpoint_path(key)):
+            return False, None
+
+        try:
+            with open(self.__checkpoint_path(key), 'rb') as checkpoint_file:
+                value = pickle.load(checkpoint_file)
+        except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # a truncated checkpoint or one written by incompatible code is treated as missing
+            self.__remove_checkpoint(key)
+            return False, None
+
+        index[key]['last_used'] = time.time()
+        self.__write_index(index)
+        return True, value
+
+    def store(self, key, stage, value):
+        '''
+        Store the output of a stage as a checkpoint.
+
+        :param key: The fingerprint of the stage.
+        :param stage: The name of the stage.
+        :param value: The output of the stage; it must be picklable.
+        :return: The path of the checkpoint file.
+        '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        checkpoint_path = self.__checkpoint_path(key)
+        temp_path = f'{checkpoint_path}.{os.getpid()}.tmp'
+
+        with open(temp_path, 'wb') as checkpoint_file:
+            pickle.dump(value, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_path, checkpoint_path)
+
+        now = time.time()
+        index = self.__read_index()
+        index[key] = {'stage': stage, 'size': os.path.getsize(checkpoint_path), 'created': now, 'last_used': now}
+        self.__write_index(index)
+
+        self.evict()
+        return checkpoint_path
+
+    def list_entries(self):
+        '''
+        List the checkpoints, most recently used first.
+
+        :return: The Pandas dataframe with the stage, size, creation and last use time of each checkpoint.
+        '''
+        index = self.__read_index()
+        entries_df = pd.DataFrame([{'key': key, **entry} for key, entry in index.items()],
+                                  columns=['key', 'stage', 'size', 'created', 'last_used'])
+
+        for column in ['created', 'last_used']:
+            entries_df[column] = pd.to_datetime(entries_df[column], unit='s').dt.floor('s')
+
+        return entries_df.sort_values('last_used', ascending=False).set_index('key')
+
+    def evict(self):
+        '''
+        Remove least-recently-used checkpoints until the total size fits the maximum cache size.
+        '''
+        index = self.__read_index()
+        total_size = sum(entry['size'] for entry in index.values())
+
+        if total_size <= self.max_size_bytes:
+            return
+
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+            if total_size <= self.max_size_bytes:
+                break
+
+            self.__remove_checkpoint(key)
+            del index[key]
+            total_size -= entry['size']
+
+        self.__write_index(index)
+
+    def clear(self, stage=None):
+        '''
+        Remove every checkpoint, or only the checkpoints of one stage.
+
+        :param stage: The name of the stage, or None to remove every checkpoint.
+        :return: The number of removed checkpoints.
+        '''
+        index = self.__read_index()
+        removed_keys = [key for key, entry in index.items() if stage is None or entry['stage'] == stage]
+
+        for key in removed_keys:
+            self.__remove_checkpoint(key)
+            del index[key]
+
+        if removed_keys:
+            self.__write_index(index)
+
+        return len(removed_keys)
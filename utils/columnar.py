@@ -0,0 +1,221 @@
+'''
+Description:
+    This class reads a columnar dataset: a directory holding one fixed-width NumPy file per column and a
+    manifest.json describing the columns. The module functions write such a dataset from a dataframe, a csv file
+    or an excel workbook.
+
+    Numeric columns are stored with the column types in utils/mapping.py. Text columns such as business_state are
+    dictionary-encoded: the file holds the narrowest integer codes and the manifest holds the categories, so the
+    file stays fixed-width and loads without pickling. The manifest also holds a digest of the data, which
+    identifies the dataset without reading it again.
+
+    Column files are opened with np.memmap in copy-on-write mode, so opening a dataset reads nothing: the pages are
+    read from the operating system's page cache when they are first used and are shared by every process that
+    opens the same dataset, e.g. batch or chart workers. Dataframes built by the reader use the memory-mapped
+    arrays without copying them; a process that changes a value gets a private copy of that page only.
+
+Parameters:
+    dataset_dir (str): The directory of the dataset.
+
+Methods:
+    - get_arrays(): Gets the memory-mapped array of every column; text columns as codes.
+    - get_categories(column): Gets the categories of a dictionary-encoded column.
+    - to_dataframe(start, stop, decode_text): Builds a Pandas dataframe of some rows without copying the numbers.
+    - iter_chunks(chunk_size, decode_text): Builds Pandas dataframes of consecutive rows of bounded size.
+
+Functions:
+    - is_columnar(path): Checks whether a path is a columnar dataset.
+    - write_columnar(df, dataset_dir, metadata): Writes a dataframe as a columnar dataset.
+    - convert_to_columnar(source_file_path, dataset_dir, sheets): Writes a csv file or workbook as a dataset.
+'''
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.mapping import new_column_mapping, column_type
+from utils.schema import get_narrowest_integer_dtype
+from utils.xlsx_reader import read_xlsx
+
+manifest_filename = 'manifest.json'
+
+# bump when the layout of the column files changes, so older datasets are written again
+columnar_format_version = 3
+
+# how far a float may be from an integer and still be stored in an int column, e.g. 2009999.9999999998
+integer_tolerance = 1e-6
+
+def is_columnar(path):
+    '''
+    Check whether a path is a columnar dataset written in the current format.
+
+    :param path: The path to check.
+    :return: True if the path is a columnar dataset, otherwise False.
+    '''
+    try:
+        with open(os.path.join(path, manifest_filename)) as manifest_file:
+            return json.load(manifest_file).get('format') == columnar_format_version
+    except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+        return False
+
+def write_columnar(df, dataset_dir, metadata=None):
+    '''
+    Write a dataframe as a columnar dataset. Columns are renamed with the new column mapping and cast with the
+    column type mapping; text columns are dictionary-encoded. The manifest is written last, so a partially written
+    dataset is never opened.
+
+    :param df: The Pandas dataframe, with source or normalized column names.
+    :param dataset_dir: The directory of the dataset; it is created if needed.
+    :param metadata: A dictionary of extra values stored in the manifest, e.g. the source file.
+    :return: The directory of the dataset.
+    '''
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    df = df.rename(columns=new_column_mapping)
+    digest = hashlib.sha256()
+    columns = []
+
+    for column in df.columns:
+        series = df[column]
+
+        if column_type.get(column) in ('object', 'category') or not pd.api.types.is_numeric_dtype(series.dtype):
+            # null values get the code -1, as in pd.Categorical
+            codes, categories = pd.factorize(series, sort=True)
+            values = codes.astype(get_narrowest_integer_dtype(-1, len(categories)))
+            description = {'name': column, 'dtype': 'object', 'categories': categories.astype(str).tolist()}
+        else:
+            values = series.to_numpy()
+            dtype = np.dtype(column_type.get(column, values.dtype))
+
+            if dtype.kind == 'i' and values.dtype.kind == 'f':
+                # excel stores integers as floats, e.g. 2009999.9999999998, so they are rounded before the cast
+                rounded = np.rint(values)
+
+                with np.errstate(invalid='ignore'):
+                    is_integral = ((np.abs(values - rounded) <= integer_tolerance)
+                                   & (rounded >= -2.0 ** 63) & (rounded < 2.0 ** 63))
+
+                if is_integral.all():
+                    values = rounded
+                else:
+                    # null, fractional, infinite or out-of-range values keep the source type, so the validation
+                    # quarantines their rows instead of the cast wrapping or truncating them
+                    dtype = values.dtype
+
+            values = np.ascontiguousarray(values.astype(dtype))
+            description = {'name': column, 'dtype': str(values.dtype)}
+
+        np.save(os.path.join(dataset_dir, f'{column}.npy'), values, allow_pickle=False)
+
+        digest.update(json.dumps(description).encode())
+        digest.update(values.tobytes())
+        columns.append(description)
+
+    manifest = {
+        **(metadata or {}),
+        'format': columnar_format_version,
+        'rows': len(df),
+        'columns': columns,
+        'digest': digest.hexdigest()
+    }
+
+    with open(os.path.join(dataset_dir, manifest_filename), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    return dataset_dir
+
+def convert_to_columnar(source_file_path, dataset_dir, sheets=None):
+    '''
+    Write a csv file or an excel workbook as a columnar dataset.
+
+    :param source_file_path: The path of the csv file or excel workbook.
+    :param dataset_dir: The directory of the dataset.
+    :param sheets: The sheets of the workbook to convert (see utils/xlsx_reader.py); None for the first sheet.
+    :return: The directory of the dataset.
+    '''
+    if source_file_path.lower().endswith('.csv'):
+        df = pd.read_csv(source_file_path)
+    else:
+        df = read_xlsx(source_file_path, sheets)
+
+    return write_columnar(df, dataset_dir, {'source': os.path.abspath(source_file_path)})
+
+class ColumnarDataset:
+    def __init__(self, dataset_dir):
+        self.dataset_dir = dataset_dir
+
+        with open(os.path.join(dataset_dir, manifest_filename)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+
+        if self.manifest.get('format') != columnar_format_version:
+            raise ValueError(f'{dataset_dir} is not a columnar dataset of format {columnar_format_version}.')
+
+        self.columns = {column['name']: column for column in self.manifest['columns']}
+        self.row_count = self.manifest['rows']
+        self.digest = self.manifest['digest']
+        self.arrays = None
+
+    def get_arrays(self):
+        '''
+        Get the memory-mapped array of every column. Dictionary-encoded columns are returned as their codes.
+        The files are only opened once per dataset object.
+
+        :return: The dictionary of {column name: NumPy memmap}.
+        '''
+        if self.arrays is None:
+            # copy-on-write: writes to an array stay private to this process and never reach the file
+            self.arrays = {name: np.load(os.path.join(self.dataset_dir, f'{name}.npy'), mmap_mode='c',
+                                         allow_pickle=False)
+                           for name in self.columns}
+
+        return self.arrays
+
+    def get_categories(self, column):
+        '''
+        Get the categories of a dictionary-encoded column.
+
+        :param column: The column name.
+        :return: The NumPy array of categories; code i stands for categories[i].
+        '''
+        return np.array(self.columns[column]['categories'], dtype='object')
+
+    def to_dataframe(self, start=0, stop=None, decode_text=True):
+        '''
+        Build a Pandas dataframe of some rows. Numeric columns are views of the memory-mapped files.
+
+        :param start: The first row.
+        :param stop: The row after the last row, or None for the last row of the dataset.
+        :param decode_text: Whether to decode text columns into object columns; otherwise they are categoricals
+            that use the memory-mapped codes.
+        :return: The Pandas dataframe, indexed by row number.
+        '''
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        data = {}
+
+        for name, values in self.get_arrays().items():
+            values = values[start:stop]
+
+            if self.columns[name]['dtype'] != 'object':
+                data[name] = values
+            elif decode_text:
+                # one extra NaN category decodes the null code -1
+                data[name] = np.append(self.get_categories(name), np.nan)[values]
+            else:
+                data[name] = pd.Categorical.from_codes(values, categories=self.columns[name]['categories'])
+
+        # slices keep the row numbers of the dataset, as pd.read_csv chunks do
+        return pd.DataFrame(data, index=pd.RangeIndex(start, stop), copy=False)
+
+    def iter_chunks(self, chunk_size, decode_text=True):
+        '''
+        Build Pandas dataframes of consecutive rows. Only the pages of the current chunk are read.
+
+        :param chunk_size: The maximum number of rows in each chunk.
+        :param decode_text: Whether to decode text columns into object columns.
+        :return: A generator of Pandas dataframes, one per chunk.
+        '''
+        for start in range(0, self.row_count, chunk_size):
+            yield self.to_dataframe(start, start + chunk_size, decode_text)
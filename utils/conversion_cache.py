@@ -0,0 +1,331 @@
+'''
+Description:
+    This class caches converted excel workbooks as typed per-column NumPy files so the slow xlsx parsing only
+    happens when the workbook changes.
+
+    Each cache entry is a directory named after the sha256 hash of the workbook content and of a fingerprint of the
+    column mappings. It is a columnar dataset (see utils/columnar.py): one memory-mapped .npy file per column, cast
+    with the column types in utils/mapping.py, and a manifest.json describing the columns. Entries of an older format
+    or column mapping are converted again.
+    An index maps every workbook path to its last known mtime, size and content hash, so unchanged workbooks are found
+    without hashing them again. Entries are evicted in least-recently-used order once the cache grows beyond
+    its maximum size, but the entry being stored is never evicted. A workbook that is larger than the whole cache on
+    its own is not cached: it is kept as a temporary dataset that is removed when the process exits.
+
+Parameters:
+    cache_dir (str): The directory where cache entries are stored.
+    max_size_bytes (int): The maximum total size of all cache entries.
+
+Methods:
+    - lookup(source_file_path, variant): Finds the cache entry of a workbook, if it is still valid.
+    - store(source_file_path, df, variant): Stores a converted workbook as a new cache entry.
+    - load(entry_path): Loads a cache entry into a Pandas dataframe.
+    - load_chunks(entry_path, chunk_size): Loads a cache entry in chunks of bounded size.
+    - is_entry(path): Checks whether a path is a cache entry.
+    - invalidate(source_file_path): Removes the cache entry of a workbook.
+    - evict(keep_key): Removes least-recently-used entries until the cache fits its maximum size.
+    - clear(): Removes every cache entry.
+
+Functions:
+    - hash_file(file_path): Computes the sha256 hash of a file's content.
+'''
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from utils.columnar import ColumnarDataset, is_columnar, write_columnar, manifest_filename, columnar_format_version
+from utils.mapping import new_column_mapping, column_type
+
+index_filename = 'index.json'
+uncached_prefix = 'uncached-'
+
+# entries are cast with the column mappings, so a change to them or to the columnar format gives new cache keys
+schema_fingerprint = hashlib.sha256(
+    json.dumps([columnar_format_version, new_column_mapping, column_type], sort_keys=True).encode()).hexdigest()
+
+def hash_file(file_path):
+    '''
+    Compute the sha256 hash of a file's content.
+
+    :param file_path: The path of the file.
+    :return: The hexadecimal sha256 digest.
+    '''
+    digest = hashlib.sha256()
+
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+class ConversionCache:
+    def __init__(self, cache_dir, max_size_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+
+    def __read_index(self):
+        '''
+        Read the index that maps workbook paths to cache entries.
+
+        :return: The dictionary of {workbook path: {'mtime', 'size', 'schema', 'key'}}.
+        '''
+        try:
+            with open(os.path.join(self.cache_dir, index_filename)) as index_file:
+                return json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def __write_index(self, index):
+        '''
+        Write the index that maps workbook paths to cache entries.
+
+        :param index: The dictionary of {workbook path: {'mtime', 'size', 'schema', 'key'}}.
+        '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # write to a temporary file first so concurrent readers never see a partial index
+        index_path = os.path.join(self.cache_dir, index_filename)
+        temp_path = f'{index_path}.{os.getpid()}.tmp'
+
+        with open(temp_path, 'w') as index_file:
+            json.dump(index, index_file, indent=2)
+
+        os.replace(temp_path, index_path)
+
+    def __entry_path(self, key):
+        '''
+        Get the directory of a cache entry.
+
+        :param key: The content hash of the workbook.
+        :return: The path of the cache entry directory.
+        '''
+        return os.path.join(self.cache_dir, key)
+
+    def __touch(self, key):
+        '''
+        Record that a cache entry was just used so it is evicted last.
+
+        :param key: The content hash of the workbook.
+        '''
+        manifest_path = os.path.join(self.__entry_path(key), manifest_filename)
+
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        manifest['last_used'] = time.time()
+
+        with open(manifest_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    def __remove_entry(self, key):
+        '''
+        Remove a cache entry directory.
+
+        :param key: The content hash of the workbook.
+        '''
+        shutil.rmtree(self.__entry_path(key), ignore_errors=True)
+
+    def __get_entry_size(self, key):
+        '''
+        Get the total size of the files in a cache entry.
+
+        :param key: The content hash of the workbook.
+        :return: The size in bytes.
+        '''
+        entry_path = self.__entry_path(key)
+        return sum(os.path.getsize(os.path.join(entry_path, filename)) for filename in os.listdir(entry_path))
+
+    def is_entry(self, path):
+        '''
+        Check whether a path is a cache entry directory.
+
+        :param path: The path to check.
+        :return: True if the path is a cache entry directory, otherwise False.
+        '''
+        return is_columnar(path)
+
+    def __get_source_key(self, source_file_path, variant):
+        '''
+        Get the index key of a workbook conversion.
+
+        :param source_file_path: The path of the excel workbook.
+        :param variant: What was converted besides the default, e.g. the selected sheets; '' for the default.
+        :return: The absolute path of the workbook, followed by the variant if there is one.
+        '''
+        source_key = os.path.abspath(source_file_path)
+        return f'{source_key}::{variant}' if variant else source_key
+
+    def __get_key(self, source_file_path, variant):
+        '''
+        Get the cache key of a workbook conversion: the content hash of the workbook, combined with the schema
+        fingerprint and the variant.
+
+        :param source_file_path: The path of the excel workbook.
+        :param variant: What was converted besides the default, e.g. the selected sheets; '' for the default.
+        :return: The hexadecimal cache key.
+        '''
+        return hashlib.sha256(f'{hash_file(source_file_path)}::{schema_fingerprint}::{variant}'.encode()).hexdigest()
+
+    def lookup(self, source_file_path, variant=''):
+        '''
+        Find the cache entry of a workbook. The workbook is only hashed again when its mtime or size or the schema
+        fingerprint changed.
+        A stale entry left behind by a previous version of the workbook is removed.
+
+        :param source_file_path: The path of the excel workbook.
+        :param variant: What was converted besides the default, e.g. the selected sheets; '' for the default.
+        :return: The path of the cache entry, or None if the workbook has no valid entry.
+        '''
+        source_key = self.__get_source_key(source_file_path, variant)
+        stat = os.stat(source_file_path)
+
+        index = self.__read_index()
+        indexed = index.get(source_key)
+
+        if (indexed is not None and indexed['mtime'] == stat.st_mtime and indexed['size'] == stat.st_size
+                and indexed.get('schema') == schema_fingerprint and self.is_entry(self.__entry_path(indexed['key']))):
+            key = indexed['key']
+        else:
+            key = self.__get_key(source_file_path, variant)
+
+            if indexed is not None and indexed['key'] != key:
+                # the workbook content or the schema changed, so its previous entry is stale
+                self.__remove_entry(indexed['key'])
+
+            if not self.is_entry(self.__entry_path(key)):
+                index.pop(source_key, None)
+                self.__write_index(index)
+                return None
+
+            index[source_key] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'schema': schema_fingerprint,
+                                 'key': key}
+            self.__write_index(index)
+
+        self.__touch(key)
+        return self.__entry_path(key)
+
+    def store(self, source_file_path, df, variant=''):
+        '''
+        Store a converted workbook as a new cache entry.
+        Columns are renamed with the new column mapping and cast with the column type mapping before they are saved.
+        A converted workbook larger than the maximum cache size is not cached; it is moved to a temporary dataset
+        instead, which is removed when the process exits.
+
+        :param source_file_path: The path of the excel workbook.
+        :param df: The Pandas dataframe read from the excel workbook.
+        :param variant: What was converted besides the default, e.g. the selected sheets; '' for the default.
+        :return: The path of the new cache entry, or of the temporary dataset.
+        '''
+        source_key = self.__get_source_key(source_file_path, variant)
+        stat = os.stat(source_file_path)
+        key = self.__get_key(source_file_path, variant)
+
+        index = self.__read_index()
+        indexed = index.get(source_key)
+
+        if indexed is not None and indexed['key'] != key:
+            self.__remove_entry(indexed['key'])
+
+        entry_path = self.__entry_path(key)
+        self.__remove_entry(key)
+
+        write_columnar(df, entry_path, {'source': source_key, 'mtime': stat.st_mtime, 'size': stat.st_size,
+                                        'last_used': time.time()})
+        entry_size = self.__get_entry_size(key)
+
+        if entry_size > self.max_size_bytes:
+            print(f'WARNING: The conversion of {os.path.basename(source_file_path)} takes {entry_size} bytes, more '
+                  f'than the maximum cache size of {self.max_size_bytes} bytes; it is not cached.')
+
+            # renamed within the cache directory, so the files are not copied; evict() skips it
+            dataset_path = os.path.join(self.cache_dir, f'{uncached_prefix}{key}.{os.getpid()}')
+            shutil.rmtree(dataset_path, ignore_errors=True)
+            os.replace(entry_path, dataset_path)
+            atexit.register(shutil.rmtree, dataset_path, ignore_errors=True)
+
+            index.pop(source_key, None)
+            self.__write_index(index)
+            return dataset_path
+
+        index[source_key] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'schema': schema_fingerprint, 'key': key}
+        self.__write_index(index)
+
+        self.evict(keep_key=key)
+        return entry_path
+
+    def load(self, entry_path):
+        '''
+        Load a cache entry into a Pandas dataframe. The numeric columns are views of the memory-mapped files.
+
+        :param entry_path: The path of the cache entry.
+        :return: The Pandas dataframe stored in the cache entry.
+        '''
+        return ColumnarDataset(entry_path).to_dataframe()
+
+    def load_chunks(self, entry_path, chunk_size):
+        '''
+        Load a cache entry in chunks. Only the rows of the current chunk are read from the memory-mapped files.
+
+        :param entry_path: The path of the cache entry.
+        :param chunk_size: The maximum number of rows in each chunk.
+        :return: A generator of Pandas dataframes, one per chunk.
+        '''
+        return ColumnarDataset(entry_path).iter_chunks(chunk_size)
+
+    def invalidate(self, source_file_path):
+        '''
+        Remove the cache entry of a workbook.
+
+        :param source_file_path: The path of the excel workbook.
+        '''
+        index = self.__read_index()
+        indexed = index.pop(os.path.abspath(source_file_path), None)
+
+        if indexed is not None:
+            self.__remove_entry(indexed['key'])
+            self.__write_index(index)
+
+    def evict(self, keep_key=None):
+        '''
+        Remove least-recently-used cache entries until the total size fits the maximum cache size.
+
+        :param keep_key: The key of an entry that is never evicted, e.g. the entry that was just stored.
+        '''
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            if not key.startswith(uncached_prefix) and self.is_entry(self.__entry_path(key)):
+                with open(os.path.join(self.__entry_path(key), manifest_filename)) as manifest_file:
+                    last_used = json.load(manifest_file)['last_used']
+
+                entries.append((last_used, key, self.__get_entry_size(key)))
+
+        total_size = sum(size for _, _, size in entries)
+        evicted_keys = set()
+
+        for _, key, size in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+
+            if key == keep_key:
+                continue
+
+            self.__remove_entry(key)
+            evicted_keys.add(key)
+            total_size -= size
+
+        if evicted_keys:
+            index = self.__read_index()
+            self.__write_index({path: indexed for path, indexed in index.items() if indexed['key'] not in evicted_keys})
+
+    def clear(self):
+        '''
+        Remove every cache entry.
+        '''
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
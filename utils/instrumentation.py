@@ -0,0 +1,236 @@
+'''
+Description:
+    This class records the wall time, CPU time, memory and row counts of each pipeline stage, so hot spots can be
+    found on production-sized files without attaching a profiler.
+
+    Stages are wrapped in `with recorder.stage(name, rows_in) as stage:` blocks and set stage.rows_out before the
+    block ends; stages memoized by a StageGraph also set stage.cache_hit. When the recorder is disabled, stage()
+    returns one shared no-op context manager, so the only cost is a method call per stage. Peak RSS is read from
+    the resource module where it exists (it is the peak of the whole process so far); with trace_memory, the
+    tracemalloc peak of each stage is recorded as well, at the cost of slowing down allocations.
+
+    The records can be written as a JSON run record and as a Prometheus textfile for the node_exporter textfile
+    collector.
+
+Parameters:
+    enabled (bool): Whether stages are recorded.
+    trace_memory (bool): Whether the tracemalloc peak of each stage is recorded.
+
+Methods:
+    - stage(name, rows_in): Returns the context manager that records one stage.
+    - add(name, wall_seconds, cpu_seconds, rows_in, rows_out): Records a stage measured elsewhere, e.g. in a worker.
+    - extend_span(start, end): Extends the time span of the run to cover a stage.
+    - to_run_record(): Builds the run record of every recorded stage.
+    - write_json(file_path): Writes the run record to a JSON file.
+    - write_prometheus(file_path): Writes the run record to a Prometheus textfile.
+'''
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak RSS is then left out of the records
+    resource = None
+
+metric_prefix = 'equity_fund'
+
+def get_peak_rss_bytes():
+    '''
+    Get the peak resident set size of this process so far.
+
+    :return: The peak RSS in bytes, or None if the platform does not report it.
+    '''
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+class NullStage:
+    '''
+    The context manager returned by a disabled StageRecorder. It records nothing.
+    '''
+    rows_out = None
+    cache_hit = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+null_stage = NullStage()
+
+class Stage:
+    '''
+    The context manager that measures one stage and adds its record to the StageRecorder on exit.
+    '''
+    def __init__(self, recorder, name, rows_in):
+        self.recorder = recorder
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.cache_hit = None
+
+    def __enter__(self):
+        if self.recorder.trace_memory:
+            tracemalloc.reset_peak()
+
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_seconds = time.perf_counter() - self.start_wall
+        cpu_seconds = time.process_time() - self.start_cpu
+
+        record = self.recorder.add(self.name, wall_seconds, cpu_seconds, self.rows_in, self.rows_out)
+        self.recorder.extend_span(self.start_wall, self.start_wall + wall_seconds)
+
+        if self.recorder.trace_memory:
+            record['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+
+        if self.cache_hit is not None:
+            record['cache_hit'] = self.cache_hit
+
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+
+        return False
+
+class StageRecorder:
+    def __init__(self, enabled=False, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.started_at = time.time()
+        self.stages = []
+        self.span = None
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name, rows_in=None):
+        '''
+        Get the context manager that records one stage.
+
+        :param name: The name of the stage.
+        :param rows_in: The number of rows the stage reads.
+        :return: The context manager; set its rows_out attribute to the number of rows the stage produces.
+        '''
+        if not self.enabled:
+            return null_stage
+
+        return Stage(self, name, rows_in)
+
+    def add(self, name, wall_seconds, cpu_seconds, rows_in=None, rows_out=None):
+        '''
+        Record a stage measured elsewhere, e.g. a chart rendered in a worker process.
+
+        :param name: The name of the stage.
+        :param wall_seconds: The wall time of the stage.
+        :param cpu_seconds: The CPU time of the stage.
+        :param rows_in: The number of rows the stage reads.
+        :param rows_out: The number of rows the stage produces.
+        :return: The record of the stage, or None when the recorder is disabled.
+        '''
+        if not self.enabled:
+            return None
+
+        record = {'stage': name, 'wall_seconds': wall_seconds, 'cpu_seconds': cpu_seconds, 'rows_in': rows_in,
+                  'rows_out': rows_out, 'peak_rss_bytes': get_peak_rss_bytes()}
+        self.stages.append(record)
+        return record
+
+    def extend_span(self, start, end):
+        '''
+        Extend the span from the start of the first stage to the end of the last stage measured in this process.
+
+        :param start: The perf_counter() value at the start of a stage.
+        :param end: The perf_counter() value at the end of the stage.
+        '''
+        self.span = (start, end) if self.span is None else (min(self.span[0], start), max(self.span[1], end))
+
+    def to_run_record(self):
+        '''
+        Build the run record of every recorded stage.
+
+        :return: The dictionary with the run start time, the wall time from the start of the first stage to the end of
+            the last one and one record per stage.
+        '''
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started_at)),
+            'pid': os.getpid(),
+            'total_wall_seconds': self.span[1] - self.span[0] if self.span is not None else 0.0,
+            'peak_rss_bytes': get_peak_rss_bytes(),
+            'stages': self.stages
+        }
+
+    def __write_atomically(self, file_path, text):
+        '''
+        Write a file through a temporary file, so readers such as the textfile collector never see a partial file.
+
+        :param file_path: The path of the file.
+        :param text: The content of the file.
+        '''
+        file_dir = os.path.dirname(file_path)
+
+        if file_dir:
+            os.makedirs(file_dir, exist_ok=True)
+
+        temp_path = f'{file_path}.tmp'
+
+        with open(temp_path, 'w') as temp_file:
+            temp_file.write(text)
+
+        os.replace(temp_path, file_path)
+
+    def write_json(self, file_path):
+        '''
+        Write the run record to a JSON file.
+
+        :param file_path: The path of the JSON file.
+        '''
+        self.__write_atomically(file_path, json.dumps(self.to_run_record(), indent=2))
+
+    def write_prometheus(self, file_path):
+        '''
+        Write the run record to a Prometheus textfile, one gauge per measurement with the stage as a label.
+
+        :param file_path: The path of the textfile, which should end in .prom.
+        '''
+        metrics = [
+            ('stage_wall_seconds', 'wall_seconds', 'Wall time of the stage in seconds.'),
+            ('stage_cpu_seconds', 'cpu_seconds', 'CPU time of the stage in seconds.'),
+            ('stage_rows_in', 'rows_in', 'Rows read by the stage.'),
+            ('stage_rows_out', 'rows_out', 'Rows produced by the stage.'),
+            ('stage_peak_rss_bytes', 'peak_rss_bytes', 'Peak RSS of the process at the end of the stage.'),
+            ('stage_traced_peak_bytes', 'traced_peak_bytes', 'Peak memory traced by tracemalloc during the stage.')
+        ]
+
+        lines = []
+        for metric, key, description in metrics:
+            samples = [(stage['stage'], stage[key]) for stage in self.stages if stage.get(key) is not None]
+
+            if not samples:
+                continue
+
+            lines.append(f'# HELP {metric_prefix}_{metric} {description}')
+            lines.append(f'# TYPE {metric_prefix}_{metric} gauge')
+            lines.extend(f'{metric_prefix}_{metric}{{stage="{name}"}} {value}' for name, value in samples)
+
+        run_record = self.to_run_record()
+        lines.append(f'# HELP {metric_prefix}_run_wall_seconds Wall time from the first to the last stage in seconds.')
+        lines.append(f'# TYPE {metric_prefix}_run_wall_seconds gauge')
+        lines.append(f"{metric_prefix}_run_wall_seconds {run_record['total_wall_seconds']}")
+        lines.append(f'# HELP {metric_prefix}_run_start_time_seconds Start time of the run as a Unix timestamp.')
+        lines.append(f'# TYPE {metric_prefix}_run_start_time_seconds gauge')
+        lines.append(f'{metric_prefix}_run_start_time_seconds {self.started_at}')
+
+        self.__write_atomically(file_path, '\n'.join(lines) + '\n')
@@ -18,4 +18,74 @@ column_type = {
     'total_liabilities': 'int64',
     'total_revenue': 'int64',
     'profit_margin': 'float64'
-}
\ No newline at end of file
+}
+
+# compact layout: 'integer' columns are downcast to the narrowest integer width that holds every value
+compact_column_type = {
+    'business_id': 'integer',
+    'business_state': 'category',
+    'total_long_term_debt': 'integer',
+    'total_equity': 'integer',
+    'debt_to_equity': 'float64',
+    'total_liabilities': 'integer',
+    'total_revenue': 'integer',
+    'profit_margin': 'float64'
+}
+
+# the values business_state can take; 'Washington D.C.' is spelled the way the source data spells it
+state_names = [
+    'Alabama', 'Alaska', 'Arizona', 'Arkansas', 'California', 'Colorado', 'Connecticut', 'Delaware', 'Florida',
+    'Georgia', 'Hawaii', 'Idaho', 'Illinois', 'Indiana', 'Iowa', 'Kansas', 'Kentucky', 'Louisiana', 'Maine',
+    'Maryland', 'Massachusetts', 'Michigan', 'Minnesota', 'Mississippi', 'Missouri', 'Montana', 'Nebraska', 'Nevada',
+    'New Hampshire', 'New Jersey', 'New Mexico', 'New York', 'North Carolina', 'North Dakota', 'Ohio', 'Oklahoma',
+    'Oregon', 'Pennsylvania', 'Rhode Island', 'South Carolina', 'South Dakota', 'Tennessee', 'Texas', 'Utah',
+    'Vermont', 'Virginia', 'Washington', 'Washington D.C.', 'West Virginia', 'Wisconsin', 'Wyoming'
+]
+
+# checks made by utils/validation.py before the columns are cast; a row that fails any check is quarantined:
+# - required: null and blank values fail; integer columns are always required, as int64 cannot hold nulls
+# - min / max: the smallest and largest valid values
+# - allowed: the valid values of a text column
+column_constraints = {
+    'business_id': {'required': True, 'min': 1},
+    'business_state': {'required': True, 'allowed': state_names},
+    'total_long_term_debt': {'required': True, 'min': 0},
+    'total_equity': {'required': True},
+    'debt_to_equity': {},
+    'total_liabilities': {'required': True, 'min': 0},
+    'total_revenue': {'required': True, 'min': 0},
+    'profit_margin': {'max': 1}
+}
+
+# ratios attached to every row by utils/ratios.py, computed in one pass over the columns:
+# - numerator / denominator: columns that are added up; without a denominator the numerator is returned as it is
+# - weight: a column the numerator is multiplied by
+# - zero_denominator: 'nan' or 'raise'; negative_denominator: 'keep', 'nan' or 'raise'
+ratio_definitions = [
+    {'name': 'debt_to_income_ratio', 'numerator': ['total_long_term_debt'], 'denominator': ['total_revenue']},
+    {'name': 'liabilities_to_equity', 'numerator': ['total_liabilities'], 'denominator': ['total_equity'],
+     'negative_denominator': 'nan'},
+    {'name': 'debt_to_liabilities', 'numerator': ['total_long_term_debt'], 'denominator': ['total_liabilities']},
+    {'name': 'equity_multiplier', 'numerator': ['total_liabilities', 'total_equity'], 'denominator': ['total_equity'],
+     'negative_denominator': 'nan'},
+    {'name': 'net_profit', 'numerator': ['total_revenue'], 'weight': 'profit_margin'}
+]
+
+# ratios of per-state sums, computed from the state cube
+state_ratio_definitions = [
+    {'name': 'revenue_weighted_margin', 'numerator': ['net_profit'], 'denominator': ['total_revenue']}
+]
+
+# screens evaluated together by utils/screening.py; each rule flags the rows where
+# - column <operator> value, e.g. debt_to_equity < 0
+# - column <operator> multiplier * other_column, e.g. total_liabilities > 3 * total_revenue
+# - |z-score of column within its group_by group| > value, when the operator is 'abs_zscore_above'
+screening_rules = [
+    {'name': 'negative_debt_to_equity', 'column': 'debt_to_equity', 'operator': '<', 'value': 0},
+    {'name': 'negative_equity', 'column': 'total_equity', 'operator': '<', 'value': 0},
+    {'name': 'low_profit_margin', 'column': 'profit_margin', 'operator': '<', 'value': 0.05},
+    {'name': 'liabilities_above_3x_revenue', 'column': 'total_liabilities', 'operator': '>',
+     'other_column': 'total_revenue', 'multiplier': 3},
+    {'name': 'revenue_outlier_in_state', 'column': 'total_revenue', 'operator': 'abs_zscore_above', 'value': 3,
+     'group_by': 'business_state'}
+]
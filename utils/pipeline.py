@@ -0,0 +1,301 @@
+'''
+Description:
+    This class runs pipeline stages as a small dependency graph and memoizes their outputs.
+
+    Every stage has a fingerprint: the sha256 hash of its name, its parameters, the source code of the modules that
+    implement it, the graph version and the fingerprints of the stages it depends on. The modules of the code a stage
+    runs are followed through their imports, so every project module that code imports, directly or through other
+    project modules, is part of the fingerprint and helpers never have to be listed by hand. The fingerprint of a
+    source stage is given by its parameters, e.g. the content hash of the data file. A stage is only executed when no
+    checkpoint with its fingerprint exists, and its dependencies are only computed or loaded when it is executed,
+    so a run after a change that only affects the charts loads the final tables and nothing upstream of them.
+
+Parameters:
+    checkpoint_cache (CheckpointCache): The on-disk cache of stage outputs, or None to only memoize within a run.
+    recorder (StageRecorder): Records the time and row counts of each stage, with whether it was loaded from cache.
+    version (str): The version of the graph; bumping it invalidates every checkpoint.
+
+Methods:
+    - add(name, func, dependencies, params, code): Adds a stage to the graph.
+    - fingerprint(name): Computes the fingerprint of a stage.
+    - get(name): Gets the output of a stage, loading or executing it and its dependencies as needed.
+    - release(name): Drops the in-memory output of a stage.
+    - plan(names): Lists which stages would be loaded from a checkpoint and which would be executed.
+
+Functions:
+    - count_rows(value): Counts the rows of a stage output.
+    - get_project_file(source_file): Checks whether a source file belongs to the project.
+    - find_module_file(name): Finds the source file of a module by name, without importing it.
+    - is_local(func): Checks whether a function is a lambda or a local function.
+    - find_project_modules(source_file): Finds a project source file and the project modules it imports.
+'''
+
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import time
+
+import pandas as pd
+
+from utils.instrumentation import StageRecorder
+
+# modules under this directory, except installed packages, are project modules
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def count_rows(value):
+    '''
+    Count the rows of a stage output: a dataframe, or a tuple whose first item is a dataframe.
+
+    :param value: The output of a stage.
+    :return: The number of rows, or None if the output is not a dataframe.
+    '''
+    if isinstance(value, tuple) and value:
+        value = value[0]
+
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None
+
+def get_project_file(source_file):
+    '''
+    Check whether a source file belongs to the project.
+
+    :param source_file: The path of the source file, or None.
+    :return: The absolute path of the source file, or None if it is not a Python file of the project.
+    '''
+    if source_file is None or not source_file.endswith('.py'):
+        return None
+
+    source_file = os.path.abspath(source_file)
+
+    if not source_file.startswith(project_dir + os.sep) or 'site-packages' in source_file:
+        return None
+
+    return source_file
+
+def find_module_file(name):
+    '''
+    Find the source file of a module by name, without importing it.
+
+    :param name: The dotted name of the module, e.g. 'utils.topn'.
+    :return: The absolute path of the module source, or None if the name is not a project module.
+    '''
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        # e.g. 'analyzer.Analyzer' from 'from analyzer import Analyzer', which names a class, not a module
+        return None
+
+    return get_project_file(spec.origin) if spec is not None else None
+
+def is_local(func):
+    '''
+    Check whether a function is a lambda or a function defined inside another function.
+
+    :param func: The function.
+    :return: True if the function is a lambda or a local function, otherwise False.
+    '''
+    return '<' in getattr(func, '__qualname__', '')
+
+def find_project_modules(source_file):
+    '''
+    Find a project source file and every project module it imports, directly or through other project modules.
+    Imports are read from the import statements of the source, including those inside functions, so modules that
+    only hold data such as utils/mapping.py are found too.
+
+    :param source_file: The path of the source file.
+    :return: The sorted list of absolute source file paths; empty if the file is not a project file.
+    '''
+    source_files = set()
+    pending = [get_project_file(source_file)]
+
+    while pending:
+        source_file = pending.pop()
+
+        if source_file is None or source_file in source_files:
+            continue
+
+        source_files.add(source_file)
+
+        with open(source_file, 'rb') as module_file:
+            tree = ast.parse(module_file.read())
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(find_module_file(alias.name) for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                # the imported names can be submodules, e.g. 'from utils import topn'
+                pending.append(find_module_file(node.module))
+                pending.extend(find_module_file(f'{node.module}.{alias.name}') for alias in node.names)
+
+    return sorted(source_files)
+
+class StageGraph:
+    def __init__(self, checkpoint_cache=None, recorder=None, version='1'):
+        self.checkpoint_cache = checkpoint_cache
+        self.recorder = recorder if recorder is not None else StageRecorder()
+        self.version = version
+        self.stages = {}
+        self.values = {}
+        self.fingerprints = {}
+        self.source_hashes = {}
+
+    def add(self, name, func, dependencies=(), params=None, code=()):
+        '''
+        Add a stage to the graph. The outputs of the dependencies are passed to func in order.
+
+        :param name: The name of the stage.
+        :param func: The function that computes the output of the stage.
+        :param dependencies: The names of the stages whose outputs func receives.
+        :param params: The JSON-serializable parameters that change the output, e.g. the schema.
+        :param code: The functions or classes the stage runs; the source of their modules and of the project modules
+            these import is part of the fingerprint, as they are for func. A lambda or local function only wires the
+            stage to the listed code, so only its own module is hashed.
+        '''
+        for dependency in dependencies:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'.")
+
+        self.stages[name] = {'func': func, 'dependencies': list(dependencies), 'params': params or {},
+                             'code': list(code)}
+
+    def __hash_file(self, source_file):
+        '''
+        Hash a source file once per graph.
+
+        :param source_file: The path of the source file.
+        :return: The sha256 digest of the file.
+        '''
+        if source_file not in self.source_hashes:
+            with open(source_file, 'rb') as module_file:
+                self.source_hashes[source_file] = hashlib.sha256(module_file.read()).hexdigest()
+
+        return self.source_hashes[source_file]
+
+    def __hash_source(self, obj, follow_imports=True):
+        '''
+        Hash the source code of the module that defines a function or class and, if asked, of the project modules
+        it imports.
+
+        :param obj: The function or class.
+        :param follow_imports: Whether to hash the project modules the module imports as well.
+        :return: The set of sha256 digests of the module sources, or of the qualified name if the source is not
+            available.
+        '''
+        try:
+            source_file = inspect.getsourcefile(inspect.unwrap(obj))
+        except TypeError:
+            source_file = None
+
+        if source_file is None:
+            return {getattr(obj, '__qualname__', repr(obj))}
+
+        if follow_imports and get_project_file(source_file) is not None:
+            return {self.__hash_file(module_file) for module_file in find_project_modules(source_file)}
+
+        return {self.__hash_file(source_file)}
+
+    def fingerprint(self, name):
+        '''
+        Compute the fingerprint of a stage from its parameters, code and the fingerprints of its dependencies.
+
+        :param name: The name of the stage.
+        :return: The hexadecimal sha256 fingerprint.
+        '''
+        if name not in self.fingerprints:
+            stage = self.stages[name]
+            description = {
+                'stage': name,
+                'version': self.version,
+                'params': stage['params'],
+                'code': sorted(set.union(self.__hash_source(stage['func'], follow_imports=not is_local(stage['func'])),
+                                         *(self.__hash_source(obj) for obj in stage['code']))),
+                'dependencies': [self.fingerprint(dependency) for dependency in stage['dependencies']]
+            }
+
+            encoded = json.dumps(description, sort_keys=True, default=str).encode()
+            self.fingerprints[name] = hashlib.sha256(encoded).hexdigest()
+
+        return self.fingerprints[name]
+
+    def get(self, name):
+        '''
+        Get the output of a stage. The output is taken from memory, else from a checkpoint, else computed from the
+        outputs of its dependencies, which are resolved the same way.
+
+        :param name: The name of the stage.
+        :return: The output of the stage.
+        '''
+        if name in self.values:
+            return self.values[name]
+
+        stage = self.stages[name]
+        key = self.fingerprint(name)
+
+        if self.checkpoint_cache is not None:
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            found, value = self.checkpoint_cache.load(key)
+
+            if found:
+                # a miss is not recorded; the stage is recorded once it has been executed
+                end_wall = time.perf_counter()
+                record = self.recorder.add(name, end_wall - start_wall, time.process_time() - start_cpu,
+                                           rows_out=count_rows(value))
+
+                if record is not None:
+                    record['cache_hit'] = True
+                    self.recorder.extend_span(start_wall, end_wall)
+
+                self.values[name] = value
+                return value
+
+        inputs = [self.get(dependency) for dependency in stage['dependencies']]
+
+        with self.recorder.stage(name, count_rows(inputs[0]) if inputs else None) as recorded_stage:
+            value = stage['func'](*inputs)
+            recorded_stage.cache_hit = False
+            recorded_stage.rows_out = count_rows(value)
+
+        if self.checkpoint_cache is not None:
+            self.checkpoint_cache.store(key, name, value)
+
+        self.values[name] = value
+        return value
+
+    def release(self, name):
+        '''
+        Drop the in-memory output of a stage, e.g. the raw data once the cleaned data exists.
+        A later get() loads or computes it again.
+
+        :param name: The name of the stage.
+        '''
+        self.values.pop(name, None)
+
+    def plan(self, names):
+        '''
+        List which stages would be loaded from a checkpoint and which would be executed to get some outputs.
+
+        :param names: The names of the stages whose outputs are needed.
+        :return: The Pandas dataframe with the fingerprint and action ('cached' or 'execute') of each needed stage.
+        '''
+        cached_keys = set() if self.checkpoint_cache is None else set(self.checkpoint_cache.list_entries().index)
+        actions = {}
+
+        def visit(name):
+            if name in actions:
+                return
+
+            if self.fingerprint(name) in cached_keys:
+                actions[name] = 'cached'
+                return
+
+            actions[name] = 'execute'
+            for dependency in self.stages[name]['dependencies']:
+                visit(dependency)
+
+        for name in names:
+            visit(name)
+
+        return pd.DataFrame({'fingerprint': [self.fingerprint(name) for name in actions],
+                             'action': list(actions.values())}, index=pd.Index(list(actions), name='stage'))
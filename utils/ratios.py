@@ -0,0 +1,119 @@
+'''
+Description:
+    Helper functions that compute many ratios from a declarative list of ratio definitions (see ratio_definitions
+    in utils/mapping.py) in one batched NumPy pass.
+
+    Every column is converted to a contiguous float64 array once, however many ratios read it, and every ratio is
+    written into one preallocated (ratios x rows) array, which becomes the columnar block returned as a dataframe
+    without another copy. Zero denominators never produce infinities: they give NaN or raise, and negative
+    denominators are kept, turned into NaN or raise, as each definition says. The number of rows each policy
+    applied to is returned with the block.
+
+Functions:
+    - validate_definitions(df, definitions): Checks that ratio definitions are complete and their columns exist.
+    - compute_ratios(df, definitions): Computes every ratio into one columnar block.
+'''
+
+import numpy as np
+import pandas as pd
+
+from utils.mapping import ratio_definitions
+
+zero_denominator_policies = ['nan', 'raise']
+negative_denominator_policies = ['keep', 'nan', 'raise']
+
+def validate_definitions(df, definitions=ratio_definitions):
+    '''
+    Check that ratio definitions are complete, use known policies and only read columns of the dataframe.
+
+    :param df: The Pandas dataframe the ratios are computed from.
+    :param definitions: The list of ratio definitions.
+    :raises ValueError: If a definition is incomplete, uses an unknown policy or reads a missing column.
+    '''
+    for definition in definitions:
+        if not definition.get('name') or not definition.get('numerator'):
+            raise ValueError(f'Ratio definition {definition} needs a name and a numerator.')
+
+        if definition.get('zero_denominator', 'nan') not in zero_denominator_policies:
+            raise ValueError(f"Unknown zero_denominator policy in ratio '{definition['name']}'.")
+
+        if definition.get('negative_denominator', 'keep') not in negative_denominator_policies:
+            raise ValueError(f"Unknown negative_denominator policy in ratio '{definition['name']}'.")
+
+        columns = [*definition['numerator'], *definition.get('denominator', [])]
+        if definition.get('weight'):
+            columns.append(definition['weight'])
+
+        missing_columns = [column for column in columns if column not in df.columns]
+
+        if missing_columns:
+            raise ValueError(f"Ratio '{definition['name']}' reads missing columns {missing_columns}.")
+
+def compute_ratios(df, definitions=ratio_definitions):
+    '''
+    Compute every ratio of a list of definitions in one pass into a preallocated columnar block.
+
+    :param df: The Pandas dataframe the ratios are computed from.
+    :param definitions: The list of ratio definitions.
+    :returns:
+     - The Pandas dataframe with one float64 column per ratio and the index of df.
+     - The Pandas dataframe with the number of zero and negative denominators of each ratio.
+    :raises ValueError: If a definition is invalid, or a denominator is zero or negative where the policy is 'raise'.
+    '''
+    validate_definitions(df, definitions)
+
+    row_count = len(df)
+    arrays = {}
+
+    def get_array(column):
+        # convert each column once, however many ratios read it
+        if column not in arrays:
+            arrays[column] = np.ascontiguousarray(df[column].to_numpy(dtype='float64', na_value=np.nan))
+
+        return arrays[column]
+
+    def add_columns(columns, out):
+        np.copyto(out, get_array(columns[0]))
+
+        for column in columns[1:]:
+            np.add(out, get_array(column), out=out)
+
+        return out
+
+    # each row of the block is one ratio, which is the layout pandas keeps for a float64 column block
+    block = np.empty((len(definitions), row_count), dtype='float64')
+    denominator = np.empty(row_count, dtype='float64')
+    issues = {}
+
+    for position, definition in enumerate(definitions):
+        name = definition['name']
+        result = add_columns(definition['numerator'], block[position])
+
+        if definition.get('weight'):
+            np.multiply(result, get_array(definition['weight']), out=result)
+
+        if not definition.get('denominator'):
+            issues[name] = {'zero_denominators': 0, 'negative_denominators': 0}
+            continue
+
+        add_columns(definition['denominator'], denominator)
+        is_zero = denominator == 0
+        is_negative = denominator < 0
+        issues[name] = {'zero_denominators': int(is_zero.sum()), 'negative_denominators': int(is_negative.sum())}
+
+        if definition.get('zero_denominator', 'nan') == 'raise' and issues[name]['zero_denominators'] > 0:
+            raise ValueError(f"Ratio '{name}' has {issues[name]['zero_denominators']} zero denominators.")
+
+        negative_denominator = definition.get('negative_denominator', 'keep')
+        if negative_denominator == 'raise' and issues[name]['negative_denominators'] > 0:
+            raise ValueError(f"Ratio '{name}' has {issues[name]['negative_denominators']} negative denominators.")
+
+        is_invalid = is_zero | is_negative if negative_denominator == 'nan' else is_zero
+
+        np.divide(result, denominator, out=result, where=~is_invalid)
+        result[is_invalid] = np.nan
+
+    ratios_df = pd.DataFrame(block.T, index=df.index, columns=[definition['name'] for definition in definitions],
+                             copy=False)
+    issues_df = pd.DataFrame.from_dict(issues, orient='index', columns=['zero_denominators', 'negative_denominators'])
+    return ratios_df, issues_df
@@ -0,0 +1,119 @@
+'''
+Description:
+    Helper functions that cast dataframe columns to the column types in utils/mapping.py.
+
+    Besides regular NumPy/Pandas dtypes, a schema can use the 'integer' type, which downcasts a column to the
+    narrowest signed integer width that holds every value. Values are checked before casting, so a column never
+    silently overflows or turns null values into garbage.
+
+Functions:
+    - get_narrowest_integer_dtype(min_value, max_value): Finds the narrowest signed integer dtype for a value range.
+    - downcast_integer(series): Casts a column to the narrowest safe signed integer dtype.
+    - cast_column(series, target_type): Casts a column to a schema type.
+    - apply_schema(df, schema): Casts every column of a dataframe that is in the schema.
+    - get_read_dtypes(schema): Builds the dtypes used by pd.read_csv for a schema.
+'''
+
+import numpy as np
+
+from utils.mapping import new_column_mapping
+
+integer_dtypes = ['int8', 'int16', 'int32', 'int64']
+
+def get_narrowest_integer_dtype(min_value, max_value):
+    '''
+    Find the narrowest signed integer dtype that holds a range of values.
+
+    :param min_value: The smallest value of the range.
+    :param max_value: The largest value of the range.
+    :return: The name of the narrowest signed integer dtype.
+    :raises OverflowError: If the range does not fit in int64.
+    '''
+    for dtype in integer_dtypes:
+        info = np.iinfo(dtype)
+
+        if info.min <= min_value and max_value <= info.max:
+            return dtype
+
+    raise OverflowError(f'Values between {min_value} and {max_value} do not fit in int64')
+
+def downcast_integer(series):
+    '''
+    Cast a column to the narrowest signed integer dtype that holds every value.
+    Float values are truncated toward zero, like astype('int64').
+
+    :param series: The Pandas series to cast.
+    :return: The cast Pandas series.
+    :raises ValueError: If the column has null or non-numeric values.
+    :raises OverflowError: If a value does not fit in int64.
+    '''
+    values = series.to_numpy()
+
+    if values.dtype.kind not in 'iuf':
+        raise ValueError(f'Column {series.name} is not numeric ({values.dtype})')
+
+    if len(values) == 0:
+        return series.astype('int8')
+
+    if values.dtype.kind == 'f':
+        if not np.isfinite(values).all():
+            raise ValueError(f'Column {series.name} has null or infinite values')
+
+        # 2**63 is exactly representable as a float, so anything at or above it overflows int64
+        if values.min() < -2.0 ** 63 or values.max() >= 2.0 ** 63:
+            raise OverflowError(f'Column {series.name} has values that do not fit in int64')
+
+        min_value, max_value = int(np.trunc(values.min())), int(np.trunc(values.max()))
+    else:
+        min_value, max_value = int(values.min()), int(values.max())
+
+    dtype = get_narrowest_integer_dtype(min_value, max_value)
+
+    if series.dtype == dtype:
+        return series
+
+    return series.astype(dtype)
+
+def cast_column(series, target_type):
+    '''
+    Cast a column to a schema type. The column is returned unchanged if it already has that type.
+
+    :param series: The Pandas series to cast.
+    :param target_type: The schema type, e.g. 'int64', 'category' or 'integer'.
+    :return: The cast Pandas series.
+    '''
+    if target_type == 'integer':
+        return downcast_integer(series)
+
+    if series.dtype == target_type:
+        return series
+
+    return series.astype(target_type)
+
+def apply_schema(df, schema):
+    '''
+    Cast every column of a dataframe that is in the schema. Columns are replaced in place one at a time.
+
+    :param df: The Pandas dataframe with column names in standardized format.
+    :param schema: The dictionary of {column name: schema type}.
+    '''
+    for column in df.columns:
+        if column in schema.keys():
+            series = df[column]
+            cast_series = cast_column(series, schema[column])
+
+            if cast_series is not series:
+                df[column] = cast_series
+
+def get_read_dtypes(schema):
+    '''
+    Build the dtypes passed to pd.read_csv for a schema, keyed by source column name, so columns are parsed straight
+    into their final type. 'integer' columns are parsed as float64 because the source stores them as '123.0'.
+
+    :param schema: The dictionary of {column name: schema type}.
+    :return: The dictionary of {source column name: dtype}.
+    '''
+    source_columns = {column: source_column for source_column, column in new_column_mapping.items()}
+
+    return {source_columns[column]: 'float64' if target_type == 'integer' else target_type
+            for column, target_type in schema.items() if column in source_columns}
@@ -0,0 +1,221 @@
+'''
+Description:
+    This class evaluates the screening rules in utils/mapping.py (or any list of rules declared the same way) over a
+    dataframe in one vectorized pass and keeps the result as a bitmask with one bit per rule, instead of one boolean
+    mask or one filtered dataframe per screen.
+
+    Each rule is evaluated on the column arrays into one reused boolean buffer and OR-ed into its bit, so evaluating
+    dozens of rules over millions of rows allocates one small integer per row. The per-rule counts come from
+    unpacking the bitmask bytes once. Matching rows are returned as row positions, which select the rows of the
+    screened dataframe without copying it; rows are only copied when get_rows() is asked for them.
+
+Parameters:
+    df (DataFrame): The screened Pandas dataframe.
+    rules (list): The screening rules, at most 64.
+
+Methods:
+    - get_counts(): Counts the rows flagged by each rule.
+    - get_positions(rule_names, match): Gets the positions of the rows flagged by some rules.
+    - get_rows(rule_names, match): Gets the rows flagged by some rules.
+    - get_flags(): Gets one boolean column per rule for the rows flagged by any rule.
+
+Functions:
+    - validate_rules(df, rules): Checks that screening rules are complete and their columns exist.
+    - compute_group_zscores(values, groups): Computes the z-score of every value within its group.
+    - evaluate_rules(df, rules): Evaluates screening rules into a bitmask.
+'''
+
+import numpy as np
+import pandas as pd
+
+from utils.mapping import screening_rules
+
+comparison_operators = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+                        '==': np.equal, '!=': np.not_equal}
+bitmask_dtypes = ['uint8', 'uint16', 'uint32', 'uint64']
+
+def validate_rules(df, rules):
+    '''
+    Check that screening rules are complete, use known operators and only read columns of the dataframe.
+
+    :param df: The Pandas dataframe to screen.
+    :param rules: The list of screening rules.
+    :raises ValueError: If a rule is incomplete, uses an unknown operator or reads a missing column, if two rules
+        share a name or if there are more than 64 rules.
+    '''
+    if len(rules) > 64:
+        raise ValueError(f'{len(rules)} screening rules do not fit in a 64-bit mask.')
+
+    names = [rule.get('name') for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError(f'Screening rule names must be unique: {names}.')
+
+    for rule in rules:
+        if not rule.get('name') or not rule.get('column'):
+            raise ValueError(f'Screening rule {rule} needs a name and a column.')
+
+        if rule.get('operator') == 'abs_zscore_above':
+            columns = [rule['column'], rule.get('group_by')]
+        elif rule.get('operator') in comparison_operators:
+            columns = [rule['column']] + ([rule['other_column']] if 'other_column' in rule else [])
+        else:
+            raise ValueError(f"Unknown operator {rule.get('operator')!r} in screening rule '{rule['name']}'.")
+
+        if 'value' not in rule and 'other_column' not in rule:
+            raise ValueError(f"Screening rule '{rule['name']}' needs a value or another column.")
+
+        missing_columns = [column for column in columns if column not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Screening rule '{rule['name']}' reads missing columns {missing_columns}.")
+
+def compute_group_zscores(values, groups):
+    '''
+    Compute the z-score of every value within its group, with the sample standard deviation as in Pandas.
+    Values in a group with a single value, a zero standard deviation or a null group get NaN.
+
+    :param values: The NumPy array of values.
+    :param groups: The array of group labels, one per value.
+    :return: The NumPy float64 array of z-scores.
+    '''
+    codes, uniques = pd.factorize(groups)
+    values = np.asarray(values, dtype='float64')
+
+    # null values and null groups do not count towards the group statistics
+    is_valid = (codes >= 0) & ~np.isnan(values)
+    valid_codes = np.where(is_valid, codes, len(uniques))
+
+    counts = np.bincount(valid_codes, minlength=len(uniques) + 1)
+    sums = np.bincount(valid_codes, weights=np.where(is_valid, values, 0), minlength=len(uniques) + 1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        deviations = values - means[valid_codes]
+        variances = (np.bincount(valid_codes, weights=np.where(is_valid, deviations ** 2, 0),
+                                 minlength=len(uniques) + 1) / (counts - 1))
+        standard_deviations = np.sqrt(variances)
+        standard_deviations[standard_deviations == 0] = np.nan
+
+        zscores = deviations / standard_deviations[valid_codes]
+
+    zscores[~is_valid] = np.nan
+    return zscores
+
+def evaluate_rules(df, rules=screening_rules):
+    '''
+    Evaluate screening rules into a bitmask: bit i of a row is set when rule i flags the row.
+    Comparisons with null values never flag a row.
+
+    :param df: The Pandas dataframe to screen.
+    :param rules: The list of screening rules.
+    :return: The NumPy array of one unsigned integer per row, as narrow as the number of rules allows.
+    '''
+    validate_rules(df, rules)
+
+    bitmask_dtype = next(dtype for dtype in bitmask_dtypes if np.dtype(dtype).itemsize * 8 >= len(rules))
+    bitmask = np.zeros(len(df), dtype=bitmask_dtype)
+    is_flagged = np.empty(len(df), dtype='bool')
+    bit = np.empty(len(df), dtype=bitmask_dtype)
+
+    for position, rule in enumerate(rules):
+        values = df[rule['column']].to_numpy(dtype='float64', na_value=np.nan)
+
+        if rule['operator'] == 'abs_zscore_above':
+            np.greater(np.abs(compute_group_zscores(values, df[rule['group_by']].to_numpy())), rule['value'],
+                       out=is_flagged)
+        else:
+            if 'other_column' in rule:
+                threshold = (df[rule['other_column']].to_numpy(dtype='float64', na_value=np.nan)
+                             * rule.get('multiplier', 1))
+            else:
+                threshold = rule['value']
+
+            comparison_operators[rule['operator']](values, threshold, out=is_flagged)
+
+        # NaN compares as False, except with !=
+        if rule['operator'] == '!=':
+            is_flagged &= ~np.isnan(values)
+
+        np.copyto(bit, is_flagged)
+        bit <<= position
+        bitmask |= bit
+
+    return bitmask
+
+class ScreeningResult:
+    def __init__(self, df, rules=screening_rules):
+        self.df = df
+        self.rules = list(rules)
+        self.rule_names = [rule['name'] for rule in self.rules]
+        self.bitmask = evaluate_rules(df, self.rules)
+
+    def __get_rule_bits(self, rule_names):
+        '''
+        Build the bitmask of some rules.
+
+        :param rule_names: The rule names, or None for every rule.
+        :return: The bitmask with the bits of the rules set.
+        :raises KeyError: If a rule name is unknown.
+        '''
+        if rule_names is None:
+            rule_names = self.rule_names
+        elif isinstance(rule_names, str):
+            rule_names = [rule_names]
+
+        bits = 0
+        for name in rule_names:
+            if name not in self.rule_names:
+                raise KeyError(f'Unknown screening rule {name!r}.')
+
+            bits |= 1 << self.rule_names.index(name)
+
+        return self.bitmask.dtype.type(bits)
+
+    def get_counts(self):
+        '''
+        Count the rows flagged by each rule, by unpacking the bits of every row once.
+
+        :return: The Pandas series of counts, indexed by rule name.
+        '''
+        # the explicit row width keeps the reshape valid when there are no rows
+        row_bytes = self.bitmask.view('uint8').reshape(len(self.bitmask), self.bitmask.dtype.itemsize)
+        bits = np.unpackbits(row_bytes, axis=1, bitorder='little')
+
+        # the bytes of each integer are little-endian on the platforms NumPy supports here
+        counts = bits.sum(axis=0, dtype='int64')[:len(self.rules)]
+        return pd.Series(counts, index=pd.Index(self.rule_names, name='rule'), name='cnt_of_rows')
+
+    def get_positions(self, rule_names=None, match='any'):
+        '''
+        Get the positions of the rows flagged by some rules. The positions select rows of the screened dataframe
+        without copying it, e.g. with df.iloc or on its column arrays.
+
+        :param rule_names: A rule name, a list of rule names, or None for every rule.
+        :param match: 'any' for rows flagged by at least one of the rules, 'all' for rows flagged by all of them.
+        :return: The NumPy array of row positions.
+        '''
+        bits = self.__get_rule_bits(rule_names)
+        selected = self.bitmask & bits
+
+        return np.flatnonzero(selected == bits if match == 'all' else selected != 0)
+
+    def get_rows(self, rule_names=None, match='any'):
+        '''
+        Get the rows flagged by some rules.
+
+        :param rule_names: A rule name, a list of rule names, or None for every rule.
+        :param match: 'any' for rows flagged by at least one of the rules, 'all' for rows flagged by all of them.
+        :return: The Pandas dataframe of the flagged rows.
+        '''
+        return self.df.iloc[self.get_positions(rule_names, match)]
+
+    def get_flags(self):
+        '''
+        Get one boolean column per rule for the rows flagged by any rule.
+
+        :return: The Pandas dataframe indexed like the screened dataframe, with one column per rule.
+        '''
+        positions = self.get_positions()
+        bitmask = self.bitmask[positions]
+
+        return pd.DataFrame({name: (bitmask >> position) & 1 == 1 for position, name in enumerate(self.rule_names)},
+                            index=self.df.index[positions])
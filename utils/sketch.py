@@ -0,0 +1,180 @@
+'''
+Description:
+    This class implements a mergeable quantile sketch (a simplified KLL sketch) used to estimate the median of a
+    column without keeping every value in memory.
+
+    Values are stored in a stack of compactors. Level h holds items that each represent 2**h original values.
+    When a level overflows, it is sorted and every other item is promoted to the next level. As long as fewer
+    than 'capacity' values have been seen, every value stays on level 0 and quantiles are exact.
+
+    Compacting level h moves the rank of any value by at most 2**h, so the sketch adds up these amounts into a
+    deterministic bound on the rank error of its estimates.
+
+Parameters:
+    capacity (int): The maximum number of items kept on the top level. Larger values give more accurate estimates.
+
+Methods:
+    - update(values): Adds an array of values to the sketch.
+    - merge(other): Merges another sketch into this sketch.
+    - quantile(q): Estimates the q-th quantile of all values seen so far.
+    - median(): Estimates the median of all values seen so far.
+    - get_rank_error(): Gets the bound on the rank error of the estimates, as a fraction of the values seen.
+    - to_dict(): Serializes the sketch into a dictionary.
+    - from_dict(state): Rebuilds a sketch from a dictionary created by to_dict().
+'''
+
+import numpy as np
+
+class QuantileSketch:
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.count = 0
+        self.compactors = [np.empty(0, dtype='float64')]
+        self.rank_error = 0
+        self.__is_odd_pass = False
+
+    def __level_capacity(self, level):
+        '''
+        Get the capacity of a compactor level. Lower levels get geometrically smaller capacities.
+
+        :param level: The compactor level.
+        :return: The maximum number of items the level can hold before it is compacted.
+        '''
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.capacity * (2 / 3) ** depth)))
+
+    def __compress(self):
+        '''
+        Compact every level that holds more items than its capacity.
+        '''
+        level = 0
+
+        while level < len(self.compactors):
+            items = self.compactors[level]
+
+            if len(items) > self.__level_capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0, dtype='float64'))
+
+                items = np.sort(items)
+
+                # keep the last item when the count is odd so no weight is lost
+                keep = items[-1:] if len(items) % 2 == 1 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+
+                # alternate between the even and odd items to avoid a systematic bias
+                self.__is_odd_pass = not self.__is_odd_pass
+                promoted = pairs[1::2] if self.__is_odd_pass else pairs[0::2]
+
+                self.compactors[level] = keep
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+                self.rank_error += 2 ** level
+
+            level += 1
+
+    def update(self, values):
+        '''
+        Add an array of values to the sketch. Null values are ignored.
+
+        :param values: The array of values to add.
+        '''
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self.__compress()
+
+    def merge(self, other):
+        '''
+        Merge another sketch into this sketch.
+
+        :param other: The QuantileSketch to merge.
+        '''
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0, dtype='float64'))
+
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+
+        self.count += other.count
+        self.rank_error += other.rank_error
+        self.__compress()
+
+    def quantile(self, q):
+        '''
+        Estimate the q-th quantile of all values seen so far.
+        The result is exact (with linear interpolation, like pandas) while no compaction has happened yet.
+
+        :param q: The quantile to estimate, between 0 and 1.
+        :return: The estimated quantile, or NaN if the sketch is empty.
+        '''
+        if self.count == 0:
+            return np.nan
+
+        if len(self.compactors) == 1:
+            return float(np.quantile(self.compactors[0], q))
+
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(level_items), 2 ** level, dtype='float64')
+                                  for level, level_items in enumerate(self.compactors)])
+
+        order = np.argsort(items, kind='stable')
+        items = items[order]
+        cum_weights = np.cumsum(weights[order])
+
+        position = np.searchsorted(cum_weights, q * cum_weights[-1], side='left')
+        return float(items[min(position, len(items) - 1)])
+
+    def median(self):
+        '''
+        Estimate the median of all values seen so far.
+
+        :return: The estimated median.
+        '''
+        return self.quantile(0.5)
+
+    def get_rank_error(self):
+        '''
+        Get the bound on the rank error of the estimates: the rank of an estimated quantile q among all values seen
+        so far is within q plus or minus this fraction. Besides the compactions, an estimate is one stored item, which
+        can stand for as many values as the weight of the top level.
+
+        :return: The bound as a fraction of the values seen, 0 while the estimates are exact.
+        '''
+        if self.count == 0 or len(self.compactors) == 1:
+            return 0.0
+
+        return (self.rank_error + 2 ** (len(self.compactors) - 1)) / self.count
+
+    def to_dict(self):
+        '''
+        Serialize the sketch into a dictionary of plain Python values.
+
+        :return: The dictionary that represents the sketch.
+        '''
+        return {
+            'capacity': self.capacity,
+            'count': self.count,
+            'rank_error': self.rank_error,
+            'compactors': [items.tolist() for items in self.compactors]
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        '''
+        Rebuild a sketch from a dictionary created by to_dict().
+
+        :param state: The dictionary that represents the sketch.
+        :return: The rebuilt QuantileSketch.
+        '''
+        sketch = cls(state['capacity'])
+        sketch.count = state['count']
+
+        # sketches persisted before the bound was tracked are treated as exact
+        sketch.rank_error = state.get('rank_error', 0)
+        sketch.compactors = [np.asarray(items, dtype='float64') for items in state['compactors']]
+        return sketch
@@ -0,0 +1,150 @@
+'''
+Description:
+    Helper functions that generate synthetic business data with the same columns and value types as the
+    D598 source data, e.g. to measure how the pipeline scales beyond the 150 rows of the real data set.
+
+    Rows are generated one chunk at a time with NumPy, so files of 1e8 rows can be written with bounded memory.
+    The share of exact duplicate rows, the share of businesses with negative debt-to-equity (negative equity) and
+    how unevenly businesses are spread over states are configurable. Duplicates repeat rows of the same chunk.
+
+Functions:
+    - get_state_weights(state_skew, seed): Builds the probability of each state for a Zipf-like skew.
+    - generate_chunk(rng, row_count, first_id, duplicate_rate, negative_share, state_weights): Generates one chunk.
+    - iter_dataset_chunks(row_count, duplicate_rate, negative_share, state_skew, seed, chunk_size): Generates a data
+        set one chunk at a time.
+    - generate_dataset(row_count, duplicate_rate, negative_share, state_skew, seed): Generates a data set in memory.
+    - write_dataset(file_path, row_count, duplicate_rate, negative_share, state_skew, seed, chunk_size): Writes a
+        data set to a csv file one chunk at a time.
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.mapping import new_column_mapping, state_names
+
+source_columns = list(new_column_mapping.keys())
+
+def get_state_weights(state_skew, seed=0):
+    '''
+    Build the probability of each state. The states are put in a random order and the state at rank r gets a weight
+    of 1 / r ** state_skew, so 0 spreads businesses evenly and larger values concentrate them in a few states.
+
+    :param state_skew: The Zipf exponent; 0 for a uniform spread.
+    :param seed: The seed of the random state order.
+    :return: The NumPy array with the probability of each state in state_names.
+    '''
+    ranks = np.random.default_rng(seed).permutation(len(state_names)) + 1
+    weights = 1 / ranks.astype('float64') ** state_skew
+    return weights / weights.sum()
+
+def generate_chunk(rng, row_count, first_id, duplicate_rate, negative_share, state_weights):
+    '''
+    Generate one chunk of synthetic rows with the source column names.
+
+    :param rng: The NumPy random Generator.
+    :param row_count: The number of rows, duplicates included.
+    :param first_id: The sequence number of the first unique business in the chunk.
+    :param duplicate_rate: The share of rows that are exact copies of another row in the chunk.
+    :param negative_share: The share of unique businesses with negative equity, hence negative debt-to-equity.
+    :param state_weights: The probability of each state in state_names.
+    :returns:
+     - The Pandas dataframe chunk.
+     - The number of unique businesses in the chunk.
+    '''
+    duplicate_count = min(int(round(row_count * duplicate_rate)), max(row_count - 1, 0))
+    unique_count = row_count - duplicate_count
+
+    # business ids follow the source pattern of a sequence number followed by the year
+    business_ids = (first_id + np.arange(unique_count, dtype='int64') + 1) * 10_000 + 2013
+    states = np.asarray(state_names, dtype='object')[rng.choice(len(state_names), unique_count, p=state_weights)]
+
+    long_term_debt = np.round(rng.lognormal(17, 2, unique_count)) + 1000
+    equity = np.round(rng.lognormal(18, 1.8, unique_count)) + 1000
+    is_negative = rng.random(unique_count) < negative_share
+    equity[is_negative] = -np.round(equity[is_negative] * rng.uniform(0.01, 0.5, is_negative.sum()))
+
+    liabilities = long_term_debt + np.round(rng.lognormal(16.5, 2, unique_count))
+    revenue = np.round(rng.lognormal(18.5, 1.7, unique_count)).astype('int64') + 1000
+    profit_margin = rng.normal(0.25, 0.2, unique_count)
+
+    chunk_df = pd.DataFrame(dict(zip(source_columns, [
+        business_ids, states, long_term_debt, equity, long_term_debt / equity, liabilities, revenue, profit_margin])))
+
+    if duplicate_count > 0:
+        positions = np.concatenate([np.arange(unique_count), rng.integers(0, unique_count, duplicate_count)])
+        chunk_df = chunk_df.iloc[rng.permutation(positions)].reset_index(drop=True)
+
+    return chunk_df, unique_count
+
+def iter_dataset_chunks(row_count, duplicate_rate=0.0, negative_share=0.05, state_skew=1.0, seed=0,
+                        chunk_size=1_000_000):
+    '''
+    Generate a synthetic data set one chunk at a time. The same arguments always generate the same rows.
+
+    :param row_count: The total number of rows, duplicates included.
+    :param duplicate_rate: The share of rows that are exact copies of another row.
+    :param negative_share: The share of unique businesses with negative debt-to-equity.
+    :param state_skew: The Zipf exponent of the spread of businesses over states; 0 for a uniform spread.
+    :param seed: The random seed.
+    :param chunk_size: The maximum number of rows in each chunk.
+    :return: A generator of Pandas dataframes with the source column names.
+    '''
+    if not 0 <= duplicate_rate < 1 or not 0 <= negative_share <= 1:
+        raise ValueError('duplicate_rate must be in [0, 1) and negative_share in [0, 1].')
+
+    rng = np.random.default_rng(seed)
+    state_weights = get_state_weights(state_skew, seed)
+    first_id = 0
+
+    for start in range(0, row_count, chunk_size):
+        chunk_df, unique_count = generate_chunk(rng, min(chunk_size, row_count - start), first_id, duplicate_rate,
+                                                negative_share, state_weights)
+        first_id += unique_count
+        yield chunk_df
+
+def generate_dataset(row_count, duplicate_rate=0.0, negative_share=0.05, state_skew=1.0, seed=0):
+    '''
+    Generate a synthetic data set in memory.
+
+    :param row_count: The total number of rows, duplicates included.
+    :param duplicate_rate: The share of rows that are exact copies of another row.
+    :param negative_share: The share of unique businesses with negative debt-to-equity.
+    :param state_skew: The Zipf exponent of the spread of businesses over states; 0 for a uniform spread.
+    :param seed: The random seed.
+    :return: The Pandas dataframe with the source column names.
+    '''
+    chunks = list(iter_dataset_chunks(row_count, duplicate_rate, negative_share, state_skew, seed))
+
+    if not chunks:
+        return pd.DataFrame(columns=source_columns)
+
+    return pd.concat(chunks, ignore_index=True)
+
+def write_dataset(file_path, row_count, duplicate_rate=0.0, negative_share=0.05, state_skew=1.0, seed=0,
+                  chunk_size=1_000_000):
+    '''
+    Write a synthetic data set to a csv file one chunk at a time, so memory usage depends on the chunk size only.
+
+    :param file_path: The path of the csv file.
+    :param row_count: The total number of rows, duplicates included.
+    :param duplicate_rate: The share of rows that are exact copies of another row.
+    :param negative_share: The share of unique businesses with negative debt-to-equity.
+    :param state_skew: The Zipf exponent of the spread of businesses over states; 0 for a uniform spread.
+    :param seed: The random seed.
+    :param chunk_size: The maximum number of rows generated at a time.
+    :return: The path of the csv file.
+    '''
+    file_dir = os.path.dirname(file_path)
+
+    if file_dir:
+        os.makedirs(file_dir, exist_ok=True)
+
+    with open(file_path, 'w', newline='') as csv_file:
+        csv_file.write(','.join(source_columns) + '\n')
+
+        for chunk_df in iter_dataset_chunks(row_count, duplicate_rate, negative_share, state_skew, seed, chunk_size):
+            chunk_df.to_csv(csv_file, header=False, index=False)
+
+    return file_path
@@ -0,0 +1,106 @@
+'''
+Description:
+    Helper functions that answer "top N" queries with partial selection instead of full sorts.
+
+    np.argpartition finds the N best values in O(n); only those N are then sorted, so a query costs O(n + N log N)
+    instead of O(n log n). Ties are broken by row position, so results are deterministic, and null values are never
+    selected. Per-group queries first bucket the rows by group code with one stable sort of the codes, and then select
+    within each bucket.
+
+Functions:
+    - select_top_positions(values, n, ascending): Finds the positions of the N best values of an array.
+    - top_n(series, n, ascending): Gets the N best values of a series.
+    - top_n_groups(df, group_column, value_column, n, aggregate, ascending): Gets the N best groups by an aggregate.
+    - top_n_per_group(df, group_column, value_column, n, ascending): Gets the N best rows of every group.
+'''
+
+import numpy as np
+import pandas as pd
+
+def select_top_positions(values, n, ascending=False):
+    '''
+    Find the positions of the N best values of an array, best first. Equal values keep their array order and null
+    values are skipped.
+
+    :param values: The NumPy array of numbers.
+    :param n: The number of values to select.
+    :param ascending: Whether the smallest values are the best ones.
+    :return: The NumPy array of at most n positions.
+    '''
+    values = np.asarray(values)
+    positions = np.flatnonzero(~np.isnan(values)) if values.dtype.kind == 'f' else np.arange(len(values))
+    keys = values[positions]
+
+    # smaller keys are better; ~ reverses the order of integers without overflowing
+    if not ascending:
+        keys = -keys if keys.dtype.kind == 'f' else ~keys
+
+    if n <= 0:
+        return positions[:0]
+
+    if n < len(keys):
+        threshold = keys[np.argpartition(keys, n - 1)[n - 1]]
+
+        # every key better than the threshold is kept, and the first keys equal to it fill the remaining places
+        is_better = keys < threshold
+        is_tied = np.flatnonzero(keys == threshold)[:n - np.count_nonzero(is_better)]
+
+        selected = np.sort(np.concatenate([np.flatnonzero(is_better), is_tied]))
+        positions, keys = positions[selected], keys[selected]
+
+    # sort the few selected keys; lexsort is stable, so equal keys stay in position order
+    return positions[np.lexsort((positions, keys))]
+
+def top_n(series, n, ascending=False):
+    '''
+    Get the N best values of a series, best first.
+
+    :param series: The Pandas series of numbers.
+    :param n: The number of values to keep.
+    :param ascending: Whether the smallest values are the best ones.
+    :return: The Pandas series of at most n values, with their index labels.
+    '''
+    return series.iloc[select_top_positions(series.to_numpy(), n, ascending)]
+
+def top_n_groups(df, group_column, value_column, n, aggregate='sum', ascending=False):
+    '''
+    Get the N best groups by an aggregate of a column, e.g. the 5 states with the highest sum of total_revenue.
+
+    :param df: The Pandas dataframe.
+    :param group_column: The column to group by.
+    :param value_column: The column to aggregate.
+    :param n: The number of groups to keep.
+    :param aggregate: The aggregation, e.g. 'sum', 'mean' or 'max'.
+    :param ascending: Whether the smallest aggregates are the best ones.
+    :return: The Pandas series of at most n aggregates, indexed by group.
+    '''
+    aggregates = df.groupby(group_column, observed=True)[value_column].agg(aggregate)
+    return top_n(aggregates, n, ascending)
+
+def top_n_per_group(df, group_column, value_column, n, ascending=False):
+    '''
+    Get the N best rows of every group, e.g. the 3 businesses with the highest total_revenue in each state.
+    Rows with a null group or value are skipped.
+
+    :param df: The Pandas dataframe.
+    :param group_column: The column to group by.
+    :param value_column: The column to rank the rows of each group by.
+    :param n: The number of rows to keep per group.
+    :param ascending: Whether the smallest values are the best ones.
+    :return: The Pandas dataframe with the selected rows, ordered by group and then best first.
+    '''
+    codes, _ = pd.factorize(df[group_column], sort=True)
+    values = df[value_column].to_numpy()
+
+    # a stable sort buckets the rows by group and keeps their order within each bucket. the codes stay intp,
+    # since a narrower type would wrap around in codes + 1 once there are enough groups
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes + 1))
+
+    selected = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        # the first bucket holds the null groups (code -1) and is skipped
+        rows = order[start:stop]
+        selected.append(rows[select_top_positions(values[rows], n, ascending)])
+
+    return df.iloc[np.concatenate(selected) if selected else []]
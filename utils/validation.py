@@ -0,0 +1,270 @@
+'''
+Description:
+    Helper functions that validate raw rows against the schema and the column constraints in utils/mapping.py
+    before the columns are cast, and split them into valid and quarantined rows.
+
+    Every check of every column runs on whole column arrays and sets one bit of a per-row bitmask, so a chunk is
+    validated in one vectorized pass, without a Python loop over rows. Text in numeric columns, e.g. from a csv file
+    or a workbook column holding a stray note, is parsed with pd.to_numeric; values that do not parse are malformed.
+    The parsed values replace the text in the valid rows, so the schema cast that follows cannot fail. Allowed values
+    are matched ignoring case and surrounding spaces, e.g. 'MInnesota', and are rewritten to their allowed spelling.
+
+    Only the few flagged rows are decoded into reason codes such as 'total_revenue:missing' or
+    'business_state:not_allowed'. The reason codes are:
+    - missing: A null or blank value in a required or integer column.
+    - malformed: A value of a numeric column that is not a number.
+    - overflow: A value of an integer column that is infinite or does not fit in int64.
+    - non_integer: A value of an integer column with a fractional part, e.g. a business_id of 12.7.
+    - below_min / above_max: A value outside the range of the column.
+    - not_allowed: A value of a text column that is not one of its allowed values in any case, e.g. an unknown state.
+    - column_missing: A column of the schema that is not in the source file; every row gets this reason.
+
+Functions:
+    - get_type_kind(target_type): Gets the kind of a schema type: integer, float or text.
+    - find_missing(series): Finds the null and blank values of a column.
+    - match_allowed(series, allowed): Matches a column to its allowed values, ignoring case and surrounding spaces.
+    - parse_numeric(series): Parses a column into float64 values and finds its malformed values.
+    - validate_rows(df, schema, constraints): Checks every row in one pass into a bitmask of failed checks.
+    - describe_reasons(bitmask, reason_codes): Decodes the bitmask of flagged rows into reason codes.
+    - split_valid_rows(df, schema, constraints): Splits rows into valid rows and quarantined rows with reasons.
+    - count_reasons(quarantine_df): Counts the quarantined rows by reason code.
+'''
+
+import numpy as np
+import pandas as pd
+
+from utils.mapping import new_column_mapping, column_type, column_constraints
+from utils.screening import bitmask_dtypes
+
+def get_type_kind(target_type):
+    '''
+    Get the kind of a schema type, e.g. 'int64' and the compact 'integer' type are integer types.
+
+    :param target_type: The schema type.
+    :return: 'i' for integer types, 'f' for float types, otherwise 'O' for text types such as 'object' or 'category'.
+    '''
+    if target_type == 'integer':
+        return 'i'
+
+    try:
+        kind = np.dtype(target_type).kind
+    except TypeError:
+        # 'category' and other Pandas-only types
+        return 'O'
+
+    return 'i' if kind in 'iu' else 'f' if kind == 'f' else 'O'
+
+def find_missing(series):
+    '''
+    Find the null values of a column, and the blank strings of a text column.
+
+    :param series: The Pandas series.
+    :return: The NumPy boolean array of null or blank values.
+    '''
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.isna().to_numpy()
+
+    # blanks are looked for once per distinct value; the extra last entry is the null code -1
+    codes, uniques = pd.factorize(series)
+    is_blank = np.append(np.asarray(uniques.astype('str').str.strip() == '', dtype='bool'), True)
+
+    return is_blank[codes]
+
+def parse_numeric(series):
+    '''
+    Parse a column into float64 values. Numeric columns are used as they are; text columns are parsed with
+    pd.to_numeric, and blank strings count as null values.
+
+    :param series: The Pandas series.
+    :returns:
+     - The NumPy float64 array of values, NaN for null and malformed values.
+     - The NumPy boolean array of null or blank values.
+     - The NumPy boolean array of malformed values.
+    '''
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        is_missing = np.isnan(values)
+        return values, is_missing, np.zeros(len(values), dtype='bool')
+
+    is_missing = find_missing(series)
+    values = pd.to_numeric(series.where(~is_missing), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+    return values, is_missing, np.isnan(values) & ~is_missing
+
+def match_allowed(series, allowed):
+    '''
+    Match the values of a column to its allowed values, ignoring case and surrounding spaces, e.g. 'MInnesota' and
+    ' minnesota' match 'Minnesota'.
+
+    :param series: The Pandas series.
+    :param allowed: The list of allowed values.
+    :returns:
+     - The NumPy boolean array of values that match an allowed value.
+     - The NumPy object array of the values with matches rewritten to their allowed spelling, or None if every
+       match is already spelled that way.
+    '''
+    spellings = {str(value).strip().casefold(): value for value in allowed}
+
+    # values are matched once per distinct value; the extra last entry is the null code -1
+    codes, uniques = pd.factorize(series)
+    matches = [spellings.get(str(value).strip().casefold()) for value in uniques]
+    is_allowed = np.append(np.array([match is not None for match in matches], dtype='bool'), False)[codes]
+
+    if all(match is None or match == value for match, value in zip(matches, uniques)):
+        return is_allowed, None
+
+    values = series.to_numpy(dtype='object', copy=True)
+    values[is_allowed] = np.array(matches, dtype='object')[codes[is_allowed]]
+
+    return is_allowed, values
+
+def validate_rows(df, schema=column_type, constraints=column_constraints):
+    '''
+    Check every row against the schema and the column constraints in one vectorized pass. Bit i of a row is set
+    when the row fails check i. Columns are matched by source or normalized name, and a schema column that no
+    column matches fails the column_missing check on every row.
+
+    :param df: The Pandas dataframe read from the source file, before casting.
+    :param schema: The dictionary of {column name: schema type}, e.g. column_type or compact_column_type.
+    :param constraints: The dictionary of {column name: constraints}.
+    :returns:
+     - The NumPy array of one unsigned integer per row with the bits of the failed checks.
+     - The list of reason codes, one per bit.
+     - The dictionary of {column: NumPy array} with the parsed values of numeric text columns and the allowed
+       spelling of allowed values.
+    :raises ValueError: If there are more checks than bits.
+    '''
+    failures, reason_codes, replaced_columns = [], [], {}
+
+    def add_check(column, reason, is_failed):
+        reason_codes.append(f'{column}:{reason}')
+        failures.append(is_failed)
+
+    found_columns = set()
+
+    for source_column in df.columns:
+        column = new_column_mapping.get(source_column, source_column)
+
+        if column not in schema:
+            continue
+
+        found_columns.add(column)
+
+        series = df[source_column]
+        column_checks = constraints.get(column, {})
+        kind = get_type_kind(schema[column])
+
+        if 'allowed' in column_checks:
+            is_missing = find_missing(series)
+
+            if column_checks.get('required'):
+                add_check(column, 'missing', is_missing)
+
+            is_allowed, values = match_allowed(series, column_checks['allowed'])
+            add_check(column, 'not_allowed', ~is_allowed & ~is_missing)
+
+            if values is not None:
+                replaced_columns[source_column] = values
+            continue
+
+        if kind == 'O':
+            # text columns without allowed values only have the required check
+            if column_checks.get('required'):
+                add_check(column, 'missing', find_missing(series))
+            continue
+
+        values, is_missing, is_malformed = parse_numeric(series)
+
+        if not pd.api.types.is_numeric_dtype(series.dtype):
+            replaced_columns[source_column] = values
+
+        if kind == 'i' or column_checks.get('required'):
+            add_check(column, 'missing', is_missing)
+
+        add_check(column, 'malformed', is_malformed)
+
+        # comparisons with NaN are False, so null and malformed values never fail the range checks
+        with np.errstate(invalid='ignore'):
+            if kind == 'i':
+                # 2**63 is exactly representable as a float, so anything at or above it overflows int64
+                add_check(column, 'overflow', (np.isinf(values) | (values < -2.0 ** 63) | (values >= 2.0 ** 63)))
+
+                # a fraction such as business_id '12.7' would be truncated by the cast to int64
+                add_check(column, 'non_integer', np.isfinite(values) & (values != np.floor(values)))
+
+            if 'min' in column_checks:
+                add_check(column, 'below_min', values < column_checks['min'])
+
+            if 'max' in column_checks:
+                add_check(column, 'above_max', values > column_checks['max'])
+
+    for column in schema:
+        if column not in found_columns:
+            add_check(column, 'column_missing', np.ones(len(df), dtype='bool'))
+
+    if len(failures) > 64:
+        raise ValueError(f'{len(failures)} validation checks do not fit in a 64-bit mask.')
+
+    bitmask_dtype = next(dtype for dtype in bitmask_dtypes if np.dtype(dtype).itemsize * 8 >= len(failures))
+    bitmask = np.zeros(len(df), dtype=bitmask_dtype)
+    bit = np.empty(len(df), dtype=bitmask_dtype)
+
+    for position, is_failed in enumerate(failures):
+        np.copyto(bit, is_failed)
+        bit <<= position
+        bitmask |= bit
+
+    return bitmask, reason_codes, replaced_columns
+
+def describe_reasons(bitmask, reason_codes):
+    '''
+    Decode the bitmask of flagged rows into reason codes.
+
+    :param bitmask: The NumPy array of failed check bits of the flagged rows.
+    :param reason_codes: The list of reason codes, one per bit.
+    :return: The NumPy object array of ';'-separated reason codes, one per row.
+    '''
+    reasons = np.full(len(bitmask), '', dtype='object')
+
+    for position, code in enumerate(reason_codes):
+        has_reason = (bitmask >> position) & 1 == 1
+        reasons[has_reason] += f';{code}'
+
+    return np.array([reason[1:] for reason in reasons], dtype='object')
+
+def split_valid_rows(df, schema=column_type, constraints=column_constraints):
+    '''
+    Split rows into the valid rows, which can be cast to the schema, and the quarantined rows with their reasons.
+
+    :param df: The Pandas dataframe read from the source file, before casting.
+    :param schema: The dictionary of {column name: schema type}.
+    :param constraints: The dictionary of {column name: constraints}.
+    :returns:
+     - The Pandas dataframe of the valid rows, with numeric text columns replaced by their parsed values and
+       allowed values by their allowed spelling.
+     - The Pandas dataframe of the quarantined rows as they were read, with a reasons column.
+    '''
+    bitmask, reason_codes, replaced_columns = validate_rows(df, schema, constraints)
+    is_valid = bitmask == 0
+
+    # the clean case keeps the dataframe and its columns as they are
+    valid_df = df if is_valid.all() and not replaced_columns else df.iloc[np.flatnonzero(is_valid)]
+
+    if replaced_columns:
+        valid_df = valid_df.assign(**{column: values[is_valid] for column, values in replaced_columns.items()})
+
+    flagged_positions = np.flatnonzero(~is_valid)
+    quarantine_df = df.iloc[flagged_positions].assign(
+        reasons=describe_reasons(bitmask[flagged_positions], reason_codes))
+
+    return valid_df, quarantine_df
+
+def count_reasons(quarantine_df):
+    '''
+    Count the quarantined rows by reason code. A row with several reasons counts once for each.
+
+    :param quarantine_df: The Pandas dataframe of quarantined rows created by split_valid_rows().
+    :return: The Pandas dataframe with the reason and cnt_of_rows of each reason code, most frequent first.
+    '''
+    counts = quarantine_df['reasons'].str.split(';').explode().value_counts()
+    return counts.rename_axis('reason').rename('cnt_of_rows').reset_index()
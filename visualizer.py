@@ -2,175 +2,350 @@
 Description:
     This class creates data visualization charts.
 
+    Matplotlib and seaborn are only imported when a chart is rendered, with the headless Agg backend, so runs that
+    produce no charts do not pay for them. Each chart is drawn on its own object-oriented Figure instead of the
+    pyplot global state, which lets the four charts render concurrently in worker processes. The workers only
+    receive the small per-state table their chart needs, never the full merged dataframe. Every table is read
+    from the per-state aggregate cube built by Analyzer.build_state_cube(), so no chart scans the businesses again,
+    and top 5 views select their states with utils/topn.py instead of sorting.
+
+Parameters:
+    output_filepath (str): The directory where chart figures are saved.
+
 Methods:
-    - __save_figure(filename): Saves the chart figure in the specified directory.
-    - __clear_figure(): Clears the chart figure.
-    - create_bar_chart(df): Create a bar chart showing the top 5 states with the highest total liabilities.
-    - create_pie_chart(df): Create a pie chart showing the top 5 states with the highest sum of total_revenue.
-    - create_scatter_plot(df): Create a scatter plot showing the relationship between average total_revenue and
-        average debt_to_income ratio for each state.
-    - create_horizontal_bar_chart(df): Create a horizontal bar chart showing the total count of businesses for
-        each state.
+    - prepare_bar_chart_table(state_cube): Gets the top 5 states with the highest total liabilities.
+    - prepare_pie_chart_table(state_cube): Gets the top 5 states with the highest sum of total_revenue.
+    - prepare_scatter_plot_table(state_cube): Gets the average total_revenue and debt_to_income ratio of each state.
+    - prepare_horizontal_bar_chart_table(state_cube): Gets the count of businesses of each state.
+    - create_bar_chart(state_cube): Create a bar chart showing the top 5 states with the highest total liabilities.
+    - create_pie_chart(state_cube): Create a pie chart showing the top 5 states with the highest sum of total_revenue.
+    - create_scatter_plot(state_cube): Create a scatter plot showing the relationship between average
+        total_revenue and average debt_to_income ratio for each state.
+    - create_horizontal_bar_chart(state_cube): Create a horizontal bar chart showing the total count of businesses
+        for each state.
+    - create_all_charts(state_cube, max_workers): Creates the four charts concurrently in worker processes and
+        returns the render time of each chart.
+
+Functions:
+    - render_bar_chart(table_df, output_file_path): Draws and saves the bar chart.
+    - render_pie_chart(table_df, output_file_path): Draws and saves the pie chart.
+    - render_scatter_plot(table_df, output_file_path): Draws and saves the scatter plot.
+    - render_horizontal_bar_chart(table_df, output_file_path): Draws and saves the horizontal bar chart.
+    - render_timed(render, table_df, output_file_path): Renders a chart and measures its wall and CPU time.
 '''
 
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+import pandas as pd
+
+from utils.topn import top_n
 
 output_filepath = 'output'
 
-class Visualizer:
-    def __save_figure(self, output_filename):
-        '''
-        Save the chart figure in the specified directory.
+def new_figure():
+    '''
+    Create an object-oriented Figure with the headless Agg backend, importing matplotlib on first use.
 
-        :param output_filename: The file name output.
-        '''
-        plt.savefig(f'{output_filepath}/{output_filename}.jpeg', bbox_inches='tight')
+    :return: The new Figure and its Axes.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
 
-    def __clear_figure(self):
-        '''
-        Clear the chart figure.
-        '''
-        plt.clf()
-        plt.close()
+    from matplotlib.figure import Figure
 
-    def create_bar_chart(self, df):
-        '''
-        Create a bar chart showing the top 5 states with the highest total liabilities.
+    figure = Figure()
+    return figure, figure.subplots()
 
-        :param df: The merge of the original Pandas dataframe and debt_to_income_df dataframe.
-        '''
-        # get the unique business state with the highest total liabilities
-        top_liabilities_df = (df
-                                  .sort_values(by='total_liabilities', ascending=False)
-                                  .drop_duplicates(subset='business_state', keep='first')
-                                  .head(5))
+def save_figure(figure, output_file_path):
+    '''
+    Save the chart figure to the specified path.
 
-        # convert to billions
-        top_liabilities_df['total_liabilities_billion'] = df['total_liabilities'] / 1e9
+    :param figure: The Figure to save.
+    :param output_file_path: The file path of the chart, without extension.
+    '''
+    figure.savefig(f'{output_file_path}.jpeg', bbox_inches='tight')
+
+def render_bar_chart(table_df, output_file_path):
+    '''
+    Draw and save a bar chart showing the top 5 states with the highest total liabilities.
+
+    :param table_df: The table created by Visualizer.prepare_bar_chart_table().
+    :param output_file_path: The file path of the chart, without extension.
+    '''
+    import seaborn as sns
+
+    figure, ax = new_figure()
+
+    # get the max total liabilities for setting max value for the y-axis
+    max_liabilities = int(np.ceil(np.max(table_df['total_liabilities_billion'])))
+    yticks = [n for n in range(0, max_liabilities+1)]
+
+    # format labels for y-axis
+    yticks_labels = [f'${n}B' for n in yticks]
+
+    sns.barplot(data=table_df, x='business_state', y='total_liabilities_billion', color='orange', width=0.5, ax=ax)
+
+    ax.set_xlabel('U.S. States', fontdict={'fontweight': 'bold'})
+    ax.set_ylabel('Total Liabilities (in Billions)', fontdict={'fontweight': 'bold'})
+
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_yticks(ticks=yticks, labels=yticks_labels)
+
+    ax.set_title('TOTAL LIABILITIES BY STATE',
+                 fontdict={
+                     'fontsize': 12,
+                     'fontweight': 'bold'
+                 })
+
+    save_figure(figure, output_file_path)
+
+def render_pie_chart(table_df, output_file_path):
+    '''
+    Draw and save a pie chart showing the top 5 states with the highest sum of total_revenue.
+
+    :param table_df: The table created by Visualizer.prepare_pie_chart_table().
+    :param output_file_path: The file path of the chart, without extension.
+    '''
+    figure, ax = new_figure()
+
+    ax.pie(
+        x=table_df['total_revenue'],
+        labels=table_df.index.tolist(),
+        autopct='%1.1f%%')
+
+    ax.legend(table_df.index.tolist(), loc='lower left')
+
+    ax.set_title(
+        'TOTAL REVENUE DISTRIBUTION AMONG TOP 5 STATES',
+        fontdict={
+            'fontweight':'bold',
+            'fontsize': 12
+        })
+
+    save_figure(figure, output_file_path)
+
+def render_scatter_plot(table_df, output_file_path):
+    '''
+    Draw and save a scatter plot showing the relationship between average total_revenue and average
+    debt_to_income ratio for each state.
+
+    :param table_df: The table created by Visualizer.prepare_scatter_plot_table().
+    :param output_file_path: The file path of the chart, without extension.
+    '''
+    import seaborn as sns
+
+    figure, ax = new_figure()
+
+    # generate 10 yticks
+    max_avg_revenue = np.max(table_df['avg_revenue_million'])
+    temp_yticks = np.linspace(0, max_avg_revenue, 10)
+    yticks = [f'${round(n, 2)}M' for n in temp_yticks]      # format yticks
+
+    sns.scatterplot(table_df, x='avg_debt_to_income_ratio', y='avg_revenue_million', hue=table_df.index.tolist(), ax=ax)
+
+    ax.set_title(
+        'AVERAGE REVENUE V.S. DEBT-TO-INCOME-RATIO BY STATE',
+        fontdict={
+            'fontweight':'bold',
+            'fontsize': 12
+        })
+
+    ax.set_ylabel('Average Revenue', fontdict={'fontweight': 'bold'})
+    ax.set_xlabel('Average Debt-to-Income Ratio', fontdict={'fontweight': 'bold'})
 
-        # get the max total liabilities for setting max value for the y-axis
-        max_liabilities = int(np.ceil(np.max(top_liabilities_df['total_liabilities_billion'])))
-        yticks = [n for n in range(0, max_liabilities+1)]
+    ax.set_yticks(ticks=temp_yticks, labels=yticks)
 
-        # format labels for y-axis
-        yticks_labels = [f'${n}B' for n in yticks]
+    ax.legend(prop={'size': 8}, bbox_to_anchor=(1.05, 1), loc='upper left', ncol=2)
+    figure.tight_layout()
 
-        sns.barplot(data=top_liabilities_df, x='business_state', y='total_liabilities_billion', color='orange', width=0.5)
+    save_figure(figure, output_file_path)
 
-        plt.xlabel('U.S. States', fontdict={'fontweight': 'bold'})
-        plt.ylabel('Total Liabilities (in Billions)', fontdict={'fontweight': 'bold'})
+def render_horizontal_bar_chart(table_df, output_file_path):
+    '''
+    Draw and save a horizontal bar chart showing the total count of businesses for each state.
 
-        plt.xticks(rotation=45)
-        plt.yticks(ticks=yticks, labels=yticks_labels)
+    :param table_df: The table created by Visualizer.prepare_horizontal_bar_chart_table().
+    :param output_file_path: The file path of the chart, without extension.
+    '''
+    import seaborn as sns
 
-        plt.title('TOTAL LIABILITIES BY STATE',
-                  fontdict={
-                      'fontsize': 12,
-                      'fontweight': 'bold'
-                  })
+    figure, ax = new_figure()
 
-        # plt.show()
-        self.__save_figure('bar_chart')
-        self.__clear_figure()
+    sns.barplot(table_df, x='cnt_of_businesses', y='business_state', hue='business_state', width=0.5, ax=ax)
 
-    def create_pie_chart(self, df):
+    ax.set_ylabel('States of the U.S.', fontdict={'fontweight': 'bold'})
+    ax.set_xlabel('Count of Businesses', fontdict={'fontweight': 'bold'})
+
+    ax.set_title(
+        'COUNT OF BUSINESSES BY STATES',
+        fontdict={
+            'fontweight':'bold',
+            'fontsize': 12
+        })
+
+    figure.tight_layout()
+
+    save_figure(figure, output_file_path)
+
+def render_timed(render, table_df, output_file_path):
+    '''
+    Render a chart and measure its wall and CPU time, in the process that renders it.
+
+    :param render: The render function of the chart.
+    :param table_df: The Pandas dataframe the chart is drawn from.
+    :param output_file_path: The path of the chart file, without extension.
+    :returns:
+     - The wall time in seconds.
+     - The CPU time in seconds.
+    '''
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    render(table_df, output_file_path)
+    return time.perf_counter() - start_wall, time.process_time() - start_cpu
+
+class Visualizer:
+    def __init__(self, output_filepath=output_filepath):
+        self.output_filepath = output_filepath
+
+    def __get_chart_jobs(self, state_cube):
         '''
-        Create a pie chart showing the top 5 states with the highest sum of total_revenue.
+        Prepare the table of every chart, paired with its render function and output file path.
 
-        :param df: The merge of the original Pandas dataframe and debt_to_income_df dataframe.
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        :return: The list of (render function, table, output file path).
+        '''
+        return [
+            (render_bar_chart, self.prepare_bar_chart_table(state_cube), f'{self.output_filepath}/bar_chart'),
+            (render_pie_chart, self.prepare_pie_chart_table(state_cube), f'{self.output_filepath}/pie_chart'),
+            (render_scatter_plot, self.prepare_scatter_plot_table(state_cube), f'{self.output_filepath}/scatterplot'),
+            (render_horizontal_bar_chart, self.prepare_horizontal_bar_chart_table(state_cube),
+             f'{self.output_filepath}/hor_bar_chart')
+        ]
+
+    def prepare_bar_chart_table(self, state_cube):
         '''
-        # compute the sum of total_revenue and get the top 5 states
-        sum_revenue_top_five_states_df = (df
-                          .sort_values(by='business_state')
-                          .groupby(by='business_state')
-                          .agg({'total_revenue': 'sum'})
-                          .head(5))
+        Get the top 5 states with the highest total liabilities, i.e. the highest total_liabilities of a business.
 
-        plt.pie(
-            x=sum_revenue_top_five_states_df['total_revenue'],
-            labels=sum_revenue_top_five_states_df.index.tolist(),
-            autopct='%1.1f%%')
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        :return: The Pandas dataframe with business_state and total_liabilities_billion of the top 5 states.
+        '''
+        # get the highest total liabilities of each state and keep the top 5 states
+        top_liabilities_df = (top_n(state_cube[('total_liabilities', 'max')], 5)
+                              .rename('total_liabilities')
+                              .reset_index())
 
-        plt.legend(sum_revenue_top_five_states_df.index.tolist(), loc='lower left')
+        # plot states as plain labels so a categorical business_state does not add empty categories
+        top_liabilities_df['business_state'] = top_liabilities_df['business_state'].astype(str)
 
-        plt.title(
-            'TOTAL REVENUE DISTRIBUTION AMONG TOP 5 STATES',
-            fontdict={
-                'fontweight':'bold',
-                'fontsize': 12
-            })
+        # convert to billions
+        top_liabilities_df['total_liabilities_billion'] = top_liabilities_df['total_liabilities'] / 1e9
 
-        # plt.show()
-        self.__save_figure('pie_chart')
-        self.__clear_figure()
+        return top_liabilities_df
 
-    def create_scatter_plot(self, df):
+    def prepare_pie_chart_table(self, state_cube):
         '''
-        Create a scatter plot showing the relationship between average total_revenue and average debt_to_income ratio
-        for each state.
+        Get the top 5 states with the highest sum of total_revenue.
+
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        :return: The Pandas dataframe with the sum of total_revenue, indexed by business_state.
+        '''
+        # get the 5 states with the highest sum of total_revenue
+        sum_revenue_top_five_states_df = (top_n(state_cube[('total_revenue', 'sum')], 5)
+                                          .rename('total_revenue')
+                                          .to_frame())
+
+        return sum_revenue_top_five_states_df
+
+    def prepare_scatter_plot_table(self, state_cube):
+        '''
+        Get the average total_revenue and average debt_to_income ratio of each state.
 
-        :param df: The merge of the original Pandas dataframe and debt_to_income_df dataframe.
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        :return: The Pandas dataframe with the averages, indexed by business_state.
         '''
-        df = (df
-              .groupby('business_state')
-              .agg(
-            avg_revenue=('total_revenue', 'mean'),
-            avg_debt_to_income_ratio=('debt_to_income_ratio', 'mean')
-        ))
+        df = pd.DataFrame({
+            'avg_revenue': state_cube[('total_revenue', 'mean')],
+            'avg_debt_to_income_ratio': state_cube[('debt_to_income_ratio', 'mean')]
+        })
 
         # convert to millions
         df['avg_revenue_million'] = df['avg_revenue'] / 1e9
 
-        # generate 10 yticks
-        max_avg_revenue = np.max(df['avg_revenue_million'])
-        temp_yticks = np.linspace(0, max_avg_revenue, 10)
-        yticks = [f'${round(n, 2)}M' for n in temp_yticks]      # format yticks
+        return df
 
-        sns.scatterplot(df, x='avg_debt_to_income_ratio', y='avg_revenue_million', hue=df.index.tolist())
+    def prepare_horizontal_bar_chart_table(self, state_cube):
+        '''
+        Get the count of businesses of each state.
+
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        :return: The Pandas dataframe with business_state and cnt_of_businesses.
+        '''
+        df = state_cube[('business_id', 'count')].rename('cnt_of_businesses').reset_index()
+
+        # plot states as plain labels so a categorical business_state does not add empty categories
+        df['business_state'] = df['business_state'].astype(str)
+
+        return df
 
-        plt.title(
-            'AVERAGE REVENUE V.S. DEBT-TO-INCOME-RATIO BY STATE',
-            fontdict={
-                'fontweight':'bold',
-                'fontsize': 12
-            })
+    def create_bar_chart(self, state_cube):
+        '''
+        Create a bar chart showing the top 5 states with the highest total liabilities.
+
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        '''
+        render_bar_chart(self.prepare_bar_chart_table(state_cube), f'{self.output_filepath}/bar_chart')
 
-        plt.ylabel('Average Revenue', fontdict={'fontweight': 'bold'})
-        plt.xlabel('Average Debt-to-Income Ratio', fontdict={'fontweight': 'bold'})
+    def create_pie_chart(self, state_cube):
+        '''
+        Create a pie chart showing the top 5 states with the highest sum of total_revenue.
 
-        plt.yticks(ticks=temp_yticks, labels=yticks)
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        '''
+        render_pie_chart(self.prepare_pie_chart_table(state_cube), f'{self.output_filepath}/pie_chart')
 
-        plt.legend(prop={'size': 8}, bbox_to_anchor=(1.05, 1), loc='upper left', ncol=2)
-        plt.tight_layout()
+    def create_scatter_plot(self, state_cube):
+        '''
+        Create a scatter plot showing the relationship between average total_revenue and average debt_to_income ratio
+        for each state.
 
-        # plt.show()
-        self.__save_figure('scatterplot')
-        self.__clear_figure()
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        '''
+        render_scatter_plot(self.prepare_scatter_plot_table(state_cube), f'{self.output_filepath}/scatterplot')
 
-    def create_horizontal_bar_chart(self, df):
+    def create_horizontal_bar_chart(self, state_cube):
         '''
         Create a horizontal bar chart showing the total count of businesses for each state.
 
-        :param df: The merge of the original Pandas dataframe and debt_to_income_df dataframe.
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
         '''
-        df = df.groupby('business_state')['business_state'].value_counts().reset_index(name='cnt_of_businesses')
+        render_horizontal_bar_chart(self.prepare_horizontal_bar_chart_table(state_cube),
+                                    f'{self.output_filepath}/hor_bar_chart')
 
-        sns.barplot(df, x='cnt_of_businesses', y='business_state', hue='business_state', width=0.5)
+    def create_all_charts(self, state_cube, max_workers=4):
+        '''
+        Create the four charts. The small table of each chart is prepared here and sent to a worker process, so the
+        total render time is close to the time of the slowest chart.
 
-        plt.ylabel('States of the U.S.', fontdict={'fontweight': 'bold'})
-        plt.xlabel('Count of Businesses', fontdict={'fontweight': 'bold'})
+        :param state_cube: The per-state aggregate cube created by Analyzer.build_state_cube().
+        :param max_workers: The maximum number of worker processes. With 1 or fewer, charts render one by one in
+            this process, e.g. when the caller already runs in a worker process.
+        :return: The list of (chart name, wall seconds, CPU seconds) of each chart, measured where it was rendered.
+        '''
+        chart_jobs = self.__get_chart_jobs(state_cube)
 
-        plt.title(
-            'COUNT OF BUSINESSES BY STATES',
-                  fontdict={
-                      'fontweight':'bold',
-                      'fontsize': 12
-                  })
+        if max_workers is None or max_workers > 1:
+            # workers forked from a process traced by tracemalloc would inherit the tracing and render much slower
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=tracemalloc.stop) as executor:
+                futures = [executor.submit(render_timed, render, table_df, output_file_path)
+                           for render, table_df, output_file_path in chart_jobs]
 
-        plt.tight_layout()
+                timings = [future.result() for future in futures]
+        else:
+            timings = [render_timed(render, table_df, output_file_path)
+                       for render, table_df, output_file_path in chart_jobs]
 
-        # plt.show()
-        self.__save_figure('hor_bar_chart')
-        self.__clear_figure()
+        return [(os.path.basename(output_file_path), wall_seconds, cpu_seconds)
+                for (_, _, output_file_path), (wall_seconds, cpu_seconds) in zip(chart_jobs, timings)]